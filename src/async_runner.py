@@ -0,0 +1,358 @@
+import asyncio
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+
+import config as cfg
+import progress
+import resources
+import run_manifest
+
+# 출력 파이프에서 한 번에 읽는 크기
+_READ_SIZE = 64 * 1024
+# 오류 메시지용으로 남기는 stderr 끝부분 크기
+_STDERR_TAIL = 8 * 1024
+# 취소/시간 초과 시 SIGTERM 후 SIGKILL까지 기다리는 시간(초)
+_KILL_GRACE = 5.0
+
+
+class RotatingLog:
+    """출력 조각을 바로 파일에 쓰고 max_bytes를 넘으면 {path}.1, {path}.2 ... 로 밀어냄"""
+
+    def __init__(self, path, max_bytes=None, backups=None):
+        if max_bytes is None:
+            max_bytes = getattr(cfg, "COMMAND_LOG_MAX_MB", 10) * 1024**2
+        if backups is None:
+            backups = getattr(cfg, "COMMAND_LOG_BACKUPS", 2)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 이전 실행의 로그는 지우고 새로 시작
+        for i in range(self.backups, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.remove(f"{path}.{i}")
+        self._f = open(path, "wb")
+        self._size = 0
+
+    def write(self, data):
+        if self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._f.write(data)
+        self._f.flush()
+        self._size += len(data)
+
+    def _rotate(self):
+        self._f.close()
+        for i in range(self.backups, 0, -1):
+            src = self.path if i == 1 else f"{self.path}.{i - 1}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i}")
+        if self.backups == 0:
+            os.remove(self.path)
+        self._f = open(self.path, "wb")
+        self._size = 0
+
+    def read_text(self):
+        """남아 있는 로그 전체 (오래된 백업부터)"""
+        paths = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)] + [self.path]
+        data = b""
+        for p in paths:
+            if os.path.exists(p):
+                with open(p, "rb") as f:
+                    data += f.read()
+        return data.decode(errors="replace")
+
+    def close(self):
+        self._f.close()
+
+
+def log_path(stage, tool, qp, sequence, stream):
+    """명령 출력 로그: report/logs/{단계}/{tool}/qpXX/{시퀀스}.{stdout|stderr}.log"""
+    log_dir = getattr(
+        cfg, "COMMAND_LOG_DIR", os.path.join(cfg.OUTPUT_REPORT_DIR, "logs")
+    )
+    return os.path.join(log_dir, stage, tool, f"qp{qp}", f"{sequence}.{stream}.log")
+
+
+class CommandResult:
+    """run() 결과: returncode, stderr 끝부분, 자원 사용량(마지막 시도), 시도 횟수, 로그"""
+
+    def __init__(self, returncode, stderr_tail, usage, attempts, stdout_log, timed_out):
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.usage = usage
+        self.attempts = attempts
+        self.stdout_log = stdout_log
+        self.timed_out = timed_out
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    def error(self):
+        if self.timed_out:
+            return f"시간 초과 ({self.usage['seconds']:.1f}s)"
+        return self.stderr_tail.strip() or f"exit status {self.returncode}"
+
+    def stdout(self):
+        return self.stdout_log.read_text()
+
+
+async def run(cmd, stage, tool, qp, sequence, timeout=None, retries=None, segment=None):
+    """외부 명령을 워커 프로세스 없이 이벤트 루프에서 직접 실행 (인코더/디코더용)
+
+    stdout/stderr는 메모리에 모으지 않고 나오는 대로 회전 로그(log_path)에 쓰며,
+    진행 프레임 수(progress)와 실행 기록(run_manifest, 시도마다)을 남김.
+    segment: 한 작업을 여러 구간으로 나눠 동시에 실행할 때 구간 번호
+    (로그는 {시퀀스}.seg{번호}.*.log, 실행 기록에 segment 필드 추가).
+    timeout(초, 기본 cfg.COMMAND_TIMEOUT)을 넘기거나 종료 코드가 0이 아니면
+    retries(기본 cfg.COMMAND_RETRIES)번까지 COMMAND_RETRY_BACKOFF 초부터 2배씩 기다렸다 재시도.
+    취소(CancelledError)되면 실행 중인 프로세스 그룹을 종료하고 다시 raise.
+    """
+    if timeout is None:
+        timeout = getattr(cfg, "COMMAND_TIMEOUT", None)
+    if retries is None:
+        retries = getattr(cfg, "COMMAND_RETRIES", 0)
+    delay = getattr(cfg, "COMMAND_RETRY_BACKOFF", 10)
+
+    log_name = sequence if segment is None else f"{sequence}.seg{segment}"
+    logs = {
+        name: RotatingLog(log_path(stage, tool, qp, log_name, name))
+        for name in ("stdout", "stderr")
+    }
+    try:
+        for attempt in range(1, retries + 2):
+            header = f"=== [{attempt}/{retries + 1}] {' '.join(map(str, cmd))}\n"
+            for log in logs.values():
+                log.write(header.encode())
+            with progress.live(stage, tool, qp, sequence, segment) as live:
+                returncode, tail, usage, timed_out = await _run_once(
+                    cmd, logs, live.feed, timeout
+                )
+            result = CommandResult(
+                returncode, tail, usage, attempt, logs["stdout"], timed_out
+            )
+            fields = {"attempt": attempt}
+            if segment is not None:
+                fields["segment"] = segment
+            run_manifest.record(
+                stage,
+                tool,
+                qp,
+                sequence,
+                cmd,
+                returncode,
+                {**usage, **fields},
+                None if result.ok else result.error(),
+            )
+            if result.ok or attempt > retries:
+                return result
+            print(
+                f"⚠️ [{tool}] {sequence} QP {qp} {stage} 실패, {delay}s 후 재시도 "
+                f"({attempt}/{retries}): {result.error()[-200:]}"
+            )
+            await asyncio.sleep(delay)
+            delay *= 2
+    finally:
+        for log in logs.values():
+            log.close()
+
+
+async def _run_once(cmd, logs, feed, timeout):
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    # 별도 세션으로 실행해 취소/시간 초과 시 자식까지 한 번에 종료
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    tail = bytearray()
+
+    def on_chunk(name, data):
+        logs[name].write(data)
+        if feed is not None:
+            feed(name, data)
+        if name == "stderr":
+            tail.extend(data)
+            del tail[:-_STDERR_TAIL]
+
+    async def communicate():
+        await asyncio.gather(
+            _read_stream(loop, proc.stdout, lambda d: on_chunk("stdout", d)),
+            _read_stream(loop, proc.stderr, lambda d: on_chunk("stderr", d)),
+        )
+        return await _wait4(loop, proc)
+
+    timed_out = False
+    try:
+        status, rusage = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        _kill(proc, signal.SIGTERM)
+        status, rusage = await _wait4(loop, proc, _KILL_GRACE)
+    except BaseException:
+        # 취소 등: 프로세스를 종료하고 회수한 뒤 다시 raise
+        _kill(proc, signal.SIGTERM)
+        await asyncio.shield(_wait4(loop, proc, _KILL_GRACE))
+        raise
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    usage = resources.child_usage(rusage, start)
+    return proc.returncode, tail.decode(errors="replace"), usage, timed_out
+
+
+async def _read_stream(loop, pipe, on_data):
+    """파이프를 논블로킹으로 읽어 조각마다 on_data 호출 (EOF까지)"""
+    fd = pipe.fileno()
+    os.set_blocking(fd, False)
+    eof = loop.create_future()
+
+    def on_readable():
+        try:
+            data = os.read(fd, _READ_SIZE)
+        except BlockingIOError:
+            return
+        if data:
+            on_data(data)
+        else:
+            loop.remove_reader(fd)
+            if not eof.done():
+                eof.set_result(None)
+
+    loop.add_reader(fd, on_readable)
+    try:
+        await eof
+    finally:
+        loop.remove_reader(fd)
+
+
+async def _wait4(loop, proc, kill_after=None):
+    """프로세스 종료를 기다린 뒤 os.wait4로 (status, rusage) 수집
+
+    asyncio 자식 감시자 대신 pidfd로 종료를 감지하므로 rusage를 잃지 않음.
+    kill_after 초가 지나도 끝나지 않으면 SIGKILL.
+    """
+    deadline = None if kill_after is None else time.monotonic() + kill_after
+    delay = 0.01
+    while True:
+        pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            return status, rusage
+        if deadline is not None and time.monotonic() > deadline:
+            _kill(proc, signal.SIGKILL)
+            deadline = None
+        if hasattr(os, "pidfd_open"):
+            await _pidfd_exit(loop, proc.pid, delay)
+        else:
+            await asyncio.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+
+async def _pidfd_exit(loop, pid, timeout):
+    try:
+        fd = os.pidfd_open(pid)
+    except OSError:
+        await asyncio.sleep(timeout)
+        return
+    exited = loop.create_future()
+    loop.add_reader(fd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await asyncio.wait_for(exited, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        loop.remove_reader(fd)
+        os.close(fd)
+
+
+def _kill(proc, sig):
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+# --- 여러 작업 실행 -------------------------------------------------------------
+_DONE = object()
+
+
+def run_within_budget(job, tasks, demands, budget=None):
+    """async job(task)들을 budget 안에서 하나의 이벤트 루프로 실행하고 완료 순서대로 결과 yield
+
+    tasks 순서대로 demands[i] = (스레드 수, 예상 메모리 bytes)가 남은 예산(budget)에
+    들어가는 작업을 시작하고, 들어가지 않는 작업은 건너뛰어 뒤쪽의 작은 작업이
+    남는 예산을 채움. 작업이 끝날 때마다 예산을 돌려받고 앞에서부터 다시 확인
+    (실행 중인 작업이 없으면 예산보다 큰 작업도 단독 실행).
+    외부 명령만 기다리는 작업마다 Python 워커 프로세스를 띄우지 않음.
+    이벤트 루프는 별도 스레드에서 돌고, 호출한 쪽이 반복을 멈추거나 예외(Ctrl+C 등)가
+    나면 남은 작업을 취소하고 실행 중인 프로세스를 종료함.
+    """
+    budget = budget or resources.ResourceBudget()
+    results = queue.Queue()
+    state = {}
+
+    async def schedule():
+        state["task"] = asyncio.current_task()
+        state["loop"] = asyncio.get_running_loop()
+        pending = list(zip(tasks, demands))
+        running = {}
+        try:
+            while pending or running:
+                i = 0
+                while i < len(pending):
+                    task, demand = pending[i]
+                    if not budget.fits(*demand):
+                        i += 1
+                        continue
+                    budget.acquire(*demand)
+                    running[asyncio.ensure_future(job(task))] = demand
+                    del pending[i]
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    budget.release(*running.pop(future))
+                    results.put((future.result(), None))
+        finally:
+            for future in running:
+                future.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    def thread_main():
+        try:
+            asyncio.run(schedule())
+        except asyncio.CancelledError:
+            pass
+        except BaseException as e:
+            results.put((None, e))
+        results.put((_DONE, None))
+
+    thread = threading.Thread(target=thread_main, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = results.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        if thread.is_alive() and "task" in state:
+            state["loop"].call_soon_threadsafe(state["task"].cancel)
+        thread.join()
+
+
+def run_all(job, tasks, max_workers):
+    """동시 실행 수만 max_workers로 제한하는 run_within_budget (복원 등)"""
+    budget = resources.ResourceBudget(cpus=max_workers)
+    return run_within_budget(job, tasks, [(1, 0)] * len(tasks), budget)
@@ -0,0 +1,125 @@
+import numpy as np
+from scipy.ndimage import uniform_filter
+
+# skimage.metrics.structural_similarity 기본값과 동일
+K1, K2 = 0.01, 0.03
+WIN_SIZE = 7
+
+# 한 번에 필터링할 슬랩 크기 (float64 작업 배열 하나가 캐시에 머물 정도)
+_SLAB_PIXELS = 1 << 18
+
+
+def structural_similarity_batch(
+    orig_y, recon_y, data_range=255, win_size=WIN_SIZE, return_stats=False
+):
+    """(N, H, W) 프레임 스택 전체에 대해 SSIM을 한 번에 계산
+
+    skimage structural_similarity (uniform 윈도우, sample covariance, reflect
+    경계)와 같은 정의를 따르며, win_size 박스 필터를 H, W 축으로 분리 적용.
+    프레임마다 함수를 다시 호출하지 않고 캐시 크기의 슬랩 단위로 스택을
+    처리하며, 중간 결과는 제자리(in-place) 연산으로 재사용함.
+
+    반환: 프레임별 평균 SSIM (N,)
+      return_stats=True 이면 (평균, {"min", "std"} 프레임별 SSIM 맵 통계)
+    """
+    if orig_y.shape != recon_y.shape or orig_y.ndim != 3:
+        raise ValueError(
+            f"(N, H, W) 형태의 같은 크기 입력이 필요합니다: {orig_y.shape}, {recon_y.shape}"
+        )
+    if min(orig_y.shape[1:]) < win_size:
+        raise ValueError(
+            f"프레임 크기가 win_size({win_size})보다 작습니다: {orig_y.shape}"
+        )
+
+    n, h, w = orig_y.shape
+    slab = max(1, _SLAB_PIXELS // (h * w))
+
+    mean = np.empty(n)
+    ssim_min = np.empty(n)
+    ssim_std = np.empty(n)
+    for start in range(0, n, slab):
+        stop = min(start + slab, n)
+        ssim_map = _ssim_map(
+            orig_y[start:stop], recon_y[start:stop], data_range, win_size
+        )
+        mean[start:stop] = ssim_map.mean(axis=(1, 2), dtype=np.float64)
+        if return_stats:
+            ssim_min[start:stop] = ssim_map.min(axis=(1, 2))
+            ssim_std[start:stop] = ssim_map.std(axis=(1, 2))
+
+    if not return_stats:
+        return mean
+    return mean, {"min": ssim_min, "std": ssim_std}
+
+
+def _ssim_map(orig_y, recon_y, data_range, win_size):
+    """(n, H, W) 슬랩의 SSIM 맵 (경계 pad 만큼 crop된 상태) 반환"""
+    size = (1, win_size, win_size)
+    x = orig_y.astype(np.float64)
+    y = recon_y.astype(np.float64)
+
+    ux = uniform_filter(x, size)
+    uy = uniform_filter(y, size)
+    uxx = x * x
+    uniform_filter(uxx, size, output=uxx)
+    uyy = y * y
+    uniform_filter(uyy, size, output=uyy)
+    uxy = x * y
+    uniform_filter(uxy, size, output=uxy)
+    del x, y
+
+    np_ = win_size**2
+    cov_norm = np_ / (np_ - 1)  # sample covariance
+    c1 = (K1 * data_range) ** 2
+    c2 = (K2 * data_range) ** 2
+
+    # 분산/공분산: uxx -> vx, uyy -> vy, uxy -> vxy (cov_norm은 아래에서 곱함)
+    uxx -= ux * ux
+    uyy -= uy * uy
+    uxy -= ux * uy
+    # A2 = 2 * vxy + C2, B2 = vx + vy + C2
+    a2 = uxy
+    a2 *= 2 * cov_norm
+    a2 += c2
+    b2 = uxx
+    b2 += uyy
+    b2 *= cov_norm
+    b2 += c2
+    # A1 = 2 * ux * uy + C1, B1 = ux^2 + uy^2 + C1
+    a1 = ux * uy
+    a1 *= 2
+    a1 += c1
+    b1 = ux
+    b1 *= ux
+    uy *= uy
+    b1 += uy
+    b1 += c1
+
+    a1 *= a2
+    b1 *= b2
+    a1 /= b1
+
+    # 경계 영향 제거 (skimage와 동일하게 pad 만큼 crop)
+    pad = (win_size - 1) // 2
+    return a1[:, pad:-pad, pad:-pad] if pad else a1
+
+
+def _validate_against_skimage(n=4, shape=(90, 120), seed=0):
+    """skimage 레퍼런스와 프레임별 SSIM 최대 오차 반환"""
+    from skimage.metrics import structural_similarity as ssim_metric
+
+    rng = np.random.default_rng(seed)
+    orig = rng.integers(0, 256, (n, *shape), dtype=np.uint8)
+    noise = rng.integers(-20, 21, orig.shape)
+    recon = np.clip(orig.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+    batch = structural_similarity_batch(orig, recon)
+    reference = np.array(
+        [ssim_metric(orig[i], recon[i], data_range=255) for i in range(n)]
+    )
+    return np.max(np.abs(batch - reference))
+
+
+if __name__ == "__main__":
+    max_err = _validate_against_skimage()
+    print(f"✅ skimage 대비 SSIM 최대 오차: {max_err:.3e}")
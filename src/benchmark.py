@@ -0,0 +1,300 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import config as cfg
+import step2_analyze_metrics as analyze
+import step4_evaluate as evaluate
+import yuv_io
+from batch_ssim import structural_similarity_batch
+
+# 합성 시퀀스 해상도와 기본 프레임 수 (프레임 수는 --frames로 일괄 변경 가능)
+RESOLUTIONS = {
+    "CIF": (352, 288, 100),
+    "1080p": (1920, 1080, 20),
+    "4K": (3840, 2160, 6),
+}
+
+# 비교 시 기본 허용 범위: 처리량 10% 감소, 최대 메모리 20% 증가까지 통과
+DEFAULT_TIME_THRESHOLD = 0.10
+DEFAULT_MEMORY_THRESHOLD = 0.20
+
+
+# --- 합성 YUV ----------------------------------------------------------------
+def make_sequence(path, width, height, frame_count, seed=0, noise_of=None):
+    """결정적 합성 YUV420 시퀀스 생성 (같은 인자면 항상 같은 바이트)
+
+    움직이는 그라디언트 + 사인 텍스처 + 잡음 (edge/시간 변화가 있는 내용).
+    noise_of가 주어지면 그 파일에 작은 잡음을 더한 '복원' 시퀀스를 만듦.
+    """
+    y_shape, u_shape, _ = yuv_io.plane_shapes(width, height)
+    fsize = yuv_io.frame_size(width, height)
+    src = yuv_io.open_yuv(noise_of, width, height) if noise_of else None
+    yy, xx = np.mgrid[0 : y_shape[0], 0 : y_shape[1]].astype(np.float32)
+    texture = 40 * np.sin(xx / 7.0) * np.cos(yy / 11.0)
+    with open(path, "wb") as f:
+        for t in range(frame_count):
+            rng = np.random.default_rng([seed, t])
+            if src is not None:
+                noise = rng.integers(-3, 4, fsize, dtype=np.int16)
+                frame = np.clip(src[t] + noise, 0, 255).astype(np.uint8)
+            else:
+                y = (xx * 0.25 + yy * 0.15 + 6 * t) % 160 + texture + 48
+                y += rng.normal(0, 4, y_shape).astype(np.float32)
+                uv = np.full(2 * u_shape[0] * u_shape[1], 128 + (t % 16), np.uint8)
+                frame = np.concatenate(
+                    [np.clip(y, 0, 255).astype(np.uint8).ravel(), uv]
+                )
+            frame.tofile(f)
+
+
+def prepare_sequences(work_dir, resolutions, frames=None):
+    """해상도별 (원본, 복원) 합성 시퀀스 준비, 이미 같은 크기로 있으면 재사용"""
+    sequences = {}
+    for name in resolutions:
+        width, height, n = RESOLUTIONS[name]
+        n = frames or n
+        orig = os.path.join(work_dir, f"{name}_{n}_orig.yuv")
+        recon = os.path.join(work_dir, f"{name}_{n}_recon.yuv")
+        expected = n * yuv_io.frame_size(width, height)
+        for path, kwargs in ((orig, {}), (recon, {"seed": 1, "noise_of": orig})):
+            if not os.path.exists(path) or os.path.getsize(path) != expected:
+                print(f"📦 합성 시퀀스 생성: {os.path.basename(path)}")
+                make_sequence(path, width, height, n, **kwargs)
+        sequences[name] = (orig, recon, width, height, n)
+    return sequences
+
+
+# --- 벤치마크 대상 -----------------------------------------------------------
+# 각 함수는 (orig, recon, w, h, n)을 받아 (처리 프레임 수, 읽은 바이트 수) 반환
+def _bench_yuv_read(orig, recon, w, h, n):
+    for _, chunk in yuv_io.iter_y_chunks(orig, w, h, n):
+        np.ascontiguousarray(chunk)
+    return n, n * w * h
+
+
+def _bench_frame_error_kernel(orig, recon, w, h, n):
+    original_y = yuv_io.read_y_frames(orig, w, h, n)
+    for start, chunk in yuv_io.iter_y_chunks(recon, w, h, n):
+        evaluate.frame_error_kernel(original_y[start : start + len(chunk)], chunk)
+    return n, 2 * n * w * h
+
+
+def _bench_ssim_batch(orig, recon, w, h, n):
+    original_y = yuv_io.read_y_frames(orig, w, h, n)
+    for start, chunk in yuv_io.iter_y_chunks(recon, w, h, n):
+        structural_similarity_batch(original_y[start : start + len(chunk)], chunk)
+    return n, 2 * n * w * h
+
+
+def _bench_calculate_ssnr(orig, recon, w, h, n):
+    original_y = yuv_io.read_y_frames(orig, w, h, n)
+    recon_y = yuv_io.read_y_frames(recon, w, h, n)
+    for i in range(n):
+        evaluate.calculate_ssnr(original_y[i], recon_y[i])
+    return n, 2 * n * w * h
+
+
+def _bench_calculate_metrics(orig, recon, w, h, n):
+    evaluate.calculate_metrics(orig, recon, w, h, n)
+    return n, 2 * n * w * h
+
+
+def _bench_calculate_metrics_sampled(orig, recon, w, h, n):
+    result = evaluate.calculate_metrics_sampled(orig, recon, w, h, n, "stride", 10)
+    return result["sampled_frames"], 2 * result["sampled_frames"] * w * h
+
+
+def _bench_analyze_sequence(orig, recon, w, h, n):
+    analyze._analyze_single(("bench", orig, w, h, 1.5, n, 1))
+    return n, n * w * h
+
+
+CASES = {
+    "yuv_read": _bench_yuv_read,
+    "frame_error_kernel": _bench_frame_error_kernel,
+    "ssim_batch": _bench_ssim_batch,
+    "calculate_ssnr": _bench_calculate_ssnr,
+    "calculate_metrics": _bench_calculate_metrics,
+    "calculate_metrics_sampled": _bench_calculate_metrics_sampled,
+    "analyze_sequence": _bench_analyze_sequence,
+}
+
+
+def _run_case(case, sequence, repeat):
+    """새 프로세스에서 실행: repeat번 중 최소 시간과 실행 중 최대 RSS 증가량
+
+    모듈 import는 이 프로세스가 시작될 때 끝나므로 RSS 증가량에 포함되지 않음.
+    """
+    fn = CASES[case]
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frames, n_bytes = fn(*sequence)
+        times.append(time.perf_counter() - start)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    seconds = min(times)
+    return {
+        "seconds": seconds,
+        "frames": frames,
+        "fps": frames / seconds,
+        "mb_s": n_bytes / 1024**2 / seconds,
+        "peak_rss_mb": (peak_kb - baseline_kb) / 1024,
+    }
+
+
+def run_benchmarks(resolutions, cases, frames=None, repeat=3, work_dir=None):
+    """합성 시퀀스로 각 (해상도, 대상)을 측정해 결과 dict 반환
+
+    대상마다 새 프로세스(spawn)에서 실행하므로 최대 메모리가 서로 섞이지 않음.
+    """
+    keep = work_dir is not None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="vcm_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    results = {}
+    try:
+        sequences = prepare_sequences(work_dir, resolutions, frames)
+        ctx = multiprocessing.get_context("spawn")
+        for name, case in ((r, c) for r in resolutions for c in cases):
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+                result = executor.submit(
+                    _run_case, case, sequences[name], repeat
+                ).result()
+            results[f"{name}/{case}"] = result
+            print(
+                f"⚡ {name}/{case}: {result['seconds'] * 1000:.1f}ms, "
+                f"{result['fps']:.1f} fps, {result['mb_s']:.1f} MB/s, "
+                f"+{result['peak_rss_mb']:.0f}MB"
+            )
+    finally:
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "frames": frames,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(baseline, current, time_threshold, memory_threshold):
+    """baseline 대비 처리량 감소/메모리 증가가 허용 범위를 넘는 항목 목록 반환"""
+    regressions = []
+    for key, base in baseline["results"].items():
+        cur = current["results"].get(key)
+        if cur is None:
+            continue
+        speed = cur["fps"] / base["fps"] - 1
+        # 기준 메모리가 아주 작은 항목은 잡음이 크므로 최소 16MB 기준으로 비율 계산
+        memory = (cur["peak_rss_mb"] - base["peak_rss_mb"]) / max(
+            base["peak_rss_mb"], 16
+        )
+        failed = speed < -time_threshold or memory > memory_threshold
+        mark = "❌" if failed else "✅"
+        print(
+            f"{mark} {key}: {base['fps']:.1f} -> {cur['fps']:.1f} fps ({speed:+.1%}), "
+            f"{base['peak_rss_mb']:.0f} -> {cur['peak_rss_mb']:.0f}MB ({memory:+.1%})"
+        )
+        if failed:
+            regressions.append(key)
+    return regressions
+
+
+def _default_output():
+    return os.path.join(cfg.OUTPUT_REPORT_DIR, "benchmark.json")
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save(data, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"💾 벤치마크 결과 저장: {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="합성 YUV로 지표/IO 경로 성능 측정 (실제 시퀀스, 인코더 불필요)"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    for command in ("run", "compare"):
+        p = sub.add_parser(command)
+        p.add_argument(
+            "--resolutions",
+            nargs="+",
+            choices=list(RESOLUTIONS),
+            default=["CIF", "1080p", "4K"],
+        )
+        p.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+        p.add_argument(
+            "--frames",
+            type=int,
+            default=None,
+            help="해상도별 기본값 대신 사용할 프레임 수",
+        )
+        p.add_argument("--repeat", type=int, default=3)
+        p.add_argument(
+            "--work-dir",
+            default=None,
+            help="합성 시퀀스 보관 폴더 (기본: 임시 폴더, 종료 시 삭제)",
+        )
+    sub.choices["run"].add_argument(
+        "--output",
+        default=None,
+        help="결과 JSON (기본: OUTPUT_REPORT_DIR/benchmark.json)",
+    )
+    p = sub.choices["compare"]
+    p.add_argument("baseline", help="기준 결과 JSON")
+    p.add_argument(
+        "--current", default=None, help="비교할 결과 JSON (없으면 지금 측정)"
+    )
+    p.add_argument("--time-threshold", type=float, default=DEFAULT_TIME_THRESHOLD)
+    p.add_argument("--memory-threshold", type=float, default=DEFAULT_MEMORY_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        data = run_benchmarks(
+            args.resolutions, args.cases, args.frames, args.repeat, args.work_dir
+        )
+        _save(data, args.output or _default_output())
+        return 0
+
+    baseline = _load(args.baseline)
+    if args.current:
+        current = _load(args.current)
+    else:
+        # 기준 결과와 같은 항목만 측정
+        keys = [k.split("/", 1) for k in baseline["results"]]
+        resolutions = [r for r in args.resolutions if any(k[0] == r for k in keys)]
+        cases = [c for c in args.cases if any(k[1] == c for k in keys)]
+        frames = args.frames or baseline.get("frames")
+        current = run_benchmarks(resolutions, cases, frames, args.repeat, args.work_dir)
+    regressions = compare(baseline, current, args.time_threshold, args.memory_threshold)
+    if regressions:
+        print(f"❌ 성능 저하 {len(regressions)}건: {', '.join(regressions)}")
+        return 1
+    print("✅ 기준 대비 성능 저하 없음")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import csv
+import math
+import os
+import re
+
+import pandas as pd
+
+# 프레임 기록 컬럼 (POC 순 정렬)
+FRAME_COLUMNS = ["poc", "slice_type", "qp", "bits", "psnr_y", "psnr_u", "psnr_v"]
+
+# 완전 일치 프레임 PSNR: 픽셀 평가(step4)와 같이 MSE 1e-10 기준 값으로 대체
+_LOSSLESS_PSNR = 10 * math.log10(255**2 / 1e-10)
+
+# VTM EncoderApp 프레임 로그 예:
+# POC    8 LId:  0 TId: 0 ( CRA, I-SLICE, QP 22 )   123456 bits [Y 40.1 dB    U 42.0 dB    V 43.0 dB] ...
+_VTM_FRAME_RE = re.compile(
+    r"^POC\s+(?P<poc>\d+)\s.*?\(\s*[^,]*,\s*(?P<slice_type>\w)-SLICE,\s*QP\s+(?P<qp>-?\d+)\s*\)"
+    r"\s+(?P<bits>\d+)\s+bits\s+\[Y\s+(?P<psnr_y>\S+)\s+dB\s+U\s+(?P<psnr_u>\S+)\s+dB"
+    r"\s+V\s+(?P<psnr_v>\S+)\s+dB\]"
+)
+
+
+def frames_path(bitstream_path):
+    """비트스트림 옆에 저장하는 프레임 기록 경로 (seq_qpXX.frames.csv)"""
+    return f"{os.path.splitext(bitstream_path)[0]}.frames.csv"
+
+
+def x265_csv_path(bitstream_path):
+    """x265 csv 로그(csv-log-level=1) 임시 경로 (파싱 후 frames.csv로 변환)"""
+    return f"{os.path.splitext(bitstream_path)[0]}.x265.csv"
+
+
+def parse_vtm_log(text):
+    """VTM 인코더 stdout에서 프레임별 기록 추출 (POC 순)"""
+    records = []
+    for line in text.splitlines():
+        m = _VTM_FRAME_RE.match(line.strip())
+        if m is None:
+            continue
+        records.append(
+            {
+                "poc": int(m["poc"]),
+                "slice_type": m["slice_type"],
+                "qp": int(m["qp"]),
+                "bits": int(m["bits"]),
+                "psnr_y": _to_float(m["psnr_y"]),
+                "psnr_u": _to_float(m["psnr_u"]),
+                "psnr_v": _to_float(m["psnr_v"]),
+            }
+        )
+    return sorted(records, key=lambda r: r["poc"])
+
+
+def parse_x265_csv(path):
+    """x265 csv 로그(csv-log-level=1, psnr=1)에서 프레임별 기록 추출 (POC 순)
+
+    x265 csv 헤더는 "Encode Order, Type, POC, QP, Bits, ..., Y PSNR, U PSNR, V PSNR, ..."
+    처럼 앞에 공백이 붙으므로 컬럼명을 정리해서 읽음.
+    """
+    records = []
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader, [])]
+        col = {name: i for i, name in enumerate(header)}
+        required = ["Type", "POC", "QP", "Bits", "Y PSNR", "U PSNR", "V PSNR"]
+        if any(name not in col for name in required):
+            return []
+        for row in reader:
+            # 마지막 요약 줄 등 POC가 없는 줄은 무시
+            if len(row) < len(header) or not row[col["POC"]].strip().isdigit():
+                continue
+            records.append(
+                {
+                    "poc": int(row[col["POC"]]),
+                    "slice_type": row[col["Type"]].strip()[:1],
+                    "qp": float(row[col["QP"]]),
+                    "bits": int(float(row[col["Bits"]])),
+                    "psnr_y": _to_float(row[col["Y PSNR"]]),
+                    "psnr_u": _to_float(row[col["U PSNR"]]),
+                    "psnr_v": _to_float(row[col["V PSNR"]]),
+                }
+            )
+    return sorted(records, key=lambda r: r["poc"])
+
+
+def save_frames(records, path):
+    pd.DataFrame(records, columns=FRAME_COLUMNS).to_csv(path, index=False)
+
+
+def load_frames(path):
+    """frames.csv 읽기 (없으면 None)"""
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path)
+
+
+def summarize(frames, width, height, fps):
+    """프레임 기록 -> (평균 Y PSNR, 비트레이트 kbps, bpp)
+
+    PSNR은 픽셀 평가와 같이 프레임별 Y PSNR의 평균 (완전 일치 프레임의 inf는 픽셀 평가와 같은 값).
+    비트레이트는 컨테이너 오버헤드를 제외한 비트스트림 비트 합계 기준.
+    """
+    n_frames = len(frames)
+    psnr = frames["psnr_y"].replace(math.inf, _LOSSLESS_PSNR).mean()
+    total_bits = frames["bits"].sum()
+    bitrate_kbps = total_bits / (n_frames / fps) / 1000
+    bpp = total_bits / (n_frames * width * height)
+    return psnr, bitrate_kbps, bpp
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        # 파싱할 수 없는 값은 평균에서 제외되도록 NaN
+        return math.nan
@@ -0,0 +1,145 @@
+import argparse
+import os
+import re
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import config as cfg
+
+METRICS = ("psnr", "ssim", "ssnr")
+
+# 풀링 방법 이름 규칙: mean, harmonic, median, min, max, pNN (백분위수), worstN (하위 N프레임 평균)
+# 세 지표 모두 클수록 좋으므로 worst/min/낮은 백분위수는 화질이 나쁜 프레임 쪽
+DEFAULT_POOLING = ("mean", "harmonic", "min", "p5", "worst10")
+
+_PERCENTILE_RE = re.compile(r"^p(\d+(?:\.\d+)?)$")
+_WORST_RE = re.compile(r"^worst(\d+)$")
+
+
+def vectors_path(tool, qp, file_base):
+    """(tool, QP, 시퀀스)별 프레임 지표 파일: evaluate/{tool}/qpXX/{시퀀스}.npz"""
+    return os.path.join(cfg.OUTPUT_EVALUATE_DIR, tool, f"qp{qp}", f"{file_base}.npz")
+
+
+def save_vectors(path, frames, psnr, ssim, ssnr, total_frames=None):
+    """프레임 번호와 프레임별 PSNR/SSIM/SSNR 저장 (임시 파일에 쓴 뒤 교체)
+
+    total_frames: 시퀀스 전체 프레임 수 (표본 평가면 저장된 프레임 수보다 큼, 기본: 전체 평가)
+    """
+    if total_frames is None:
+        total_frames = len(frames)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            frame=np.asarray(frames, dtype=np.int32),
+            psnr=np.asarray(psnr, dtype=np.float64),
+            ssim=np.asarray(ssim, dtype=np.float64),
+            ssnr=np.asarray(ssnr, dtype=np.float64),
+            total_frames=np.int64(total_frames),
+        )
+    os.replace(tmp_path, path)
+
+
+def load_vectors(tool, qp, file_base):
+    """{frame, psnr, ssim, ssnr, total_frames} dict (파일이 없으면 None)
+
+    total_frames가 없는 이전 파일은 전체 평가로 간주.
+    """
+    path = vectors_path(tool, qp, file_base)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        vectors = {k: data[k] for k in data.files}
+    vectors["total_frames"] = int(vectors.get("total_frames", len(vectors["frame"])))
+    return vectors
+
+
+def is_sampled(vectors):
+    """표본 평가(EVAL_SAMPLE_MODE)로 일부 프레임만 저장된 지표인지 여부"""
+    return len(vectors["frame"]) < vectors["total_frames"]
+
+
+def pool(values, method):
+    """프레임별 값 -> 풀링된 값 (method 이름 규칙은 DEFAULT_POOLING 주석 참고)"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return np.nan
+    if method == "mean":
+        return float(values.mean())
+    if method == "harmonic":
+        # 0 이하 값이 있으면 조화 평균이 정의되지 않음
+        return float(len(values) / np.sum(1.0 / values)) if values.min() > 0 else np.nan
+    if method == "median":
+        return float(np.median(values))
+    if method == "min":
+        return float(values.min())
+    if method == "max":
+        return float(values.max())
+    m = _PERCENTILE_RE.match(method)
+    if m:
+        return float(np.percentile(values, float(m.group(1))))
+    m = _WORST_RE.match(method)
+    if m:
+        n = min(int(m.group(1)), len(values))
+        return float(np.partition(values, n - 1)[:n].mean())
+    raise ValueError(f"알 수 없는 풀링 방법: {method}")
+
+
+def pool_table(
+    tools=None,
+    qps=None,
+    file_bases=None,
+    methods=DEFAULT_POOLING,
+    include_sampled=False,
+):
+    """저장된 프레임 지표로 (tool, qp, file)별 풀링 결과 표 생성 (YUV를 읽지 않음)
+
+    컬럼: tool, qp, file, frames, total_frames, sampled, {지표}_{방법} (예: psnr_p5)
+    프레임 지표 파일이 없는 작업은 제외.
+    표본 평가 결과는 min/pNN/worstN이 시퀀스 전체 통계가 아니므로 기본적으로 제외
+    (include_sampled=True면 포함하고 sampled 컬럼으로 구분).
+    """
+    tools = tools or ["HEVC", "VVC"]
+    qps = qps or cfg.QP_LIST
+    file_bases = file_bases or list(cfg.FR_DICT)
+    rows = []
+    for tool, qp, file_base in product(tools, qps, file_bases):
+        vectors = load_vectors(tool, qp, file_base)
+        if vectors is None:
+            continue
+        sampled = is_sampled(vectors)
+        if sampled and not include_sampled:
+            continue
+        row = {"tool": tool, "qp": qp, "file": file_base}
+        row["frames"] = len(vectors["frame"])
+        row["total_frames"] = vectors["total_frames"]
+        row["sampled"] = sampled
+        for metric, method in product(METRICS, methods):
+            row[f"{metric}_{method}"] = pool(vectors[metric], method)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="저장된 프레임별 지표로 풀링 통계 계산 (pooled_metrics.csv)"
+    )
+    parser.add_argument(
+        "methods",
+        nargs="*",
+        default=list(DEFAULT_POOLING),
+        help="mean, harmonic, median, min, max, pNN, worstN",
+    )
+    parser.add_argument(
+        "--include-sampled",
+        action="store_true",
+        help="표본 평가 결과도 포함 (sampled 컬럼으로 구분, 통계는 표본 프레임 기준)",
+    )
+    args = parser.parse_args()
+    table = pool_table(methods=args.methods, include_sampled=args.include_sampled)
+    out_path = os.path.join(cfg.OUTPUT_REPORT_DIR, "pooled_metrics.csv")
+    table.to_csv(out_path, index=False)
+    print(f"💾 풀링 결과 저장 완료 ({len(table)}개 작업): {out_path}")
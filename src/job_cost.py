@@ -0,0 +1,125 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+import config as cfg
+
+# QP가 12 낮아질 때마다 인코딩 시간이 약 2배가 된다고 가정 (기록이 없을 때의 초기 모델)
+_QP_REF, _QP_DOUBLING = 32, 12
+# job_timings.csv 열 (새 열은 끝에만 추가: 이전 헤더로 쓰인 기록도 위치로 읽을 수 있음)
+_COLUMNS = ["tool", "base_name", "qp", "seconds", "peak_rss_mb", "threads"]
+
+
+def timings_path():
+    return os.path.join(cfg.OUTPUT_REPORT_DIR, "job_timings.csv")
+
+
+def estimate_costs(job_df, tool, qp_list, analysis_path=None):
+    """(base_name, qp) -> 예상 소요 시간(초, 기록이 없으면 상대 단위)
+
+    초기 모델: width * height * frame_count * (0.5 + complexity_score) * QP 계수.
+    이전 실행 기록(job_timings.csv)이 있으면
+      - 같은 (tool, 시퀀스, QP) 기록은 그 실측 시간을 그대로 사용
+      - 나머지는 기록들의 (실측 / 모델) 중앙값으로 모델을 초 단위로 보정
+    """
+    if analysis_path is None:
+        analysis_path = os.path.join(cfg.OUTPUT_ANALYSIS_DIR, "vcm_analysis_report.csv")
+
+    complexity = {}
+    if os.path.exists(analysis_path):
+        report = pd.read_csv(analysis_path)
+        if "complexity_score" in report.columns:
+            complexity = dict(zip(report["base_name"], report["complexity_score"]))
+
+    model = {}
+    for row in job_df.to_dict("records"):
+        pixels = int(row["width"]) * int(row["height"]) * int(row["frame_count"])
+        score = complexity.get(row["base_name"], 0.5)
+        for qp in qp_list:
+            qp_factor = 2 ** ((_QP_REF - qp) / _QP_DOUBLING)
+            model[(row["base_name"], qp)] = pixels * (0.5 + score) * qp_factor
+
+    measured = _load_timings(tool)
+    ratios = [measured[k] / model[k] for k in measured if k in model and model[k] > 0]
+    scale = float(np.median(ratios)) if ratios else 1.0
+
+    return {k: measured.get(k, v * scale) for k, v in model.items()}
+
+
+def record_timing(tool, base_name, qp, seconds, peak_rss_mb=None, threads=None):
+    """작업 실측 시간/최대 메모리/스레드 수 기록 (부모 프로세스에서 호출, 같은 키는 마지막 기록 사용)
+
+    기존 파일의 헤더가 현재 열과 다르면 (이전 버전 기록) 새 헤더로 다시 씀 (없는 열은 빈 값).
+    """
+    path = timings_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rss = "" if peak_rss_mb is None else f"{peak_rss_mb:.1f}"
+    row = [
+        tool,
+        base_name,
+        qp,
+        f"{seconds:.3f}",
+        rss,
+        "" if threads is None else threads,
+    ]
+    if not os.path.exists(path) or _read_header(path) == _COLUMNS:
+        new_file = not os.path.exists(path)
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(_COLUMNS)
+            writer.writerow(row)
+        return
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(_COLUMNS)
+        writer.writerows(_read_rows(path))
+        writer.writerow(row)
+    os.replace(tmp_path, path)
+
+
+def load_peak_rss(tool):
+    """(base_name, qp) -> (최근 실측 최대 메모리 MB, 그때의 인코더 스레드 수)
+
+    기록이 없는 작업은 제외, 스레드 수가 없는 이전 기록은 1로 간주.
+    """
+    df = _latest_records(tool, "peak_rss_mb")
+    return {
+        (base_name, int(qp)): (float(value), int(float(threads or 1)))
+        for base_name, qp, value, threads in zip(
+            df["base_name"], df["qp"], df["peak_rss_mb"], df["threads"]
+        )
+    }
+
+
+def _load_timings(tool):
+    df = _latest_records(tool, "seconds")
+    return {
+        (base_name, int(qp)): float(value)
+        for base_name, qp, value in zip(df["base_name"], df["qp"], df["seconds"])
+    }
+
+
+def _latest_records(tool, column):
+    """tool의 column 값이 있는 기록, 같은 (시퀀스, QP)는 가장 최근 기록만"""
+    path = timings_path()
+    rows = _read_rows(path) if os.path.exists(path) else []
+    df = pd.DataFrame(rows, columns=_COLUMNS)
+    df = df[(df["tool"] == tool) & (df[column] != "")]
+    return df.drop_duplicates(subset=["base_name", "qp"], keep="last")
+
+
+def _read_header(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), None)
+
+
+def _read_rows(path):
+    """헤더를 제외한 기록 (열은 끝에만 추가되므로 위치로 읽고, 짧은 줄은 빈 값으로 채움)"""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return [(row + [""] * len(_COLUMNS))[: len(_COLUMNS)] for row in reader if row]
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import time
+
+import config as cfg
+import run_manifest
+
+# 이어서 실행 여부를 워커 프로세스와 공유하는 환경 변수 (main.py --resume 또는 cfg.RESUME)
+_RESUME_ENV = "VCM_RESUME"
+
+# 작업 상태 (같은 작업의 마지막 기록 기준)
+#   done: 완료 기록이 있고 입력/산출물이 기록 당시 그대로
+#   failed: 실패로 끝남
+#   partial: 시작 기록만 있음 (실행 중 중단) 또는 완료 후 입력/산출물이 바뀌거나 사라짐
+STATES = ("done", "failed", "partial")
+
+
+def journal_path():
+    return os.path.join(cfg.OUTPUT_REPORT_DIR, "job_journal.jsonl")
+
+
+def resume_enabled():
+    """이전 실행에서 완료된 작업을 건너뛰는지 여부"""
+    value = os.environ.get(_RESUME_ENV)
+    if value is not None:
+        return value == "1"
+    return bool(getattr(cfg, "RESUME", False))
+
+
+def set_resume(value):
+    """이 프로세스와 이후 생성되는 워커의 이어서 실행 여부 설정"""
+    os.environ[_RESUME_ENV] = "1" if value else "0"
+
+
+def partial_path(path):
+    """산출물을 쓰는 동안의 임시 이름: {이름}.partial{확장자}
+
+    확장자를 유지하므로 ffmpeg 등이 출력 형식을 그대로 판단함.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.partial{ext}"
+
+
+def publish(tmp_path, path):
+    """임시 파일을 디스크에 내린 뒤 최종 이름으로 원자적으로 교체
+
+    중단되더라도 최종 이름에는 완성된 파일만 존재함.
+    """
+    fd = os.open(tmp_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path))
+
+
+def discard(path):
+    """실패한 작업의 임시 파일 제거 (없으면 무시)"""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def record(event, stage, tool, qp, sequence, inputs=(), outputs=(), error=None):
+    """작업 상태 변화(start/done/failed)를 job_journal.jsonl에 한 줄 추가 후 fsync
+
+    done이면 입력/산출물 파일별 (size, mtime)을 함께 기록해 다음 실행에서
+    그대로인지 확인함 (앞 단계가 다시 실행되어 입력이 바뀌면 완료로 보지 않음).
+    """
+    entry = {
+        "run_id": run_manifest.run_id(),
+        "event": event,
+        "stage": stage,
+        "tool": tool,
+        "qp": qp,
+        "sequence": sequence,
+        "inputs": {p: _stat(p) for p in inputs},
+        "outputs": {p: _stat(p) for p in outputs},
+        "error": error[-500:] if error else None,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "pid": os.getpid(),
+    }
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    path = journal_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # O_APPEND + 한 번의 write로 여러 워커가 동시에 써도 줄이 섞이지 않음
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """job_journal.jsonl을 읽어 작업별 마지막 상태를 조회
+
+    쓰다 만 마지막 줄(중단 시)은 무시하고 줄바꿈으로 닫아 이후 기록과 섞이지 않게 함
+    (작업을 시작하기 전에 열어야 함).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or journal_path()
+        self._last = {}  # (단계, tool, QP, 시퀀스) -> 마지막 기록
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                key = (entry["stage"], entry["tool"], entry["qp"], entry["sequence"])
+                self._last[key] = entry
+
+    def state(self, stage, tool, qp, sequence):
+        """작업 상태 (STATES 중 하나, 기록이 없으면 None)"""
+        entry = self._last.get((stage, tool, qp, sequence))
+        if entry is None:
+            return None
+        if entry["event"] == "failed":
+            return "failed"
+        files = {**entry["inputs"], **entry["outputs"]}
+        if entry["event"] == "done" and all(_stat(p) == st for p, st in files.items()):
+            return "done"
+        return "partial"
+
+    def completed(self, stage, tool, qp, sequence):
+        return self.state(stage, tool, qp, sequence) == "done"
+
+    def summary(self):
+        """단계/tool별 상태 개수"""
+        counts = {}
+        for stage, tool, qp, sequence in self._last:
+            state = self.state(stage, tool, qp, sequence)
+            key = (stage, tool, state)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+
+def open_journal():
+    """이어서 실행(resume)이 꺼져 있으면 None (모든 작업 실행)"""
+    if not resume_enabled():
+        return None
+    return Journal()
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _fsync_dir(path):
+    fd = os.open(path or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="job_journal.jsonl 작업 상태 요약")
+    parser.parse_args()
+    counts = Journal().summary()
+    if not counts:
+        print("⚠️ 작업 기록이 없습니다.")
+    for (stage, tool, state), n in sorted(counts.items()):
+        print(f"📋 {stage:10s} {tool:5s} {state:8s} {n}")
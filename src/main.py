@@ -1,3 +1,5 @@
+import argparse
+
 import config as cfg  # 설정 파일 로드
 from step1_check_resolution import run_check_resolution
 from step2_analyze_metrics import run_analyze_metrics
@@ -6,9 +8,15 @@ from step3_2_compress_vvc import run_compress_vvc
 from step3_3_decode import run_decode
 from step4_evaluate import run_evaluate
 from step5_eval_visualizer import run_visualize
+from pipeline import run_pipeline
+import job_journal
+import profiling
+import run_manifest
 
 
-def main():
+def main(overlap=False):
+    # 이번 실행의 모든 작업 기록(run_manifest.jsonl)을 같은 실행 ID로 묶음
+    print(f"📋 실행 ID: {run_manifest.new_run()}")
     print("🚀 해상도 체크 준비 중...")
     run_check_resolution(cfg.ROI_PATH)
     print("🚀 해상도 체크 완료...")
@@ -17,6 +25,20 @@ def main():
     run_analyze_metrics(cfg.ROI_PATH)
     print("🚀 메트릭 분석 완료...")
 
+    if overlap:
+        # 압축 -> 복원 -> 평가를 작업 단위 의존성으로 겹쳐 실행
+        print("🚀 압축/복원/평가 파이프라인 준비 중...")
+        run_pipeline()
+        print("🚀 압축/복원/평가 파이프라인 완료...")
+    else:
+        _run_stages()
+
+    print("🚀 시각화 준비 중...")
+    run_visualize()
+    print("🚀 시각화 완료...")
+
+
+def _run_stages():
     print("🚀 HEVC 압축 준비 중...")
     run_compress_hevc()
     print("🚀 HEVC 압축 완료...")
@@ -33,10 +55,30 @@ def main():
     run_evaluate()
     print("🚀 평가 완료...")
 
-    print("🚀 시각화 준비 중...")
-    run_visualize()
-    print("🚀 시각화 완료...")
-
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Video Codec Analysis Pipeline")
+    parser.add_argument(
+        "--overlap",
+        action="store_true",
+        help="압축/복원/평가 단계를 장벽 없이 (시퀀스, tool, QP) 단위로 겹쳐 실행",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=profiling.MODES,
+        default=None,
+        help="단계/워커별 프로파일 저장 (cprofile: 전체 호출, sample: 저부하 샘플링), "
+        "결과: results/report/profile/<실행 ID>/<단계>.prof (snakeviz로 열기)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="중단된 실행 이어서 하기: 이전 실행에서 완료된 압축/복원/평가 작업은 건너뛰고 "
+        "실패했거나 중간에 끊긴 작업만 다시 실행 (기록: results/report/job_journal.jsonl)",
+    )
+    args = parser.parse_args()
+    if args.resume:
+        job_journal.set_resume(True)
+    if args.profile:
+        profiling.set_mode(args.profile)
+    main(overlap=args.overlap)
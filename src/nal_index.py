@@ -0,0 +1,378 @@
+import argparse
+import os
+import struct
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import config as cfg
+import profiling
+
+# 인덱스 형식이 바뀌면 올려서 캐시된 인덱스를 다시 생성
+_INDEX_VERSION = 1
+
+# 코덱별 NAL 유형 (HEVC: H.265 Table 7-1, VVC: H.266 Table 5)
+_CODECS = {
+    "hevc": {
+        "vcl_max": 31,  # 0~31: VCL
+        "aud": 35,
+        "ph": None,
+        # 현재 픽처 뒤에 붙는 non-VCL: EOS, EOB, FD, SUFFIX_SEI
+        "suffix": {36, 37, 38, 40},
+    },
+    "vvc": {
+        "vcl_max": 11,  # 0~11: VCL
+        "aud": 20,
+        "ph": 19,
+        # EOS, EOB, SUFFIX_SEI, FD
+        "suffix": {21, 22, 24, 25},
+    },
+}
+
+_BITSTREAM_EXTS = (".bin", ".mp4", ".hevc", ".265", ".vvc", ".266")
+
+
+def index_path(bitstream_path):
+    """비트스트림 옆에 저장하는 NAL 인덱스 경로 (seq_qpXX.nalidx.npz)"""
+    return f"{os.path.splitext(bitstream_path)[0]}.nalidx.npz"
+
+
+def codec_of(bitstream_path, codec=None):
+    """경로로 코덱 추정: HEVC 폴더/.mp4/.265/.hevc -> hevc, 그 외 (.bin 등) -> vvc"""
+    if codec is not None:
+        return codec
+    path = bitstream_path.replace("\\", "/")
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".mp4", ".265", ".hevc") or "/HEVC/" in path:
+        return "hevc"
+    return "vvc"
+
+
+def index_bitstream(bitstream_path, codec=None):
+    """Annex-B 또는 MP4 비트스트림의 픽처(디코딩 순서)별 NAL 통계
+
+    반환: {"bits", "vcl_bits", "temporal_id", "nal_type"} (픽처 수 길이의 numpy 배열)
+      - bits: 픽처의 VCL NAL + 앞에 오는 파라미터 셋/SEI 등 non-VCL NAL 비트 합계
+        (시작 코드, MP4 길이 필드/박스 등 컨테이너 오버헤드 제외)
+      - vcl_bits: VCL NAL(슬라이스)만의 비트 합계
+    파싱할 수 없는 입력(잘린 MP4 등)은 ValueError.
+    """
+    codec = codec_of(bitstream_path, codec)
+    with open(bitstream_path, "rb") as f:
+        data = f.read()
+
+    builder = _PictureBuilder(_CODECS[codec])
+    if data[4:8] == b"ftyp":
+        try:
+            length_size, param_sets, samples = _mp4_samples(data)
+        except (IndexError, struct.error) as e:
+            # 박스 크기/테이블 개수가 파일 범위를 벗어남 (잘리거나 손상된 파일)
+            raise ValueError(f"MP4 구조 손상: {e}") from e
+        for nal in param_sets:
+            builder.add(nal)
+        for start, end in samples:
+            builder.start_access_unit()
+            for nal in _length_prefixed_nals(data, start, end, length_size):
+                builder.add(nal)
+    else:
+        for nal in _annexb_nals(data):
+            builder.add(nal)
+    return builder.finish()
+
+
+def load_index(bitstream_path, codec=None):
+    """캐시된 NAL 인덱스 반환 (없거나 비트스트림이 바뀌었으면 새로 만들어 저장)
+
+    캐시 파일을 읽을 수 없으면 (쓰다 만 파일 등) 캐시가 없는 것으로 보고 다시 만듦.
+    """
+    st = os.stat(bitstream_path)
+    stamp = np.array([_INDEX_VERSION, st.st_size, st.st_mtime_ns], dtype=np.int64)
+    cache_path = index_path(bitstream_path)
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as cached:
+                if np.array_equal(cached["stamp"], stamp):
+                    return {k: cached[k] for k in cached.files if k != "stamp"}
+        except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+            pass
+
+    index = index_bitstream(bitstream_path, codec)
+    tmp_path = f"{cache_path}.tmp.npz"
+    np.savez(tmp_path, stamp=stamp, **index)
+    os.replace(tmp_path, cache_path)
+    return index
+
+
+def layer_bits(index):
+    """temporal id -> 비트 합계"""
+    tids = index["temporal_id"]
+    return {int(t): int(index["bits"][tids == t].sum()) for t in np.unique(tids)}
+
+
+def rate_summary(bitstream_path, fps, codec=None):
+    """비트스트림 비트레이트 요약 (디코딩 없이 NAL 인덱스 기반)"""
+    index = load_index(bitstream_path, codec)
+    n_frames = len(index["bits"])
+    total_bits = int(index["bits"].sum())
+    summary = {
+        "bitstream": bitstream_path,
+        "frames": n_frames,
+        "total_bits": total_bits,
+        "container_overhead_bits": os.path.getsize(bitstream_path) * 8 - total_bits,
+        "bitrate_kbps": total_bits / (n_frames / fps) / 1000 if n_frames else 0.0,
+    }
+    for tid, bits in layer_bits(index).items():
+        summary[f"tid{tid}_bits"] = bits
+    return summary
+
+
+class _PictureBuilder:
+    """NAL 단위를 디코딩 순서대로 받아 픽처별로 묶음"""
+
+    def __init__(self, codec):
+        self.codec = codec
+        self.pictures = []  # [bits, vcl_bits, temporal_id, nal_type]
+        self.carry = 0  # 다음 픽처에 붙을 non-VCL 비트 (파라미터 셋, prefix SEI 등)
+        self.new_au = True
+
+    def start_access_unit(self):
+        self.new_au = True
+
+    def add(self, nal):
+        if len(nal) < 2:
+            return
+        codec = self.codec
+        if codec["ph"] is None:
+            nal_type = (nal[0] >> 1) & 0x3F
+        else:
+            nal_type = (nal[1] >> 3) & 0x1F
+        temporal_id = (nal[1] & 0x07) - 1
+        bits = len(nal) * 8
+
+        is_vcl = nal_type <= codec["vcl_max"]
+        if nal_type in (codec["aud"], codec["ph"]):
+            self.new_au = True
+        # 슬라이스 헤더 첫 비트: HEVC first_slice_segment_in_pic_flag,
+        # VVC sh_picture_header_in_slice_header_flag (PH NAL이 없는 픽처의 시작)
+        if is_vcl and len(nal) > 2 and nal[2] & 0x80:
+            self.new_au = True
+
+        if is_vcl:
+            if self.new_au or not self.pictures:
+                self.pictures.append([self.carry, 0, temporal_id, nal_type])
+                self.carry = 0
+                self.new_au = False
+            picture = self.pictures[-1]
+            picture[0] += bits
+            picture[1] += bits
+        elif nal_type in codec["suffix"] and self.pictures and not self.new_au:
+            self.pictures[-1][0] += bits
+        else:
+            self.carry += bits
+
+    def finish(self):
+        if self.carry and self.pictures:
+            self.pictures[-1][0] += self.carry
+        table = np.array(self.pictures, dtype=np.int64).reshape(-1, 4)
+        return {
+            "bits": table[:, 0],
+            "vcl_bits": table[:, 1],
+            "temporal_id": table[:, 2].astype(np.int8),
+            "nal_type": table[:, 3].astype(np.int8),
+        }
+
+
+def _annexb_nals(data):
+    """Annex-B 바이트열에서 NAL 단위 (시작 코드와 뒤쪽 0 바이트 제외) 순회"""
+    pos = data.find(b"\x00\x00\x01")
+    while pos != -1:
+        start = pos + 3
+        pos = data.find(b"\x00\x00\x01", start)
+        end = len(data) if pos == -1 else pos
+        # 4바이트 시작 코드의 zero_byte, trailing_zero_8bits는 NAL에 포함되지 않음
+        while end > start and data[end - 1] == 0:
+            end -= 1
+        if end > start:
+            yield memoryview(data)[start:end]
+
+
+def _length_prefixed_nals(data, start, end, length_size):
+    """MP4 샘플(길이 필드 + NAL 반복)에서 NAL 단위 순회"""
+    pos = start
+    while pos + length_size <= end:
+        size = int.from_bytes(data[pos : pos + length_size], "big")
+        pos += length_size
+        yield memoryview(data)[pos : pos + size]
+        pos += size
+
+
+def _mp4_boxes(data, start, end):
+    """[start, end) 범위의 MP4 박스 (type, payload_start, box_end) 순회"""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            break
+        yield box_type.decode("latin-1"), pos + header, pos + size
+        pos += size
+
+
+def _find_box(data, start, end, path):
+    """박스 경로(예: ["moov", "trak"])의 첫 번째 박스 (payload_start, box_end)"""
+    for box_type, payload, box_end in _mp4_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            found = _find_box(data, payload, box_end, path[1:])
+            if found is not None:
+                return found
+    return None
+
+
+def _mp4_samples(data):
+    """단일 비디오 트랙 MP4 -> (길이 필드 크기, 파라미터 셋 NAL 목록, 샘플 (start, end) 목록)"""
+    moov = _find_box(data, 0, len(data), ["moov"])
+    if moov is None:
+        raise ValueError("moov 박스 없음")
+    for box_type, payload, box_end in _mp4_boxes(data, *moov):
+        if box_type != "trak":
+            continue
+        stbl = _find_box(data, payload, box_end, ["mdia", "minf", "stbl"])
+        if stbl is None:
+            continue
+        config = _sample_entry_config(data, *stbl)
+        if config is None:
+            continue  # 비디오(hvcC/vvcC) 트랙이 아님
+        length_size, param_sets = config
+        return length_size, param_sets, _sample_ranges(data, *stbl)
+    raise ValueError("HEVC(hvcC) 비디오 트랙 없음")
+
+
+def _sample_entry_config(data, start, end):
+    """stsd의 hvcC에서 (길이 필드 크기, 파라미터 셋 NAL 목록), 비디오 트랙이 아니면 None"""
+    stsd = _find_box(data, start, end, ["stsd"])
+    if stsd is None:
+        return None
+    # stsd: version/flags(4) + entry_count(4), VisualSampleEntry 헤더는 78바이트
+    for entry_type, payload, entry_end in _mp4_boxes(data, stsd[0] + 8, stsd[1]):
+        if entry_type not in ("hvc1", "hev1"):
+            continue
+        hvcc = _find_box(data, payload + 78, entry_end, ["hvcC"])
+        if hvcc is None:
+            return None
+        pos = hvcc[0]
+        length_size = (data[pos + 21] & 0x03) + 1
+        num_arrays = data[pos + 22]
+        pos += 23
+        param_sets = []
+        for _ in range(num_arrays):
+            num_nalus = struct.unpack_from(">H", data, pos + 1)[0]
+            pos += 3
+            for _ in range(num_nalus):
+                size = struct.unpack_from(">H", data, pos)[0]
+                param_sets.append(memoryview(data)[pos + 2 : pos + 2 + size])
+                pos += 2 + size
+        return length_size, param_sets
+    return None
+
+
+def _sample_ranges(data, start, end):
+    """stsz/stsc/stco(co64)로 샘플별 (start, end) 파일 오프셋 계산"""
+    stsz = _find_box(data, start, end, ["stsz"])
+    stsc = _find_box(data, start, end, ["stsc"])
+    stco = _find_box(data, start, end, ["stco"])
+    co64 = _find_box(data, start, end, ["co64"])
+    if stsz is None or stsc is None or (stco is None and co64 is None):
+        raise ValueError("샘플 테이블(stsz/stsc/stco) 없음")
+
+    uniform_size, count = struct.unpack_from(">II", data, stsz[0] + 4)
+    if uniform_size:
+        sizes = [uniform_size] * count
+    else:
+        sizes = struct.unpack_from(f">{count}I", data, stsz[0] + 12)
+
+    if stco is not None:
+        n = struct.unpack_from(">I", data, stco[0] + 4)[0]
+        chunk_offsets = struct.unpack_from(f">{n}I", data, stco[0] + 8)
+    else:
+        n = struct.unpack_from(">I", data, co64[0] + 4)[0]
+        chunk_offsets = struct.unpack_from(f">{n}Q", data, co64[0] + 8)
+
+    n_entries = struct.unpack_from(">I", data, stsc[0] + 4)[0]
+    entries = [
+        struct.unpack_from(">III", data, stsc[0] + 8 + 12 * i) for i in range(n_entries)
+    ]
+
+    ranges = []
+    sample = 0
+    for i, (first_chunk, per_chunk, _) in enumerate(entries):
+        last_chunk = entries[i + 1][0] - 1 if i + 1 < n_entries else len(chunk_offsets)
+        for chunk in range(first_chunk - 1, last_chunk):
+            offset = chunk_offsets[chunk]
+            for _ in range(per_chunk):
+                if sample >= count:
+                    return ranges
+                ranges.append((offset, offset + sizes[sample]))
+                offset += sizes[sample]
+                sample += 1
+    return ranges
+
+
+@profiling.worker("nal_index")
+def _summary_single(args):
+    path, fps = args
+    try:
+        return rate_summary(path, fps), None
+    except (OSError, ValueError, struct.error) as e:
+        return None, f"{path}: {e}"
+
+
+@profiling.stage("nal_index")
+def run_index(roots=None, max_workers=None):
+    """압축 결과 폴더의 모든 비트스트림을 인덱싱하고 bitstream_rate.csv 저장"""
+    if roots is None:
+        roots = [cfg.OUTPUT_COMPRESSED_HEVC_DIR, cfg.OUTPUT_COMPRESSED_VVC_DIR]
+    if max_workers is None:
+        max_workers = max(1, os.cpu_count() - 1)
+
+    jobs = []
+    for root in roots:
+        for dirpath, _, filenames in os.walk(root):
+            for name in sorted(filenames):
+                if name.lower().endswith(_BITSTREAM_EXTS):
+                    base_name = name.rsplit("_qp", 1)[0]
+                    fps = cfg.FR_DICT.get(base_name, (None, 30))[1]
+                    jobs.append((os.path.join(dirpath, name), fps))
+
+    print(f"🚀 비트스트림 인덱싱 시작 (워커: {max_workers}, 파일 개수: {len(jobs)})")
+    rows = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for summary, err_msg in executor.map(_summary_single, jobs, chunksize=16):
+            if summary is None:
+                print(f"❌ 인덱싱 실패: {err_msg}")
+            else:
+                rows.append(summary)
+
+    if rows:
+        os.makedirs(cfg.OUTPUT_REPORT_DIR, exist_ok=True)
+        csv_path = os.path.join(cfg.OUTPUT_REPORT_DIR, "bitstream_rate.csv")
+        pd.DataFrame(rows).to_csv(csv_path, index=False)
+        print(f"💾 비트스트림 비트레이트 저장 완료: {csv_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="HEVC/VVC 비트스트림 NAL 인덱싱 (디코딩 없이 픽처/계층별 비트 집계)"
+    )
+    parser.add_argument(
+        "roots", nargs="*", help="비트스트림 폴더 (기본: HEVC/VVC 압축 결과 폴더)"
+    )
+    args = parser.parse_args()
+    run_index(args.roots or None)
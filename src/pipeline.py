@@ -0,0 +1,307 @@
+import os
+import shutil
+from itertools import product
+
+import config as cfg
+import frame_metrics
+import job_cost
+import job_journal
+import pipeline_cache
+import profiling
+import progress
+import resources
+import results_db
+import shared_cache
+import step3_1_compress_hevc as hevc
+import step3_2_compress_vvc as vvc
+import step3_3_decode as decode
+import step4_evaluate as evaluate
+from scheduler import Task, run_dag
+
+TOOLS = ["HEVC", "VVC"]
+_COMPRESSED_DIRS = {
+    "HEVC": cfg.OUTPUT_COMPRESSED_HEVC_DIR,
+    "VVC": cfg.OUTPUT_COMPRESSED_VVC_DIR,
+}
+_ENCODERS = {"HEVC": hevc, "VVC": vvc}
+
+# 준비된 작업 중 하위 단계를 먼저 제출 (결과를 빨리 내고 중간 산출물 적체 방지)
+# VVC 인코딩은 가장 오래 걸리므로 HEVC보다 먼저 시작.
+# 같은 단계 안에서는 예상 소요 시간(job_cost)이 긴 작업부터 제출 (LPT)
+_PRIORITY = {"evaluate": 0, "decode": 1, "encode/VVC": 2, "encode/HEVC": 3}
+
+
+@profiling.stage("pipeline")
+def run_pipeline(max_workers=None):
+    """(시퀀스, tool, QP) 단위 압축 -> 복원 -> 평가를 하나의 워커 풀에서 겹쳐 실행
+
+    단계 간 장벽 없이, 인코딩이 끝난 작업은 바로 복원되고 복원이 끝난 작업은
+    바로 평가됨. 결과는 step3/step4와 같은 경로와 evaluation_{tool}.csv에 저장.
+    --resume이면 이전 실행에서 완료된 작업은 건너뛰고 중단/실패한 작업만 다시 실행.
+    동시 실행은 CPU/메모리 예산(resources) 안으로 제한하며, max_workers는 CPU 예산 상한.
+    """
+    budget = resources.ResourceBudget(cpus=max_workers)
+    max_workers = budget.cpus
+
+    job_df = hevc.build_job_df()
+    rows = job_df.to_dict("records")
+    cache = pipeline_cache.open_cache()
+    journal = job_journal.open_journal()
+    budget_bytes = getattr(cfg, "ORIGINAL_CACHE_MB", 4096) * 1024**2
+    store = results_db.open_store()
+    costs = {tool: job_cost.estimate_costs(job_df, tool, cfg.QP_LIST) for tool in TOOLS}
+    plans = {
+        tool: resources.plan_jobs(tool, job_df, budget.cpus, budget.memory_bytes)
+        for tool in TOOLS
+    }
+
+    stream_decode = getattr(cfg, "EVAL_STREAM_DECODE", False)
+    tracker = progress.Tracker()
+
+    with shared_cache.SharedOriginalCache(budget_bytes) as original_cache:
+        tasks = []
+        for tool, qp, row in product(TOOLS, cfg.QP_LIST, rows):
+            cost = costs[tool][(row["base_name"], qp)]
+            demand = plans[tool][row["base_name"]]
+            tasks.append(
+                _encode_task(tool, row, qp, cache, journal, tracker, cost, demand)
+            )
+            if stream_decode:
+                # 복원 YUV 없이 평가 작업이 디코더 출력을 파이프로 바로 받음
+                eval_dep = f"encode/{tool}/qp{qp}/{row['base_name']}"
+            else:
+                tasks.append(
+                    _decode_task(tool, row["base_name"], qp, cache, journal, tracker)
+                )
+                eval_dep = f"decode/{tool}/qp{qp}/{row['base_name']}"
+            tasks.append(
+                _evaluate_task(
+                    tool,
+                    row["base_name"],
+                    qp,
+                    cache,
+                    journal,
+                    original_cache,
+                    store,
+                    tracker,
+                    eval_dep,
+                )
+            )
+        for task in tasks:
+            tracker.add(*_task_job(task.name))
+
+        def on_skip(task, failed_dep):
+            tracker.done(*_task_job(task.name), "skipped")
+            _report_skip(task, failed_dep)
+
+        print(f"🚀 파이프라인 시작 ({budget.describe()}, 총 작업 개수: {len(tasks)})")
+        with tracker:
+            run_dag(tasks, max_workers, on_skip=on_skip, budget=budget)
+
+    # CSV 저장 순서는 run_evaluate와 동일 (tool -> QP -> 시퀀스)
+    base_names = {r["base_name"] for r in rows}
+    eval_order = [
+        t for t in product(TOOLS, cfg.QP_LIST, cfg.FR_DICT) if t[2] in base_names
+    ]
+    evaluate.save_evaluation_csv(eval_order, store)
+
+    for tool in TOOLS:
+        output_root = _COMPRESSED_DIRS[tool]
+        zip_base_name = os.path.join(
+            os.path.dirname(output_root), f"compress_{tool.lower()}"
+        )
+        shutil.make_archive(zip_base_name, "zip", output_root)
+        print(f"📦 {tool} 압축 결과 ZIP 파일 생성 완료: {zip_base_name}.zip")
+
+
+def _encode_task(tool, row, qp, cache, journal, tracker, cost=0.0, demand=(1, 0)):
+    module = _ENCODERS[tool]
+    output_root = _COMPRESSED_DIRS[tool]
+    args = (row, cfg.ROI_PATH, output_root, qp, demand[0])
+    priority = row.get("compress_priority", 999)
+    state = {}
+
+    def prepare():
+        os.makedirs(os.path.join(output_root, f"qp{qp}"), exist_ok=True)
+        if journal is not None and journal.completed(
+            "encode", tool, qp, row["base_name"]
+        ):
+            print(
+                f"⏭️ [{tool}] [{priority}] {row['base_name']} 이전 실행에서 완료, 압축 생략 (QP {qp})"
+            )
+            state["cached"] = True
+            return (priority, row["base_name"], qp, True, None, None), args
+        if cache is not None:
+            state["name"], state["key"] = module._job_key(cache, *args)
+            if cache.lookup(state["name"], state["key"]):
+                print(
+                    f"⏭️ [{tool}] [{priority}] {row['base_name']} 캐시 유효, 압축 생략 (QP {qp})"
+                )
+                state["cached"] = True
+                return (priority, row["base_name"], qp, True, None, None), args
+            cache.invalidate(state["name"])
+        return None, args
+
+    def finish(result):
+        _, base_name, qp_val, ok, err_msg, usage = result
+        tracker.done("encode", tool, qp, row["base_name"], _final_state(ok, state))
+        if not ok:
+            print(
+                f"❌ [{tool}] [{priority}] {base_name} 압축 실패 (QP {qp_val}): {err_msg}"
+            )
+            return False
+        if not state.get("cached"):
+            print(
+                f"✅ [{tool}] [{priority}] {base_name} 압축 완료 (QP {qp_val}, "
+                f"{usage['seconds']:.1f}s, {usage['peak_rss_mb']:.0f}MB)"
+            )
+            job_cost.record_timing(
+                tool, base_name, qp_val, usage["seconds"], usage["peak_rss_mb"], args[4]
+            )
+            if cache is not None:
+                cache.store(state["name"], state["key"], path=state["name"])
+        return True
+
+    return Task(
+        f"encode/{tool}/qp{qp}/{row['base_name']}",
+        module._compress_single,
+        args,
+        prepare=prepare,
+        finish=finish,
+        priority=(_PRIORITY[f"encode/{tool}"], -cost),
+        demand=demand,
+    )
+
+
+def _decode_task(tool, video_id, qp, cache, journal, tracker):
+    args = (
+        video_id,
+        qp,
+        tool,
+        _COMPRESSED_DIRS[tool],
+        os.path.join(cfg.OUTPUT_DECODED_DIR, tool),
+    )
+    state = {}
+
+    def prepare():
+        if journal is not None and journal.completed("decode", tool, qp, video_id):
+            print(f"⏭️ [{tool}] QP {qp} 이전 실행에서 완료, 복원 생략: {video_id}")
+            state["cached"] = True
+            return (tool, qp, video_id, True, None), args
+        if cache is not None:
+            state["name"], state["key"] = decode._job_key(cache, args)
+            if state["key"] is not None and cache.lookup(state["name"], state["key"]):
+                print(f"⏭️ [{tool}] QP {qp} 캐시 유효, 복원 생략: {video_id}")
+                state["cached"] = True
+                return (tool, qp, video_id, True, None), args
+            cache.invalidate(state["name"])
+        return None, args
+
+    def finish(result):
+        _, _, _, ok, err_msg = result
+        tracker.done("decode", tool, qp, video_id, _final_state(ok, state))
+        if not ok:
+            print(f"❌ [{tool}] QP {qp} 복원 실패 ({video_id}): {err_msg}")
+            return False
+        if not state.get("cached"):
+            print(f"✅ [{tool}] QP {qp} 복원 완료: {video_id}")
+            if err_msg:
+                print(f"⚠️ [{tool}] QP {qp} {video_id}: {err_msg}")
+            if cache is not None and state["key"] is not None:
+                cache.store(state["name"], state["key"], path=state["name"])
+        return True
+
+    return Task(
+        f"decode/{tool}/qp{qp}/{video_id}",
+        decode._decode_single,
+        deps=[f"encode/{tool}/qp{qp}/{video_id}"],
+        prepare=prepare,
+        finish=finish,
+        priority=(_PRIORITY["decode"], 0),
+    )
+
+
+def _evaluate_task(
+    tool, file_base, qp, cache, journal, original_cache, store, tracker, dep
+):
+    job = (tool, qp, file_base)
+    state = {}
+
+    def prepare():
+        if journal is not None and evaluate.resumed(journal, store, *job):
+            print(f"⏭️ [{tool}] {file_base} (QP{qp}): 이전 실행에서 평가 완료")
+            state["resumed"] = True
+            return (*job, None, None), None
+        if cache is not None:
+            state["name"] = evaluate._evaluate_name(*job)
+            state["key"] = evaluate._evaluate_key(cache, *job)
+            entry = cache.lookup(state["name"], state["key"])
+            if entry is not None:
+                print(f"⏭️ [{tool}] {file_base} (QP{qp}): 캐시된 평가 결과 사용")
+                state["cached"] = True
+                return (tool, qp, file_base, entry["value"], None), None
+        original_desc = original_cache.acquire(
+            file_base,
+            os.path.join(cfg.ROI_PATH, f"{file_base}.yuv"),
+            *cfg.RAW_RESOLUTIONS[file_base],
+            cfg.FR_DICT[file_base][2],
+        )
+        state["acquired"] = True
+        return None, (*job, original_desc)
+
+    def finish(result):
+        if state.get("acquired"):
+            original_cache.release(file_base)
+        if state.get("resumed"):
+            # 결과 저장소에 이전 실행의 값이 그대로 있음
+            tracker.done("evaluate", *job, "cached")
+            return True
+        _, _, _, value, err_msg = result
+        tracker.done("evaluate", *job, _final_state(value is not None, state))
+        if value is None:
+            evaluate.discard_result(store, *job)
+            print(f"❌ [{tool}] {file_base} QP {qp} 평가 실패: {err_msg}")
+            return False
+        evaluate.store_result(store, tool, value)
+        if not state.get("cached"):
+            print(
+                f"✅ [{tool}] {file_base} (QP{qp}): PSNR {value['psnr']:.2f}, "
+                f"SSNR {value['ssnr']:.2f}, Bitrate {value['bitrate_kbps']:.2f}"
+            )
+            if cache is not None:
+                cache.store(
+                    state["name"],
+                    state["key"],
+                    path=frame_metrics.vectors_path(*job),
+                    value=value,
+                )
+        return True
+
+    return Task(
+        f"evaluate/{tool}/qp{qp}/{file_base}",
+        evaluate._evaluate_single,
+        deps=[dep],
+        prepare=prepare,
+        finish=finish,
+        priority=(_PRIORITY["evaluate"], 0),
+    )
+
+
+def _task_job(name):
+    """작업 이름 "{단계}/{tool}/qp{QP}/{시퀀스}" -> (단계, tool, QP, 시퀀스)"""
+    stage, tool, qp, sequence = name.split("/", 3)
+    return stage, tool, int(qp[2:]), sequence
+
+
+def _final_state(ok, state):
+    if state.get("cached"):
+        return "cached"
+    return "done" if ok else "failed"
+
+
+def _report_skip(task, failed_dep):
+    print(f"⚠️ {task.name} 건너뜀: 선행 작업 실패 ({failed_dep})")
+
+
+if __name__ == "__main__":
+    run_pipeline()
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+from contextlib import closing, contextmanager
+
+import config as cfg
+
+_HASH_BLOCK = 8 * 1024 * 1024
+# 이전 버전의 JSON 기록 (SQLite DB를 처음 만들 때 한 번 옮겨 옴)
+_LEGACY_JSON = "pipeline_cache.json"
+
+
+def make_key(**parts):
+    """입력 구성요소(dict)를 정렬된 JSON으로 직렬화한 sha256 키"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PipelineCache:
+    """입력 해시 기반(content-addressed) 산출물 캐시
+
+    각 산출물(name)에 대해 생성 당시 입력 키와 파일 상태(size, mtime)를 기록하고,
+    다음 실행에서 키와 파일이 그대로면 해당 작업을 건너뜀.
+    파일 지문(sha256)은 (size, mtime)이 바뀔 때만 다시 계산함.
+    기록은 SQLite(pipeline_cache.sqlite)에 항목 단위로 upsert하므로 기록 비용이
+    전체 크기와 무관하고, 동시에 실행한 여러 단계 프로세스의 기록도 서로 지우지 않음.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(cfg.OUTPUT_REPORT_DIR, "pipeline_cache.sqlite")
+        self.path = path
+        new_db = not os.path.exists(path)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts "
+                "(name TEXT PRIMARY KEY, key TEXT, path TEXT, stat TEXT, value TEXT)"
+            )
+            legacy_path = os.path.join(os.path.dirname(path), _LEGACY_JSON)
+            if new_db:
+                _import_json(conn, legacy_path)
+        if new_db and os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # --- 지문 ---------------------------------------------------------------
+    def fingerprint(self, path):
+        """파일 내용 sha256 (없으면 None), (size, mtime)이 같으면 기록된 값 재사용"""
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        with closing(self._connect()) as conn:
+            memo = conn.execute(
+                "SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        if memo is not None and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            return memo[2]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                h.update(block)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, h.hexdigest()),
+            )
+        return h.hexdigest()
+
+    def stat_fingerprint(self, path):
+        """큰 중간 파일(YUV)용 지문: (size, mtime_ns) (없으면 None)
+
+        내용을 읽지 않으므로 내용이 같아도 다시 쓰면 지문이 바뀜 (다시 계산하는 쪽으로만 틀림).
+        """
+        return _stat(os.path.abspath(path))
+
+    def tool_fingerprint(self, binary):
+        """실행 파일(인코더/디코더) 지문: PATH에서 찾은 실제 바이너리의 내용 해시"""
+        resolved = shutil.which(binary) or binary
+        return {"binary": resolved, "sha256": self.fingerprint(resolved)}
+
+    def command_key(self, step, cmd, inputs, **extra):
+        """외부 명령 작업 키: 입력 파일 지문 + 실행 파일 지문 + 명령줄 + 추가 파라미터"""
+        return make_key(
+            step=step,
+            inputs={os.path.basename(p): self.fingerprint(p) for p in inputs},
+            tool=self.tool_fingerprint(cmd[0]),
+            cmd=cmd,
+            **extra,
+        )
+
+    # --- 산출물 -------------------------------------------------------------
+    def lookup(self, name, key):
+        """키가 같고 산출물 파일이 기록 당시 그대로이면 entry 반환, 아니면 None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT key, path, stat, value FROM artifacts WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None or row[0] != key:
+            return None
+        entry = {
+            "key": row[0],
+            "path": row[1],
+            "stat": json.loads(row[2]),
+            "value": json.loads(row[3]),
+        }
+        if entry["path"] is not None and _stat(entry["path"]) != entry["stat"]:
+            return None
+        return entry
+
+    def store(self, name, key, path=None, value=None):
+        """작업 성공 후 산출물 기록 (항목 하나만 즉시 기록하여 중단 시에도 보존)"""
+        stat = _stat(path) if path is not None else None
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                (name, key, path, json.dumps(stat), json.dumps(value, default=str)),
+            )
+
+    def invalidate(self, name):
+        """키가 바뀐 산출물의 기록과 파일 제거"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT path FROM artifacts WHERE name = ?", (name,)
+            ).fetchone()
+            conn.execute("DELETE FROM artifacts WHERE name = ?", (name,))
+        if row is not None and row[0] and os.path.exists(row[0]):
+            os.remove(row[0])
+
+    def gc(self, prefix, live_names):
+        """prefix로 시작하는 기록 중 이번 실행 작업이 아니거나 파일이 사라진 항목 정리"""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT name, path FROM artifacts WHERE substr(name, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+            stale = [
+                (name,)
+                for name, path in rows
+                if name not in live_names
+                or (path is not None and not os.path.exists(path))
+            ]
+            conn.executemany("DELETE FROM artifacts WHERE name = ?", stale)
+            gone = [
+                (path,)
+                for (path,) in conn.execute("SELECT path FROM files")
+                if not os.path.exists(path)
+            ]
+            conn.executemany("DELETE FROM files WHERE path = ?", gone)
+        return len(stale)
+
+
+def open_cache():
+    """cfg.PIPELINE_CACHE 가 꺼져 있으면 None (모든 단계를 처음부터 실행)"""
+    if not getattr(cfg, "PIPELINE_CACHE", True):
+        return None
+    return PipelineCache()
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _import_json(conn, json_path):
+    """이전 pipeline_cache.json 기록을 DB로 옮김 (없거나 읽을 수 없으면 무시)"""
+    if not os.path.exists(json_path):
+        return
+    try:
+        with open(json_path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    conn.executemany(
+        "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+        [(p, *memo) for p, memo in data.get("files", {}).items()],
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+        [
+            (
+                name,
+                e["key"],
+                e.get("path"),
+                json.dumps(e.get("stat")),
+                json.dumps(e.get("value"), default=str),
+            )
+            for name, e in data.get("artifacts", {}).items()
+        ],
+    )
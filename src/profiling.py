@@ -0,0 +1,227 @@
+import argparse
+import cProfile
+import functools
+import glob
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+
+import config as cfg
+import run_manifest
+
+# 프로파일 모드를 워커 프로세스와 공유하는 환경 변수 (main.py --profile 또는 cfg.PROFILE)
+_MODE_ENV = "VCM_PROFILE"
+# 실행 중인 단계의 프로파일 폴더 (워커가 여기에 프로세스별 파일을 씀)
+_DIR_ENV = "VCM_PROFILE_DIR"
+
+MODES = ("cprofile", "sample")
+
+# 이 프로세스에서 실행 중인 단계 프로파일러 (pid, profiler), fork된 워커에도 복사됨
+_stage_profiler = None
+# 워커 프로세스별 누적 프로파일러: (폴더, 워커 이름) -> profiler
+_worker_profilers = {}
+
+
+def mode():
+    """프로파일 모드 (None, "cprofile": 전체 호출 기록, "sample": 주기적 스택 샘플링)"""
+    value = os.environ.get(_MODE_ENV) or getattr(cfg, "PROFILE", None)
+    if value and value not in MODES:
+        raise ValueError(f"알 수 없는 프로파일 모드: {value} ({', '.join(MODES)})")
+    return value or None
+
+
+def set_mode(value):
+    """이 프로세스와 이후 생성되는 워커의 프로파일 모드 설정 (None이면 끔)"""
+    if value:
+        os.environ[_MODE_ENV] = value
+    else:
+        os.environ.pop(_MODE_ENV, None)
+
+
+def profile_root():
+    """프로파일 저장 폴더: report/profile/{실행 ID}/"""
+    return os.path.join(cfg.OUTPUT_REPORT_DIR, "profile", run_manifest.run_id())
+
+
+class Sampler:
+    """저부하 통계적 프로파일러: 대상 스레드의 스택을 interval 초마다 기록
+
+    cProfile처럼 모든 호출에 훅을 걸지 않으므로 운영 실행에서도 켜 둘 수 있음.
+    결과는 pstats 형식(호출 수 = 샘플 수, 시간 = 샘플 수 x interval)으로 저장되어
+    cProfile 결과와 같은 방법으로 합치고 snakeviz로 열 수 있음.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(cfg, "PROFILE_SAMPLE_INTERVAL", 0.01)
+        self.stats = {}  # 함수 -> [cc, nc, tt, ct, {호출한 함수: [cc, nc, tt, ct]}]
+        self._target = threading.get_ident()
+        self._root = None
+        self._active = threading.Event()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def enable(self):
+        # cProfile처럼 enable()을 호출한 함수 아래만 기록
+        # (fork된 워커의 스택에 남아 있는 부모 프레임은 제외)
+        self._target = threading.get_ident()
+        self._root = sys._getframe(1)
+        self._active.set()
+
+    def disable(self):
+        self._active.clear()
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self._target)
+            if self._active.is_set() and frame is not None:
+                self._record(frame)
+
+    def _record(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            if frame is self._root:
+                break
+            frame = frame.f_back
+        dt = self.interval
+        seen = set()
+        with self._lock:
+            # stack[0]이 실행 중인 함수 (자체 시간), 나머지는 누적 시간만
+            for i, func in enumerate(stack):
+                entry = self.stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+                self_time = dt if i == 0 else 0.0
+                entry[2] += self_time
+                if func in seen:
+                    # 재귀 호출은 누적 시간을 한 번만 셈
+                    continue
+                seen.add(func)
+                entry[0] += 1
+                entry[1] += 1
+                entry[3] += dt
+                if i + 1 < len(stack):
+                    edge = entry[4].setdefault(stack[i + 1], [0, 0, 0.0, 0.0])
+                    edge[0] += 1
+                    edge[1] += 1
+                    edge[2] += self_time
+                    edge[3] += dt
+
+    def dump_stats(self, path):
+        with self._lock:
+            stats = {
+                func: (cc, nc, tt, ct, {k: tuple(v) for k, v in callers.items()})
+                for func, (cc, nc, tt, ct, callers) in self.stats.items()
+            }
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+
+def _new_profiler():
+    return cProfile.Profile() if mode() == "cprofile" else Sampler()
+
+
+def _dump(profiler, path):
+    # 읽는 쪽(단계 종료 시 병합)이 쓰다 만 파일을 보지 않도록 임시 파일에 쓴 뒤 교체
+    tmp_path = f"{path}.tmp"
+    profiler.dump_stats(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def stage(name):
+    """run_* 진입점용 데코레이터: 프로파일 모드가 켜져 있으면 단계 전체를 프로파일링
+
+    부모 프로세스 결과와 워커 프로세스별 결과(worker 데코레이터)를
+    profile/{실행 ID}/{name}/ 에 쓰고, 끝나면 하나로 합쳐 {name}.prof 로 저장.
+    단계 안에서 다른 단계를 부르면 바깥 단계에 포함됨.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            global _stage_profiler
+            if mode() is None or _stage_profiler is not None:
+                return fn(*args, **kwargs)
+            stage_dir = os.path.join(profile_root(), name)
+            os.makedirs(stage_dir, exist_ok=True)
+            profiler = _new_profiler()
+            _stage_profiler = (os.getpid(), profiler)
+            os.environ[_DIR_ENV] = stage_dir
+            profiler.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+                _stage_profiler = None
+                del os.environ[_DIR_ENV]
+                _dump(profiler, os.path.join(stage_dir, f"main-{os.getpid()}.prof"))
+                merged = merge(stage_dir, os.path.join(profile_root(), f"{name}.prof"))
+                if merged is not None:
+                    print(f"📊 프로파일 저장 ({mode()}): {merged} (snakeviz {merged})")
+
+        return wrapper
+
+    return decorator
+
+
+def worker(name):
+    """ProcessPoolExecutor 워커 함수용 데코레이터: 프로세스별로 누적해 {name}-{pid}.prof 로 저장
+
+    작업이 끝날 때마다 파일을 갱신하므로 워커 프로세스가 어떻게 끝나도 결과가 남음.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            global _stage_profiler
+            stage_dir = os.environ.get(_DIR_ENV)
+            if stage_dir is None or mode() is None:
+                return fn(*args, **kwargs)
+            if _stage_profiler is not None:
+                if _stage_profiler[0] == os.getpid():
+                    # 부모 프로세스에서 직접 호출: 단계 프로파일에 이미 포함
+                    return fn(*args, **kwargs)
+                # fork로 복사된 부모의 프로파일러는 이 프로세스에서 끔
+                _stage_profiler[1].disable()
+                _stage_profiler = None
+            key = (stage_dir, name)
+            if key not in _worker_profilers:
+                _worker_profilers[key] = _new_profiler()
+            profiler = _worker_profilers[key]
+            profiler.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+                _dump(profiler, os.path.join(stage_dir, f"{name}-{os.getpid()}.prof"))
+
+        return wrapper
+
+    return decorator
+
+
+def merge(stage_dir, output_path):
+    """폴더의 프로세스별 .prof 파일을 하나의 pstats 파일로 병합 (파일이 없으면 None)"""
+    paths = sorted(glob.glob(os.path.join(stage_dir, "*.prof")))
+    if not paths:
+        return None
+    stats = pstats.Stats(*paths)
+    stats.dump_stats(output_path)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="저장된 프로파일 요약 (누적 시간 상위 함수)"
+    )
+    parser.add_argument(
+        "path", help=".prof 파일 (예: results/report/profile/<실행 ID>/evaluate.prof)"
+    )
+    parser.add_argument("--sort", default="cumulative", help="pstats 정렬 기준")
+    parser.add_argument("--limit", type=int, default=30)
+    args = parser.parse_args()
+    pstats.Stats(args.path).sort_stats(args.sort).print_stats(args.limit)
@@ -0,0 +1,392 @@
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config as cfg
+
+# 실행 중 작업 표시 파일 폴더를 워커 프로세스와 공유하는 환경 변수 (Tracker가 설정)
+_LIVE_DIR_ENV = "VCM_PROGRESS_DIR"
+
+# 라이브 출력에서 진행 프레임 수 파싱
+# VTM 인코더/디코더: 프레임마다 stdout에 "POC n ..." 한 줄
+_VTM_POC_RE = re.compile(rb"^POC\s+\d+", re.MULTILINE)
+# ffmpeg (x265 인코딩, HEVC 복원): stderr 상태 줄 "frame=  123 fps=..." (\r로 갱신)
+_FFMPEG_FRAME_RE = re.compile(rb"frame=\s*(\d+)")
+
+STAGES = ("encode", "decode", "evaluate")
+
+
+# --- 워커 쪽: 실행 중 작업 표시 -------------------------------------------------
+class LiveJob:
+    """실행 중인 작업 1건의 진행 프레임 수를 공유 폴더의 파일로 알림
+
+    async_runner가 인코더/디코더 출력 조각을 feed()로 넘기면 프레임 수를 갱신함.
+    """
+
+    def __init__(self, live_dir, stage, tool, qp, sequence, segment=None):
+        # 한 프로세스에서 여러 작업(구간)을 동시에 실행할 수 있으므로 (async_runner) 작업별 파일
+        name = f"{os.getpid()}-{stage}-{tool}-qp{qp}-{sequence}"
+        if segment is not None:
+            name += f"-seg{segment}"
+        self.path = os.path.join(live_dir, f"{name}.json")
+        self.info = {
+            "stage": stage,
+            "tool": tool,
+            "qp": qp,
+            "sequence": sequence,
+            "frames": 0,
+            "started": time.time(),
+        }
+        # VTM은 stdout에 POC 줄, ffmpeg는 stderr에 frame= 상태 줄을 출력
+        self._stream = "stdout" if tool == "VVC" else "stderr"
+        self._pending = b""
+        self._write()
+
+    def feed(self, stream, data):
+        """새로 나온 출력 조각 반영 (stream: "stdout" 또는 "stderr")"""
+        if stream != self._stream or not data:
+            return
+        data = self._pending + data
+        if self._stream == "stdout":
+            # 마지막 불완전한 줄은 다음 조각과 이어서 셈
+            head, sep, tail = data.rpartition(b"\n")
+            self._pending = tail
+            frames = self.info["frames"] + len(_VTM_POC_RE.findall(head + sep))
+        else:
+            matches = _FFMPEG_FRAME_RE.findall(data)
+            self._pending = data[-64:]
+            frames = int(matches[-1]) if matches else self.info["frames"]
+        if frames != self.info["frames"]:
+            self.info["frames"] = frames
+            self._write()
+
+    def _write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.info, f)
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _NoLiveJob:
+    """진행 상황 수집이 꺼져 있을 때 (Tracker 없이 단독 실행 등)"""
+
+    feed = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def live(stage, tool, qp, sequence, segment=None):
+    """워커에서 작업 시작 표시 (with 블록 동안 실행 중으로 집계)
+
+    segment: 구간 병렬 인코딩의 구간 번호 (같은 작업의 구간들은 합쳐서 집계)
+    """
+    live_dir = os.environ.get(_LIVE_DIR_ENV)
+    if not live_dir or not os.path.isdir(live_dir):
+        return _NoLiveJob()
+    return LiveJob(live_dir, stage, tool, qp, sequence, segment)
+
+
+# --- 부모 쪽: 집계와 내보내기 ---------------------------------------------------
+class Tracker:
+    """압축/복원/평가 루프 공용 진행 상황 집계기 (부모 프로세스)
+
+    add()로 전체 작업을 등록하고 done()으로 끝난 작업을 알리면, 워커의 실행 중 표시
+    (LiveJob)와 합쳐 단계별 완료/실행 중/대기 작업 수, 최근 PROGRESS_WINDOW_SECONDS
+    동안의 처리 속도(frames/s), 남은 시간(ETA), 정체 여부를 계산해 PROGRESS_INTERVAL
+    초마다 Prometheus 텍스트 파일(PROGRESS_FILE)로 쓰고, PROGRESS_HTTP_PORT가 있으면
+    localhost HTTP(/metrics)로도 제공. ETA는 해상도 차이를 반영하도록
+    (픽셀 수 x 프레임 수) 작업량 기준으로 계산.
+    """
+
+    # done() 상태: done/failed는 실제로 실행한 작업 (처리 속도에 반영),
+    # cached(캐시 적중)/skipped(선행 작업 실패)는 실행 없이 끝난 작업
+    FINAL_STATES = ("done", "failed", "cached", "skipped")
+
+    def __init__(self):
+        self.path = getattr(
+            cfg, "PROGRESS_FILE", os.path.join(cfg.OUTPUT_REPORT_DIR, "progress.prom")
+        )
+        self.interval = getattr(cfg, "PROGRESS_INTERVAL", 10)
+        self.window = getattr(cfg, "PROGRESS_WINDOW_SECONDS", 600)
+        self.stall_seconds = getattr(cfg, "PROGRESS_STALL_SECONDS", 1800)
+
+        self._lock = threading.Lock()
+        self._jobs = {}  # (stage, tool, qp, sequence) -> {frames, pixels, state}
+        self._samples = {s: deque() for s in STAGES}  # (시각, 작업량, 프레임 수)
+        self._last_progress = {s: time.time() for s in STAGES}
+        self.live_dir = None
+        self._server = None
+
+    # --- 작업 등록/완료 -----------------------------------------------------
+    def add(self, stage, tool, qp, sequence):
+        """작업 등록 (프레임 수는 FR_DICT, 해상도는 평가는 원본, 압축/복원은 확대 해상도)"""
+        resolutions = cfg.RAW_RESOLUTIONS if stage == "evaluate" else cfg.RESOLUTIONS
+        width, height = resolutions.get(sequence, (0, 0))
+        with self._lock:
+            self._jobs[(stage, tool, qp, sequence)] = {
+                "frames": int(cfg.FR_DICT.get(sequence, (0, 0, 0))[2]),
+                "pixels": int(width) * int(height),
+                "state": "pending",
+            }
+
+    def done(self, stage, tool, qp, sequence, state="done"):
+        """작업 종료 알림 (state: FINAL_STATES)"""
+        with self._lock:
+            job = self._jobs.get((stage, tool, qp, sequence))
+            if job is None:
+                return
+            job["state"] = state
+            if state in ("done", "failed"):
+                self._last_progress[stage] = time.time()
+
+    # --- 집계 ---------------------------------------------------------------
+    def _live_jobs(self):
+        jobs = []
+        if self.live_dir is None:
+            return jobs
+        for name in os.listdir(self.live_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.live_dir, name), encoding="utf-8") as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return jobs
+
+    def snapshot(self):
+        """단계별 집계 dict (등록된 작업이 있는 단계만)"""
+        now = time.time()
+        live = self._live_jobs()
+        stats = {}
+        with self._lock:
+            for stage in STAGES:
+                jobs = {k: v for k, v in self._jobs.items() if k[0] == stage}
+                if jobs:
+                    stats[stage] = self._stage_stats(stage, jobs, live, now)
+        return stats
+
+    def _stage_stats(self, stage, jobs, live, now):
+        # 실행 중 표시 중 아직 끝나지 않은 작업만 (워커가 비정상 종료하면 표시가 남을 수 있음)
+        running = {}
+        for j in live:
+            key = (j["stage"], j["tool"], j["qp"], j["sequence"])
+            job = jobs.get(key)
+            if job is None or job["state"] != "pending":
+                continue
+            if key in running:
+                # 구간 병렬 인코딩: 같은 작업의 구간별 표시는 하나로 합침
+                prev = running[key][0]
+                j = {
+                    **prev,
+                    "frames": prev["frames"] + j["frames"],
+                    "started": min(prev["started"], j["started"]),
+                }
+            running[key] = (j, job, min(j["frames"], job["frames"]))
+        running = list(running.values())
+        counts = {s: 0 for s in ("pending",) + self.FINAL_STATES}
+        for job in jobs.values():
+            counts[job["state"]] += 1
+
+        # 실제로 실행한 작업량 = 끝난 작업 + 실행 중 작업의 진행분 (처리 속도 계산용)
+        finished = [j for j in jobs.values() if j["state"] in ("done", "failed")]
+        frames = sum(j["frames"] for j in finished) + sum(n for _, _, n in running)
+        work = sum(j["frames"] * j["pixels"] for j in finished) + sum(
+            n * job["pixels"] for _, job, n in running
+        )
+        remaining = sum(
+            j["frames"] * j["pixels"] for j in jobs.values() if j["state"] == "pending"
+        ) - sum(n * job["pixels"] for _, job, n in running)
+
+        samples = self._samples[stage]
+        if samples and work > samples[-1][1]:
+            self._last_progress[stage] = now
+        samples.append((now, work, frames))
+        while len(samples) > 2 and samples[0][0] < now - self.window:
+            samples.popleft()
+        t0, work0, frames0 = samples[0]
+        elapsed = now - t0
+        work_rate = (work - work0) / elapsed if elapsed > 0 else 0.0
+        if remaining <= 0:
+            eta = 0.0
+        elif work_rate > 0:
+            eta = remaining / work_rate
+        else:
+            eta = math.nan
+        since = now - self._last_progress[stage]
+
+        return {
+            "jobs_total": len(jobs),
+            "jobs_completed": counts["done"] + counts["cached"],
+            "jobs_cached": counts["cached"],
+            "jobs_failed": counts["failed"],
+            "jobs_skipped": counts["skipped"],
+            "jobs_inflight": len(running),
+            "jobs_queued": counts["pending"] - len(running),
+            "frames_processed": frames,
+            "frames_per_second": (frames - frames0) / elapsed if elapsed > 0 else 0.0,
+            "eta_seconds": eta,
+            "seconds_since_progress": since,
+            "stalled": int(bool(running) and since > self.stall_seconds),
+            "live": [
+                {**j, "fps": j["frames"] / max(now - j["started"], 1e-6)}
+                for j, _, _ in running
+            ],
+        }
+
+    def render(self):
+        """Prometheus 텍스트 형식 (node_exporter textfile collector / HTTP 응답)"""
+        stats = self.snapshot()
+        now = time.time()
+        lines = []
+
+        def metric(name, help_text, values):
+            lines.append(f"# HELP vcm_{name} {help_text}")
+            lines.append(f"# TYPE vcm_{name} gauge")
+            for labels, value in values:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                label_text = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"vcm_{name}{label_text} {_format(value)}")
+
+        for key, help_text in _STAGE_METRICS:
+            metric(key, help_text, [({"stage": k}, s[key]) for k, s in stats.items()])
+        metric(
+            "job_frames_per_second",
+            "실행 중 작업별 처리 속도 (인코더/디코더 출력 기준)",
+            [
+                (
+                    {
+                        "stage": stage,
+                        "tool": j["tool"],
+                        "qp": j["qp"],
+                        "sequence": j["sequence"],
+                    },
+                    j["fps"],
+                )
+                for stage, s in stats.items()
+                for j in s["live"]
+                if j["stage"] != "evaluate"
+            ],
+        )
+        eta = max((s["eta_seconds"] for s in stats.values()), default=0.0)
+        metric("eta_timestamp_seconds", "예상 종료 시각 (unix time)", [({}, now + eta)])
+        metric("updated_timestamp_seconds", "마지막 갱신 시각 (unix time)", [({}, now)])
+        return "\n".join(lines) + "\n"
+
+    # --- 내보내기 -----------------------------------------------------------
+    def write(self):
+        """PROGRESS_FILE 갱신 (임시 파일에 쓴 뒤 교체하여 읽는 쪽이 반쪽 파일을 보지 않음)"""
+        if not self.path:
+            return
+        text = self.render()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self):
+        """주기적 내보내기 시작 (with 블록 진입 시 호출)"""
+        # 워커가 실행 중 표시를 남길 폴더 (이후 생성되는 워커 프로세스가 환경 변수로 상속)
+        self.live_dir = tempfile.mkdtemp(prefix="vcm_progress_", dir=_shm_dir())
+        os.environ[_LIVE_DIR_ENV] = self.live_dir
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        port = getattr(cfg, "PROGRESS_HTTP_PORT", None)
+        if port:
+            self._server = _serve(self, int(port))
+            print(f"📊 진행 상황: http://127.0.0.1:{port}/metrics")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if os.environ.get(_LIVE_DIR_ENV) == self.live_dir:
+            del os.environ[_LIVE_DIR_ENV]
+        shutil.rmtree(self.live_dir, ignore_errors=True)
+        self.live_dir = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_STAGE_METRICS = [
+    ("jobs_total", "전체 작업 수"),
+    ("jobs_completed", "완료 작업 수 (캐시 적중 포함)"),
+    ("jobs_cached", "캐시 적중으로 건너뛴 작업 수"),
+    ("jobs_failed", "실패 작업 수"),
+    ("jobs_skipped", "선행 작업 실패로 건너뛴 작업 수"),
+    ("jobs_inflight", "실행 중 작업 수"),
+    ("jobs_queued", "대기 작업 수"),
+    ("frames_processed", "처리한 프레임 수 (실행 중 작업 진행분 포함)"),
+    ("frames_per_second", "최근 PROGRESS_WINDOW_SECONDS 동안의 처리 속도"),
+    ("eta_seconds", "남은 예상 시간 (최근 처리 속도 기준, 속도를 모르면 NaN)"),
+    ("seconds_since_progress", "마지막 진행 이후 경과 시간"),
+    ("stalled", "실행 중 작업이 PROGRESS_STALL_SECONDS 동안 진행이 없으면 1"),
+]
+
+
+def _serve(tracker, port):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = tracker.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _shm_dir():
+    return "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def _format(value):
+    if isinstance(value, float) and math.isnan(value):
+        return "NaN"
+    return str(round(value, 3)) if isinstance(value, float) else str(value)
@@ -0,0 +1,209 @@
+import math
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+import config as cfg
+import job_cost
+
+# 해상도 구간: (이름, 최대 픽셀 수), 마지막 구간보다 크면 마지막 구간으로 취급
+RESOLUTION_CLASSES = [
+    ("SD", 720 * 576),
+    ("HD", 1280 * 720),
+    ("FHD", 1920 * 1080),
+    ("UHD", 4096 * 2160),
+]
+
+# 작업 1개의 최대 메모리(MB) 초기 추정치 (단일 스레드 기준, 실측 기록이 있으면 대체)
+DEFAULT_PEAK_RSS_MB = {
+    "HEVC": {"SD": 150, "HD": 350, "FHD": 700, "UHD": 2500},
+    "VVC": {"SD": 600, "HD": 1500, "FHD": 3000, "UHD": 10000},
+}
+# 실측 최대 메모리에 곱하는 여유 배율
+_RSS_MARGIN = 1.2
+# x265 스레드 풀에 스레드 1개 추가 시 메모리 증가 비율 (스레드별 작업 버퍼)
+_HEVC_RSS_PER_THREAD = 0.25
+
+
+def resolution_class(width, height):
+    pixels = int(width) * int(height)
+    for name, max_pixels in RESOLUTION_CLASSES:
+        if pixels <= max_pixels:
+            return name
+    return RESOLUTION_CLASSES[-1][0]
+
+
+def cpu_budget():
+    """사용할 CPU 코어 수 (cfg.CPU_BUDGET, 없으면 이 프로세스에 허용된 코어 수)"""
+    budget = getattr(cfg, "CPU_BUDGET", None)
+    if budget:
+        return int(budget)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def memory_budget_bytes():
+    """사용할 메모리 (cfg.MEMORY_BUDGET_MB, 없으면 현재 가용 메모리의 80%)"""
+    budget_mb = getattr(cfg, "MEMORY_BUDGET_MB", None)
+    if budget_mb:
+        return int(budget_mb) * 1024**2
+    return int(_available_memory_bytes() * 0.8)
+
+
+def _available_memory_bytes():
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def peak_rss_by_class(tool, job_df):
+    """해상도 구간 -> 작업 1개 최대 메모리(bytes, HEVC는 단일 스레드 기준)
+
+    실측 기록이 있는 구간은 실측 최대값 사용. HEVC 기록은 기록 당시 스레드 수로
+    나눠 단일 스레드 기준으로 환산 (plan_jobs에서 스레드 수만큼 다시 늘리므로).
+    VVC 기록은 구간 프로세스 1개의 최대값이므로 그대로 사용.
+    """
+    estimates = {k: v * 1024**2 for k, v in DEFAULT_PEAK_RSS_MB[tool].items()}
+    classes = {
+        r["base_name"]: resolution_class(r["width"], r["height"])
+        for r in job_df.to_dict("records")
+    }
+    measured = {}
+    for (base_name, _), (rss_mb, threads) in job_cost.load_peak_rss(tool).items():
+        name = classes.get(base_name)
+        if name is not None:
+            if tool == "HEVC":
+                rss_mb /= _hevc_rss_factor(threads)
+            measured[name] = max(measured.get(name, 0), rss_mb * 1024**2)
+    for name, rss in measured.items():
+        estimates[name] = int(rss * _RSS_MARGIN)
+    return estimates
+
+
+def plan_jobs(tool, job_df, cpus=None, memory_bytes=None):
+    """시퀀스별 (인코더 스레드 수, 예상 최대 메모리 bytes)
+
+    메모리 예산으로 코어 수만큼 동시에 돌릴 수 있으면 스레드 1개 (프로세스 병렬),
+    메모리 때문에 동시 작업 수가 줄어드는 해상도는 남는 코어를 스레드로 배분.
+    VTM 인코더는 단일 스레드이므로 VVC는 구간 병렬 인코딩(VVC_SEGMENTS)의
+    구간 수 (구간마다 VTM 프로세스 1개, 메모리도 구간 수만큼).
+    """
+    cpus = cpus or cpu_budget()
+    memory_bytes = memory_bytes or memory_budget_bytes()
+    rss_by_class = peak_rss_by_class(tool, job_df)
+    max_threads = getattr(cfg, "HEVC_MAX_THREADS", 8)
+
+    plan = {}
+    for r in job_df.to_dict("records"):
+        rss = rss_by_class[resolution_class(r["width"], r["height"])]
+        threads = 1
+        if tool == "HEVC":
+            slots = max(1, memory_bytes // rss)
+            if slots < cpus:
+                threads = min(max_threads, math.ceil(cpus / slots))
+            rss = int(rss * _hevc_rss_factor(threads))
+        elif tool == "VVC":
+            threads = vvc_segment_count(r["base_name"], r["frame_count"], cpus)
+            rss *= threads
+        plan[r["base_name"]] = (threads, rss)
+    return plan
+
+
+def _hevc_rss_factor(threads):
+    """x265 스레드 수에 따른 최대 메모리 배율 (단일 스레드 = 1)"""
+    return 1 + _HEVC_RSS_PER_THREAD * (max(1, threads) - 1)
+
+
+def vvc_segment_count(base_name, frame_count, cpus=None):
+    """VVC 구간 병렬 인코딩 구간 수 (VVC_SEGMENTS, CPU 예산, intra period 개수 중 최소)"""
+    segments = getattr(cfg, "VVC_SEGMENTS", 1) or 1
+    intra_period = cfg.FR_DICT.get(base_name, (0,))[0]
+    if segments <= 1 or intra_period <= 0:
+        return 1
+    periods = math.ceil(int(frame_count) / intra_period)
+    return max(1, min(segments, cpus or cpu_budget(), periods))
+
+
+class ResourceBudget:
+    """실행 중인 작업의 스레드 수와 예상 메모리 합계를 예산 안으로 제한"""
+
+    def __init__(self, cpus=None, memory_bytes=None):
+        self.cpus = cpus or cpu_budget()
+        self.memory_bytes = memory_bytes or memory_budget_bytes()
+        self.cpu_used = 0
+        self.memory_used = 0
+        self.running = 0
+
+    def fits(self, threads, rss):
+        # 아무 작업도 없으면 예산보다 큰 작업도 단독 실행 (무한 대기 방지)
+        if self.running == 0:
+            return True
+        return (
+            self.cpu_used + threads <= self.cpus
+            and self.memory_used + rss <= self.memory_bytes
+        )
+
+    def acquire(self, threads, rss):
+        self.cpu_used += threads
+        self.memory_used += rss
+        self.running += 1
+
+    def release(self, threads, rss):
+        self.cpu_used -= threads
+        self.memory_used -= rss
+        self.running -= 1
+
+    def describe(self):
+        return f"CPU {self.cpus}코어, 메모리 {self.memory_bytes / 1024**3:.1f}GB"
+
+
+def wait_usage(proc, start):
+    """Popen 프로세스를 os.wait4로 기다리고 returncode 설정 후 자원 사용량 dict 반환
+
+    seconds: start(time.monotonic) 이후 경과 시간, user/sys_seconds: 자식 CPU 시간,
+    peak_rss_mb: 자식 최대 RSS.
+    """
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return child_usage(rusage, start)
+
+
+def child_usage(rusage, start):
+    """os.wait4의 rusage -> 자원 사용량 dict (wait_usage 참고)"""
+    return {
+        "seconds": time.monotonic() - start,
+        "user_seconds": rusage.ru_utime,
+        "sys_seconds": rusage.ru_stime,
+        # Linux의 ru_maxrss 단위는 KB. exec 직전 (워커 프로세스에서 fork된) 메모리도
+        # 포함되므로 작은 명령에서는 워커 크기(수십 MB)만큼 크게 나오지만 인코더 규모에서는 무시 가능
+        "peak_rss_mb": rusage.ru_maxrss / 1024,
+    }
+
+
+@contextmanager
+def measure():
+    """프로세스 내부 작업(평가 등)의 자원 사용량 측정: with 블록이 끝나면 dict가 채워짐
+
+    CPU 시간은 블록 전후 차이, peak_rss_mb는 현재 프로세스의 최대 RSS (워커 수명 전체 기준).
+    """
+    usage = {}
+    start = time.monotonic()
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    try:
+        yield usage
+    finally:
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        usage.update(
+            seconds=time.monotonic() - start,
+            user_seconds=after.ru_utime - before.ru_utime,
+            sys_seconds=after.ru_stime - before.ru_stime,
+            peak_rss_mb=after.ru_maxrss / 1024,
+        )
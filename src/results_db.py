@@ -0,0 +1,216 @@
+import argparse
+import math
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+
+import numpy as np
+import pandas as pd
+import config as cfg
+
+# 테이블별 키 컬럼 (같은 키의 행은 새 행으로 교체)
+TABLE_KEYS = {
+    "metadata": ("file_name",),
+    "analysis": ("file_name",),
+    "jobs": ("base_name",),
+    "evaluation": ("tool", "qp", "file"),
+}
+
+# 기존 CSV 이름 (export_legacy_csv), evaluation은 tool별로 evaluation_{tool}.csv
+LEGACY_CSV = {
+    "metadata": "metadata_vcm.csv",
+    "analysis": "vcm_analysis_report.csv",
+    "jobs": "job_df.csv",
+}
+
+# evaluation_{tool}.csv 기본 컬럼 (그 밖의 컬럼은 값이 있을 때만 내보냄)
+EVALUATION_COLUMNS = ["file", "qp", "psnr", "ssim", "ssnr", "bitrate_kbps", "bpp"]
+
+
+class ResultsStore:
+    """단계별 결과를 하나의 SQLite DB(results.sqlite)에 모아 두는 저장소
+
+    행 단위로 바로 기록(upsert)하므로 중단되어도 그때까지의 결과가 남고,
+    조회는 WHERE 조건을 SQL로 넘겨 필요한 행/컬럼만 읽음.
+    평가 결과는 부모 프로세스가 작업이 끝날 때마다 한 행씩 기록함.
+    WAL 모드 + 호출마다 새 연결이라 여러 프로세스(동시에 실행한 단계 등)가 함께 써도 됨.
+    컬럼은 처음 들어온 행의 순서로 만들어지고, 새 컬럼이 오면 자동으로 추가됨.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(cfg.OUTPUT_REPORT_DIR, "results.sqlite")
+        self.path = path
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # 스키마 확인 전에 쓰기 잠금을 잡아 여러 프로세스의 테이블/컬럼 생성이 겹치지 않게 함
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # --- 쓰기 ---------------------------------------------------------------
+    def put(self, table, rows):
+        """행(dict) 목록을 기록, 키 컬럼(TABLE_KEYS)이 같은 기존 행은 교체"""
+        rows = [{k: _to_sql_value(v) for k, v in r.items()} for r in rows]
+        if not rows:
+            return
+        with self._transaction() as conn:
+            self._write(conn, table, rows)
+
+    def replace(self, table, df):
+        """테이블 내용을 df로 통째로 교체 (단계 전체 결과가 한 번에 나오는 작은 표용)"""
+        rows = [
+            {k: _to_sql_value(v) for k, v in r.items()} for r in df.to_dict("records")
+        ]
+        with self._transaction() as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+            if rows:
+                self._write(conn, table, rows)
+
+    def delete(self, table, **filters):
+        """키(컬럼=값)가 일치하는 행 삭제 (테이블이 없으면 무시)"""
+        where = " AND ".join(f"{_quote(c)} = ?" for c in filters)
+        with self._transaction() as conn:
+            if _table_columns(conn, table):
+                conn.execute(
+                    f"DELETE FROM {_quote(table)} WHERE {where}",
+                    [_to_sql_value(v) for v in filters.values()],
+                )
+
+    def _write(self, conn, table, rows):
+        columns = list(dict.fromkeys(c for r in rows for c in r))
+        existing = _table_columns(conn, table)
+        if not existing:
+            keys = ", ".join(_quote(k) for k in TABLE_KEYS[table])
+            cols = ", ".join(_quote(c) for c in columns)
+            conn.execute(f"CREATE TABLE {_quote(table)} ({cols}, PRIMARY KEY ({keys}))")
+        else:
+            for c in columns:
+                if c not in existing:
+                    conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(c)}")
+        cols = ", ".join(_quote(c) for c in columns)
+        marks = ", ".join("?" * len(columns))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {_quote(table)} ({cols}) VALUES ({marks})",
+            [tuple(r.get(c) for c in columns) for r in rows],
+        )
+
+    # --- 조회 ---------------------------------------------------------------
+    def query(
+        self, table, columns=None, where=None, params=(), order_by=None, **filters
+    ):
+        """조건에 맞는 행만 DataFrame으로 조회 (테이블이 없으면 빈 DataFrame)
+
+        filters: 컬럼=값 (리스트/튜플이면 IN), where/params: 추가 SQL 조건.
+        예) query("evaluation", tool="VVC", qp=[22, 27], columns=["file", "psnr"])
+        """
+        clauses, values = [], []
+        for column, value in filters.items():
+            if isinstance(value, (list, tuple, set)):
+                value = list(value)
+                clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(value))})")
+                values.extend(value)
+            else:
+                clauses.append(f"{_quote(column)} = ?")
+                values.append(value)
+        if where:
+            clauses.append(f"({where})")
+            values.extend(params)
+
+        with closing(self._connect()) as conn:
+            existing = _table_columns(conn, table)
+            if not existing:
+                return pd.DataFrame(columns=columns)
+            select = ", ".join(_quote(c) for c in columns) if columns else "*"
+            sql = f"SELECT {select} FROM {_quote(table)}"
+            if clauses:
+                sql += " WHERE " + " AND ".join(clauses)
+            if order_by:
+                sql += f" ORDER BY {order_by}"
+            return pd.read_sql_query(sql, conn, params=values)
+
+    def export_csv(self, table, path, **query_kwargs):
+        """조회 결과를 CSV로 저장 (기존 CSV 이름으로 내보내기용), 저장한 행 수 반환"""
+        df = self.query(table, **query_kwargs)
+        df.to_csv(path, index=False)
+        return len(df)
+
+
+def open_store():
+    return ResultsStore()
+
+
+def export_legacy_csv(store=None, output_dir=None):
+    """저장소 내용으로 기존 CSV(metadata_vcm, vcm_analysis_report, job_df, evaluation_{tool})를 다시 생성"""
+    store = store or open_store()
+    output_dir = output_dir or cfg.OUTPUT_REPORT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    for table, file_name in LEGACY_CSV.items():
+        path = os.path.join(output_dir, file_name)
+        if store.query(table).empty:
+            print(f"⚠️ {table} 결과 없음: {file_name} 생략")
+            continue
+        n_rows = store.export_csv(table, path)
+        print(f"💾 {file_name} 내보내기 완료 ({n_rows}행)")
+    for tool in ("HEVC", "VVC"):
+        path = os.path.join(output_dir, f"evaluation_{tool}.csv")
+        if store.query("evaluation", tool=tool).empty:
+            print(f"⚠️ {tool} 평가 결과 없음: 생략")
+            continue
+        df = evaluation_csv_frame(
+            store.query("evaluation", tool=tool, order_by="qp, file")
+        )
+        df.to_csv(path, index=False)
+        print(f"💾 evaluation_{tool}.csv 내보내기 완료 ({len(df)}행)")
+
+
+def evaluation_csv_frame(df):
+    """evaluation 조회 결과 -> 기존 evaluation_{tool}.csv 형식
+
+    기본 컬럼 순서로 맞추고, 값이 하나도 없는 추가 컬럼(예: 표본 평가 신뢰구간)은 제외.
+    """
+    extra = [
+        c
+        for c in df.columns
+        if c not in EVALUATION_COLUMNS and c != "tool" and df[c].notna().any()
+    ]
+    return df[[c for c in EVALUATION_COLUMNS if c in df.columns] + extra]
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")]
+
+
+def _to_sql_value(value):
+    # numpy 스칼라는 파이썬 값으로, NaN은 NULL로 (SQLite는 NaN을 저장하지 않음)
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="results.sqlite 내용을 기존 CSV 리포트로 내보내기"
+    )
+    parser.add_argument("--output-dir", default=None, help="기본값: OUTPUT_REPORT_DIR")
+    args = parser.parse_args()
+    export_legacy_csv(output_dir=args.output_dir)
@@ -0,0 +1,126 @@
+import argparse
+import functools
+import json
+import os
+import shutil
+import socket
+import time
+
+import pandas as pd
+import config as cfg
+
+# 실행 ID를 워커 프로세스와 공유하는 환경 변수 (fork/spawn 모두 상속)
+_RUN_ID_ENV = "VCM_RUN_ID"
+
+
+def manifest_path():
+    return os.path.join(cfg.OUTPUT_REPORT_DIR, "run_manifest.jsonl")
+
+
+def run_id():
+    """현재 실행 ID (없으면 시작 시각 + PID로 생성)"""
+    rid = os.environ.get(_RUN_ID_ENV)
+    if rid is None:
+        rid = new_run()
+    return rid
+
+
+def new_run():
+    """새 실행 ID 발급 (이후 생성되는 워커 프로세스가 같은 ID로 기록)"""
+    rid = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    os.environ[_RUN_ID_ENV] = rid
+    return rid
+
+
+def record(stage, tool, qp, sequence, cmd, returncode, usage, error=None):
+    """작업 1건의 실행 기록을 run_manifest.jsonl에 한 줄 추가 (워커에서 직접 호출)
+
+    cmd: 실행한 외부 명령 (인자 리스트, 프로세스 내부 작업이면 None)
+    usage: async_runner.run / resources.wait_usage / resources.measure 결과
+    (seconds, user_seconds, sys_seconds, peak_rss_mb)
+    """
+    entry = {
+        "run_id": run_id(),
+        "stage": stage,
+        "tool": tool,
+        "qp": qp,
+        "sequence": sequence,
+        "cmd": cmd,
+        "binary": _binary_info(cmd[0]) if cmd else None,
+        "exit_status": returncode,
+        "error": error[-2000:] if error else None,
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        **(usage or {}),
+    }
+    line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+    path = manifest_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # O_APPEND + 한 번의 write로 기록하여 여러 워커가 동시에 써도 줄이 섞이지 않음
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+@functools.lru_cache(maxsize=None)
+def _binary_info(binary):
+    # 인코더/디코더 교체 여부 확인용 (내용 해시 대신 크기/수정 시각)
+    resolved = shutil.which(binary) or binary
+    try:
+        st = os.stat(resolved)
+    except OSError:
+        return {"path": resolved}
+    return {"path": resolved, "size": st.st_size, "mtime": int(st.st_mtime)}
+
+
+def load_manifest(path=None, run=None):
+    """실행 기록 DataFrame (run: 실행 ID, "latest"면 마지막 실행만)"""
+    path = path or manifest_path()
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    df = pd.read_json(path, lines=True, dtype={"run_id": str})
+    if run == "latest" and not df.empty:
+        run = df["run_id"].iloc[-1]
+    if run is not None:
+        df = df[df["run_id"] == run]
+    return df
+
+
+def summarize(df):
+    """단계/tool별 작업 수, 실패 수, 소요 시간 합계, CPU 사용률, 최대 메모리"""
+    if df.empty:
+        return df
+    df = df.assign(failed=df["exit_status"] != 0)
+    summary = df.groupby(["stage", "tool"]).agg(
+        jobs=("stage", "size"),
+        failed=("failed", "sum"),
+        wall_seconds=("seconds", "sum"),
+        cpu_seconds=("user_seconds", "sum"),
+        sys_seconds=("sys_seconds", "sum"),
+        max_peak_rss_mb=("peak_rss_mb", "max"),
+    )
+    summary["cpu_seconds"] += summary.pop("sys_seconds")
+    # 작업 실행 중 평균 사용 코어 수 (1이면 단일 스레드를 꽉 채움)
+    summary["cpu_per_wall"] = summary["cpu_seconds"] / summary["wall_seconds"]
+    return summary.round(2)
+
+
+# 단계를 단독 실행할 때도 워커들이 같은 ID를 상속하도록 import한 (부모) 프로세스에서 정해 둠
+run_id()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run_manifest.jsonl 요약")
+    parser.add_argument(
+        "--run", default="latest", help="실행 ID (기본값: 마지막 실행, all: 전체)"
+    )
+    args = parser.parse_args()
+    df = load_manifest(run=None if args.run == "all" else args.run)
+    if df.empty:
+        print("⚠️ 실행 기록이 없습니다.")
+    else:
+        print(f"📋 실행 기록: {', '.join(df['run_id'].unique())}")
+        print(summarize(df).to_string())
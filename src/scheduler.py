@@ -0,0 +1,108 @@
+import heapq
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+class Task:
+    """DAG 작업 단위
+
+    fn(args)는 워커 프로세스에서 실행됨 (pickle 가능한 모듈 수준 함수).
+    prepare()는 부모 프로세스에서 실행 직전에 호출되어 (cached, args)를 반환:
+      cached가 None이 아니면 실행하지 않고 그 결과로 완료 처리.
+    finish(result)는 부모 프로세스에서 호출되어 성공 여부(bool)를 반환.
+    priority가 작을수록 먼저 제출됨 (튜플 등 비교 가능한 값, 같으면 추가한 순서).
+    demand는 (스레드 수, 예상 최대 메모리 bytes), run_dag에 budget이 있을 때 사용.
+    """
+
+    def __init__(
+        self,
+        name,
+        fn,
+        args=None,
+        deps=(),
+        prepare=None,
+        finish=None,
+        priority=0,
+        demand=(1, 0),
+    ):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.deps = tuple(deps)
+        self.prepare = prepare or (lambda: (None, args))
+        self.finish = finish or (lambda result: True)
+        self.priority = priority
+        self.demand = demand
+
+
+def run_dag(tasks, max_workers, on_skip=None, budget=None):
+    """의존성이 모두 성공한 작업부터 하나의 워커 풀에서 실행
+
+    선행 작업이 실패한 작업은 실행하지 않고 on_skip(task, failed_dep)을 호출.
+    budget(resources.ResourceBudget)이 주어지면 실행 중인 작업의 demand 합계가
+    예산을 넘지 않도록, 맞지 않는 작업은 미뤄두고 다음 순위 작업을 먼저 제출.
+    반환: {task.name: 성공 여부}
+    """
+    by_name = {t.name: t for t in tasks}
+    missing = {d for t in tasks for d in t.deps if d not in by_name}
+    if missing:
+        raise ValueError(f"정의되지 않은 선행 작업: {sorted(missing)}")
+
+    waiting = {t.name: len(t.deps) for t in tasks}
+    dependents = {t.name: [] for t in tasks}
+    for t in tasks:
+        for d in t.deps:
+            dependents[d].append(t.name)
+
+    order_of = {t.name: i for i, t in enumerate(tasks)}
+    status = {}
+    ready = [(t.priority, order_of[t.name], t.name) for t in tasks if not t.deps]
+    heapq.heapify(ready)
+
+    def _complete(name, ok):
+        status[name] = ok
+        for child in dependents[name]:
+            if child in status:
+                continue
+            if not ok:
+                _skip(child, name)
+                continue
+            waiting[child] -= 1
+            if waiting[child] == 0:
+                heapq.heappush(ready, (by_name[child].priority, order_of[child], child))
+
+    def _skip(name, failed_dep):
+        if on_skip is not None:
+            on_skip(by_name[name], failed_dep)
+        _complete(name, False)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while ready or running:
+            # 빈 워커 슬롯만큼 준비된 작업 제출 (캐시 적중 작업은 바로 완료)
+            deferred = []
+            while ready and len(running) < max_workers:
+                item = heapq.heappop(ready)
+                task = by_name[item[2]]
+                if budget is not None and not budget.fits(*task.demand):
+                    deferred.append(item)
+                    continue
+                cached, args = task.prepare()
+                if cached is not None:
+                    _complete(task.name, task.finish(cached))
+                    continue
+                if budget is not None:
+                    budget.acquire(*task.demand)
+                running[executor.submit(task.fn, args)] = task.name
+            for item in deferred:
+                heapq.heappush(ready, item)
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                if budget is not None:
+                    budget.release(*by_name[name].demand)
+                _complete(name, by_name[name].finish(future.result()))
+
+    return status
@@ -0,0 +1,158 @@
+import fcntl
+import os
+import re
+import tempfile
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import yuv_io
+
+
+def _default_cache_dir():
+    # /dev/shm(tmpfs)가 있으면 메모리 기반 공유 mmap, 없으면 임시 폴더 사용
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+# 캐시 파일 이름: vcm_orig_{부모 PID}_{임의값}_{순번}_{시퀀스}
+_FILE_RE = re.compile(r"^vcm_orig_(\d+)_")
+
+
+def _remove_orphans(cache_dir):
+    """부모 프로세스가 강제 종료(SIGKILL, OOM 등)되어 남은 캐시 파일 삭제"""
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    for name in names:
+        m = _FILE_RE.match(name)
+        if m is None or _pid_alive(int(m.group(1))):
+            continue
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # 다른 사용자의 프로세스
+    return True
+
+
+class SharedOriginalCache:
+    """원본 시퀀스 Y 평면을 공유 mmap 파일에 한 번만 적재하는 LRU 캐시
+
+    부모 프로세스는 acquire()로 공간만 잡고 descriptor를 워커에 넘기며 (원본을 읽지 않음),
+    처음 attach()한 워커가 원본을 채우고 나머지 워커는 같은 메모리를 복사 없이 읽음.
+    참조 중이지 않은 항목은 budget_bytes를 넘을 때 오래된 순서대로 제거됨.
+    생성 시 이전에 강제 종료된 부모 프로세스가 남긴 파일을 정리함.
+    """
+
+    def __init__(self, budget_bytes, cache_dir=None):
+        self.budget_bytes = budget_bytes
+        self.cache_dir = cache_dir or _default_cache_dir()
+        _remove_orphans(self.cache_dir)
+        self._prefix = f"vcm_orig_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        self._entries = OrderedDict()  # key -> {"desc", "nbytes", "refs"}
+        self._used = 0
+        self._seq = 0
+
+    def acquire(self, key, path, width, height, frame_count):
+        """원본용 공유 파일을 잡고(또는 재사용) descriptor 반환, 예산 초과 시 None
+
+        파일 크기만 정해 두고 내용은 처음 attach()하는 워커가 채움.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry["refs"] += 1
+            self._entries.move_to_end(key)
+            return entry["desc"]
+
+        if not os.path.exists(path):
+            return None
+        # memmap 뷰로 크기만 확인 (읽지 않음)
+        shape = yuv_io.read_y_frames(path, width, height, frame_count).shape
+        nbytes = int(np.prod(shape))
+        if nbytes == 0 or not self._make_room(nbytes):
+            return None
+
+        self._seq += 1
+        shm_path = os.path.join(self.cache_dir, f"{self._prefix}_{self._seq}_{key}")
+        with open(shm_path, "wb") as f:
+            f.truncate(nbytes)
+
+        desc = {
+            "path": shm_path,
+            "shape": shape,
+            "source": (path, width, height, frame_count),
+        }
+        self._entries[key] = {"desc": desc, "nbytes": nbytes, "refs": 1}
+        self._used += nbytes
+        return desc
+
+    def release(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry["refs"] > 0:
+            entry["refs"] -= 1
+
+    def close(self):
+        for key in list(self._entries):
+            self._evict(key)
+
+    def _make_room(self, nbytes):
+        """참조 없는 항목을 LRU 순으로 제거해 nbytes 만큼 공간 확보"""
+        if nbytes > self.budget_bytes:
+            return False
+        for key in list(self._entries):
+            if self._used + nbytes <= self.budget_bytes:
+                break
+            if self._entries[key]["refs"] == 0:
+                self._evict(key)
+        return self._used + nbytes <= self.budget_bytes
+
+    def _evict(self, key):
+        entry = self._entries.pop(key)
+        self._used -= entry["nbytes"]
+        for path in (entry["desc"]["path"], _ready_path(entry["desc"]["path"])):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(desc):
+    """워커 측: descriptor로 공유 Y 평면 (N, H, W)에 읽기 전용으로 연결
+
+    아직 채워지지 않았으면 파일 잠금을 잡고 원본에서 채움 (동시에 attach한 다른
+    워커는 채우기가 끝날 때까지 대기). 완료 표시는 {경로}.ready 파일.
+    """
+    path, shape = desc["path"], tuple(desc["shape"])
+    if not os.path.exists(_ready_path(path)):
+        fd = os.open(path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if not os.path.exists(_ready_path(path)):
+                src = yuv_io.read_y_frames(*desc["source"])
+                dst = np.memmap(path, dtype=np.uint8, mode="r+", shape=shape)
+                dst[:] = src[: shape[0]]
+                dst.flush()
+                del dst
+                open(_ready_path(path), "wb").close()
+        finally:
+            os.close(fd)  # 잠금도 함께 해제
+    return np.memmap(path, dtype=np.uint8, mode="r", shape=shape)
+
+
+def _ready_path(path):
+    return f"{path}.ready"
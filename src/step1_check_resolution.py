@@ -1,8 +1,11 @@
 import os
 import pandas as pd
 import config as cfg
+import profiling
+import results_db
 
 
+@profiling.stage("check_resolution")
 def run_check_resolution(data_path):
     # 1. 파일 목록 가져오기
     files = [f for f in os.listdir(data_path) if f.endswith(".yuv")]
@@ -66,6 +69,7 @@ def run_check_resolution(data_path):
         print(f"📂 결과 폴더 생성 완료: {OUTPUT_DIR}")
 
     meta_df.to_csv(os.path.join(OUTPUT_DIR, "metadata_vcm.csv"), index=False)
+    results_db.open_store().replace("metadata", meta_df)
     print("✅ 1단계 완료: metadata_vcm.csv 생성됨")
 
     return meta_df
@@ -1,12 +1,40 @@
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
 import cv2
 import pandas as pd
 import config as cfg
-
-
-def run_analyze_metrics(data_path, metadata_path=None):
-    """metadata_vcm.csv를 이용해 메트릭 분석 (step1 결과 활용)"""
+import pipeline_cache
+import profiling
+import results_db
+import yuv_io
+
+# 분석 방식이 바뀌면 올려서 기존 리포트 캐시를 무효화
+_ANALYSIS_VERSION = 3
+# 장면 전환 판정: 프레임 차이 평균이 시퀀스 중앙값의 이 배수 이상이고 최소값 이상일 때
+_SCENE_CUT_RATIO = 3.0
+_SCENE_CUT_MIN_DIFF = 20.0
+
+# 리포트에 추가되는 전체 시퀀스 분석 컬럼 (_analyze_single 결과 순서)
+_METRIC_COLUMNS = [
+    "pixel_mean",
+    "edge_density(%)",
+    "temporal_diff",
+    "si",
+    "ti",
+    "scene_cuts",
+    "scene_cut_rate",
+    "analyzed_frames",
+]
+
+
+@profiling.stage("analyze")
+def run_analyze_metrics(data_path, metadata_path=None, max_workers=None):
+    """metadata_vcm.csv를 이용해 메트릭 분석 (step1 결과 활용)
+
+    전체 프레임(ANALYZE_FRAME_STRIDE 간격)을 시퀀스별 병렬 워커로 분석.
+    """
     if metadata_path is None:
         metadata_path = os.path.join(cfg.OUTPUT_METADATA_DIR, "metadata_vcm.csv")
 
@@ -22,22 +50,62 @@ def run_analyze_metrics(data_path, metadata_path=None):
         print("⚠️ metadata에 유효한 파일이 없습니다.")
         return pd.DataFrame()
 
-    print(f"📊 총 {len(meta_df)}개 파일 분석을 시작합니다... (metadata_vcm 기반)")
+    # metadata와 원본 파일이 그대로면 기존 리포트 재사용
+    report_path = os.path.join(cfg.OUTPUT_REPORT_DIR, "vcm_analysis_report.csv")
+    stride = max(1, int(getattr(cfg, "ANALYZE_FRAME_STRIDE", 1)))
+    cache = pipeline_cache.open_cache()
+    if cache is not None:
+        key = pipeline_cache.make_key(
+            step="analyze_metrics",
+            version=_ANALYSIS_VERSION,
+            stride=stride,
+            metadata=cache.fingerprint(metadata_path),
+            sources=[
+                cache.fingerprint(os.path.join(data_path, f))
+                for f in meta_df["file_name"]
+            ],
+        )
+        if cache.lookup(report_path, key):
+            print("✅ 기존 vcm_analysis_report.csv 재사용 (입력 변경 없음)")
+            report = pd.read_csv(report_path)
+            results_db.open_store().replace("analysis", report)
+            return report
+
+    if max_workers is None:
+        max_workers = getattr(cfg, "ANALYZE_WORKERS", None) or max(
+            1, os.cpu_count() - 1
+        )
+    print(
+        f"📊 총 {len(meta_df)}개 파일 분석을 시작합니다... "
+        f"(metadata_vcm 기반, 프레임 간격 {stride}, 워커 {max_workers})"
+    )
 
-    # Y 채널 메트릭 계산 (파일 I/O - 매 파일별 처리)
-    metrics_list = [
-        _compute_file_metrics(
+    # Y 채널 메트릭 계산 (전체 시퀀스, 파일별 병렬 처리)
+    tasks = [
+        (
+            row.file_name,
             os.path.join(data_path, row.file_name),
             int(row.width),
             int(row.height),
             float(row.format_factor),
+            int(row.frame_count),
+            stride,
         )
         for row in meta_df.itertuples(index=False)
     ]
-
-    meta_df["pixel_mean"] = [m[0] for m in metrics_list]
-    meta_df["edge_density(%)"] = [m[1] for m in metrics_list]
-    meta_df["temporal_diff"] = [m[2] for m in metrics_list]
+    metrics = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_analyze_single, t) for t in tasks]
+        for future in as_completed(futures):
+            file_name, values = future.result()
+            metrics[file_name] = values
+            print(
+                f"✅ 분석 완료: {file_name} "
+                f"(SI {values[3]:.2f}, TI {values[4]:.2f}, 장면 전환 {values[5]})"
+            )
+
+    for i, column in enumerate(_METRIC_COLUMNS):
+        meta_df[column] = [metrics[f][i] for f in meta_df["file_name"]]
 
     # 결과 정리 (기존 리포트 형식 유지 + metadata 컬럼 추가)
     report = meta_df[
@@ -49,9 +117,7 @@ def run_analyze_metrics(data_path, metadata_path=None):
             "chroma_format",
             "format_factor",
             "frame_count",
-            "pixel_mean",
-            "edge_density(%)",
-            "temporal_diff",
+            *_METRIC_COLUMNS,
         ]
     ].copy()
     report["resolution"] = (
@@ -67,20 +133,32 @@ def run_analyze_metrics(data_path, metadata_path=None):
             "chroma_format",
             "format_factor",
             "frame_count",
-            "pixel_mean",
-            "edge_density(%)",
-            "temporal_diff",
+            *_METRIC_COLUMNS,
         ]
     ]
     report["pixel_mean"] = report["pixel_mean"].round(2)
     report["edge_density(%)"] = report["edge_density(%)"].round(4)
     report["temporal_diff"] = report["temporal_diff"].round(4)
-
+    report["si"] = report["si"].round(4)
+    report["ti"] = report["ti"].round(4)
+    report["scene_cuts"] = report["scene_cuts"].astype(int)
+    report["scene_cut_rate"] = report["scene_cut_rate"].round(4)
+
+    # 가중치: TI(움직임, 움직임 탐색/잔차 비용) 0.35 > SI(공간 디테일) 0.3
+    #   > 장면 전환 비율(전환마다 인트라 수준 비용) 0.15 = edge_density 0.15
+    #   (SI와 상관이 높아 보조 지표) > pixel_mean 0.05
+    #   temporal_diff는 TI와 같은 정보라 제외
+    norm_si = _min_max_norm(report["si"])
+    norm_ti = _min_max_norm(report["ti"])
+    norm_cuts = _min_max_norm(report["scene_cut_rate"])
     norm_edge = _min_max_norm(report["edge_density(%)"])
-    norm_temporal = _min_max_norm(report["temporal_diff"])
     norm_mean = _min_max_norm(report["pixel_mean"])
     report["complexity_score"] = (
-        0.4 * norm_edge + 0.5 * norm_temporal + 0.1 * norm_mean
+        0.35 * norm_ti
+        + 0.3 * norm_si
+        + 0.15 * norm_cuts
+        + 0.15 * norm_edge
+        + 0.05 * norm_mean
     ).round(4)
 
     # 압축 우선순위: 복잡도 높은 순 (높을수록 먼저 압축)
@@ -96,38 +174,66 @@ def run_analyze_metrics(data_path, metadata_path=None):
         os.makedirs(OUTPUT_DIR)
         print(f"📂 결과 폴더 생성 완료: {OUTPUT_DIR}")
 
-    report.to_csv(os.path.join(OUTPUT_DIR, "vcm_analysis_report.csv"), index=False)
+    report.to_csv(report_path, index=False)
+    results_db.open_store().replace("analysis", report)
+    if cache is not None:
+        cache.store(report_path, key, path=report_path)
     print("✅ 2단계 완료: vcm_analysis_report.csv 생성됨")
     print(report.head(10))
     return report
 
 
-def _compute_file_metrics(path, w, h, format_factor):
-    """단일 파일 Y 채널 메트릭 계산 (벡터화된 NumPy 연산 사용)"""
-    frame_y_bytes = w * h
-    chroma_skip = int(frame_y_bytes * (format_factor - 1))
-
-    with open(path, "rb") as f:
-        y1_raw = f.read(frame_y_bytes)
-        y1 = np.frombuffer(y1_raw, dtype=np.uint8).reshape((h, w))
-
-        f.seek(chroma_skip, 1)
-        y2_raw = f.read(frame_y_bytes)
-
-    pixel_mean = np.mean(y1)
-
-    temporal_diff = 0.0
-    if len(y2_raw) == frame_y_bytes:
-        y2 = np.frombuffer(y2_raw, dtype=np.uint8).reshape((h, w))
-        temporal_diff = np.float64(np.mean(cv2.absdiff(y1, y2)))
-
-    edges = cv2.Canny(y1, 100, 200)
-    edge_density = np.float64(np.sum(edges > 0)) / (w * h) * 100
-
-    return pixel_mean, edge_density, temporal_diff
+@profiling.worker("analyze")
+def _analyze_single(args):
+    """단일 파일 전체 시퀀스 Y 채널 분석 (멀티프로세싱 워커용, memmap 뷰 사용)
+
+    stride 간격으로 뽑은 프레임 i마다 공간 지표와 (i, i+1) 시간 지표를 계산.
+    - pixel_mean, edge_density(%), temporal_diff: 프레임 평균
+    - si, ti: ITU-T P.910 SI/TI (Sobel 크기 / 프레임 차이 표준편차의 최대값)
+    - scene_cuts: 프레임 차이가 급격히 튀는 (i, i+1) 쌍의 수
+    - scene_cut_rate: scene_cuts / 분석한 (i, i+1) 쌍의 수
+    """
+    file_name, path, w, h, format_factor, frame_count, stride = args
+    # 워커 수만큼 프로세스가 돌므로 OpenCV 내부 스레드는 1개로 제한
+    cv2.setNumThreads(1)
+    frames = yuv_io.open_yuv(path, w, h, frame_count, format_factor=format_factor)
+    y = yuv_io.y_frames(frames, w, h, format_factor=format_factor)
+    n = len(y)
+    if n == 0:
+        return file_name, (np.nan, np.nan, np.nan, np.nan, np.nan, 0, 0.0, 0)
+
+    means, edges, diffs, si, ti = [], [], [], [], []
+    for i in range(0, n, stride):
+        cur = np.ascontiguousarray(y[i])
+        means.append(cur.mean())
+        edges.append(np.count_nonzero(cv2.Canny(cur, 100, 200)) / (w * h) * 100)
+        gx = cv2.Sobel(cur, cv2.CV_32F, 1, 0)
+        gy = cv2.Sobel(cur, cv2.CV_32F, 0, 1)
+        si.append(float(cv2.magnitude(gx, gy).std()))
+        if i + 1 < n:
+            diff = y[i + 1].astype(np.int16) - cur
+            diffs.append(float(np.abs(diff).mean()))
+            ti.append(float(diff.std()))
+
+    diffs = np.asarray(diffs)
+    scene_cuts = 0
+    if len(diffs) > 0:
+        threshold = max(_SCENE_CUT_MIN_DIFF, _SCENE_CUT_RATIO * np.median(diffs))
+        scene_cuts = int(np.count_nonzero(diffs >= threshold))
+
+    return file_name, (
+        float(np.mean(means)),
+        float(np.mean(edges)),
+        float(diffs.mean()) if len(diffs) > 0 else 0.0,
+        float(max(si)),
+        float(max(ti, default=0.0)),
+        scene_cuts,
+        scene_cuts / len(diffs) if len(diffs) > 0 else 0.0,
+        len(means),
+    )
 
 
-# 복잡도 점수(Complexity Score): edge_density, temporal_diff, pixel_mean 기반
+# 복잡도 점수(Complexity Score): SI, TI, 장면 전환 비율, edge_density, pixel_mean 기반
 # Min-max 정규화 후 가중 합 (공간/시간 복잡도 위주)
 def _min_max_norm(s: pd.Series) -> pd.Series:
     lo, hi = s.min(), s.max()
@@ -1,18 +1,25 @@
+import asyncio
 import os
-import subprocess
 import pandas as pd
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
 
 import config as cfg
+import async_runner
+import encoder_log
+import job_cost
+import job_journal
+import pipeline_cache
+import profiling
+import progress
+import resources
+import results_db
 
 
-def _compress_single(args):
-    """단일 파일 HEVC 압축 (멀티프로세싱 워커용)"""
-    row_dict, input_root, output_root, qp = args
+def _build_command(row_dict, input_root, output_root, qp, threads=1):
+    """HEVC(ffmpeg/libx265) 압축 명령어와 입출력 경로 구성"""
     file_name = row_dict["file_name"]
     base_name = row_dict["base_name"]
     w, h = int(row_dict["width"]), int(row_dict["height"])
-    priority = row_dict["compress_priority"]
 
     input_path = os.path.join(input_root, file_name)
     output_dir = os.path.join(
@@ -20,9 +27,6 @@ def _compress_single(args):
     )  # output_root = OUTPUT_COMPRESSED_HEVC_DIR
     output_path = os.path.join(output_dir, f"{base_name}_qp{qp}.mp4")
 
-    if not os.path.exists(input_path):
-        return priority, base_name, qp, False, f"입력 파일 없음: {input_path}"
-
     cmd = [
         "ffmpeg",
         "-y",
@@ -37,37 +41,170 @@ def _compress_single(args):
         "-c:v",
         "libx265",
         "-x265-params",
-        f"random-access=1:qp={qp}",
+        # x265는 기본적으로 모든 코어로 스레드 풀을 만드므로 작업당 스레드 수를 명시
+        # frame-threads는 비트스트림에 영향을 주므로 고정 (스레드 수는 pools로만 조절)
+        # csv 로그(프레임별 POC/bits/PSNR)는 압축 후 frames.csv로 변환
+        f"random-access=1:qp={qp}:pools={threads}"
+        f":frame-threads={getattr(cfg, 'HEVC_FRAME_THREADS', 1)}"
+        f":csv={encoder_log.x265_csv_path(output_path)}:csv-log-level=1:psnr=1",
         "-pix_fmt",
         "yuv420p",
         "-threads",
-        "1",
-        output_path,
+        str(threads),
+        # 임시 이름에 쓰고 성공 시 교체 (중단되어도 최종 이름에는 완성된 파일만 남음)
+        job_journal.partial_path(output_path),
     ]
+    return cmd, input_path, output_path
+
+
+async def _compress_job(args):
+    """단일 파일 HEVC 압축 (async_runner로 인코더를 직접 실행)"""
+    row_dict, input_root, output_root, qp, threads = args
+    base_name = row_dict["base_name"]
+    priority = row_dict["compress_priority"]
+
+    cmd, input_path, output_path = _build_command(
+        row_dict, input_root, output_root, qp, threads
+    )
+
+    if not os.path.exists(input_path):
+        err_msg = f"입력 파일 없음: {input_path}"
+        job_journal.record("failed", "encode", "HEVC", qp, base_name, error=err_msg)
+        return priority, base_name, qp, False, err_msg, None
+
+    job_journal.record("start", "encode", "HEVC", qp, base_name)
+    tmp_path = job_journal.partial_path(output_path)
+    result = await async_runner.run(cmd, "encode", "HEVC", qp, base_name)
+    if not result.ok:
+        job_journal.discard(tmp_path)
+        job_journal.record(
+            "failed", "encode", "HEVC", qp, base_name, error=result.error()
+        )
+        return priority, base_name, qp, False, result.error(), result.usage
+
+    # x265 프레임별 로그를 비트스트림 옆 frames.csv로 정리 (빠른 평가용)
+    log_path = encoder_log.x265_csv_path(output_path)
+    if os.path.exists(log_path):
+        records = encoder_log.parse_x265_csv(log_path)
+        if records:
+            encoder_log.save_frames(records, encoder_log.frames_path(output_path))
+        os.remove(log_path)
+    job_journal.publish(tmp_path, output_path)
+    job_journal.record(
+        "done", "encode", "HEVC", qp, base_name, [input_path], [output_path]
+    )
+    return priority, base_name, qp, True, None, result.usage
 
-    try:
-        subprocess.run(cmd, check=True, capture_output=True, text=True)
-        return priority, base_name, qp, True, None
-    except subprocess.CalledProcessError as e:
-        return priority, base_name, qp, False, str(e.stderr) if e.stderr else str(e)
 
+@profiling.worker("encode_hevc")
+def _compress_single(args):
+    """_compress_job의 동기 버전 (파이프라인 워커 프로세스용)"""
+    return asyncio.run(_compress_job(args))
+
+
+def _job_key(cache, row_dict, input_root, output_root, qp, threads=1):
+    """캐시 이름(출력 경로)과 입력 키: 원본 지문 + ffmpeg 바이너리 + QP + 명령줄
+
+    스레드 풀 크기(pools, -threads)는 출력에 영향이 없으므로 1로 고정한 명령줄로 키 구성
+    (예산에 따라 스레드 수가 바뀌어도 다시 압축하지 않음).
+    """
+    cmd, input_path, output_path = _build_command(row_dict, input_root, output_root, qp)
+    return output_path, cache.command_key("compress_hevc", cmd, [input_path], qp=qp)
 
-def compress_vcm_hevc_ffmpeg(input_root, output_root, qp, job_df, max_workers=None):
-    """metadata_vcm + vcm_analysis_report 기반 HEVC 압축 (ProcessPoolExecutor 병렬화)"""
-    if max_workers is None:
-        max_workers = max(1, os.cpu_count() - 1)
 
+def compress_vcm_hevc_ffmpeg(
+    input_root,
+    output_root,
+    qp_list,
+    job_df,
+    max_workers=None,
+    cache=None,
+    journal=None,
+):
+    """metadata_vcm + vcm_analysis_report 기반 HEVC 압축 (async_runner로 인코더 병렬 실행)
+
+    모든 (시퀀스, QP) 작업을 하나의 큐에 넣고 예상 소요 시간이 긴 작업부터 제출
+    (job_cost: 해상도 x 프레임 수 x complexity_score, 이전 실행 기록으로 보정).
+    동시 실행은 CPU/메모리 예산(resources) 안으로 제한하며, max_workers는 CPU 예산 상한.
+    cache(PipelineCache)가 주어지면 입력 키가 같은 기존 결과는 건너뜀.
+    journal(job_journal.Journal, --resume)이 주어지면 이전 실행에서 완료된 작업은 건너뜀.
+    반환: 산출물 경로 목록 (캐시 GC 용)
+    """
+    if isinstance(qp_list, int):
+        qp_list = [qp_list]
+
+    budget = resources.ResourceBudget(cpus=max_workers)
+    plan = resources.plan_jobs("HEVC", job_df, budget.cpus, budget.memory_bytes)
+    costs = job_cost.estimate_costs(job_df, "HEVC", qp_list)
     rows = job_df.to_dict("records")
-    tasks = [(r, input_root, output_root, qp) for r in rows]
+    tasks = []
+    keys = {}
+    outputs = []
+    tracker = progress.Tracker()
+    for qp, r in product(qp_list, rows):
+        threads = plan[r["base_name"]][0]
+        name, key = (
+            _job_key(cache, r, input_root, output_root, qp, threads)
+            if cache is not None
+            else (_build_command(r, input_root, output_root, qp, threads)[2], None)
+        )
+        outputs.append(name)
+        tracker.add("encode", "HEVC", qp, r["base_name"])
+        if journal is not None and journal.completed(
+            "encode", "HEVC", qp, r["base_name"]
+        ):
+            print(
+                f"⏭️ [{r['compress_priority']}] {r['base_name']} 이전 실행에서 완료, 압축 생략 (QP {qp})"
+            )
+            tracker.done("encode", "HEVC", qp, r["base_name"], "cached")
+            continue
+        if cache is not None:
+            if cache.lookup(name, key):
+                print(
+                    f"⏭️ [{r['compress_priority']}] {r['base_name']} 캐시 유효, 압축 생략 (QP {qp})"
+                )
+                tracker.done("encode", "HEVC", qp, r["base_name"], "cached")
+                continue
+            cache.invalidate(name)
+            keys[(r["base_name"], qp)] = (name, key)
+        tasks.append((r, input_root, output_root, qp, threads))
+
+    # 긴 작업 우선 (LPT): 마지막에 큰 작업 하나만 남아 코어가 노는 현상 완화
+    tasks.sort(key=lambda t: costs[(t[0]["base_name"], t[3])], reverse=True)
+    demands = [plan[t[0]["base_name"]] for t in tasks]
+    print(
+        f"📋 전체 큐: {len(tasks)}개 작업 (QP {qp_list}, 예상 소요 시간 긴 순, "
+        f"{budget.describe()})"
+    )
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(_compress_single, t): t for t in tasks}
-        for future in as_completed(futures):
-            priority, base_name, qp_val, ok, err_msg = future.result()
+    # 진행 상황(완료/실행 중 작업, frames/s, ETA)을 progress.prom으로 내보내며 실행
+    with tracker:
+        for result in async_runner.run_within_budget(
+            _compress_job, tasks, demands, budget
+        ):
+            priority, base_name, qp_val, ok, err_msg, usage = result
+            tracker.done(
+                "encode", "HEVC", qp_val, base_name, "done" if ok else "failed"
+            )
             if ok:
-                print(f"✅ [{priority}] {base_name} 압축 완료 (QP {qp_val})")
+                print(
+                    f"✅ [{priority}] {base_name} 압축 완료 (QP {qp_val}, "
+                    f"{usage['seconds']:.1f}s, {usage['peak_rss_mb']:.0f}MB)"
+                )
+                job_cost.record_timing(
+                    "HEVC",
+                    base_name,
+                    qp_val,
+                    usage["seconds"],
+                    usage["peak_rss_mb"],
+                    plan[base_name][0],
+                )
+                if cache is not None:
+                    name, key = keys[(base_name, qp_val)]
+                    cache.store(name, key, path=name)
             else:
                 print(f"❌ [{priority}] {base_name} 압축 실패 (QP {qp_val}): {err_msg}")
+    return outputs
 
 
 def build_job_df(metadata_path=None, analysis_path=None):
@@ -99,27 +236,48 @@ def build_job_df(metadata_path=None, analysis_path=None):
     os.makedirs(cfg.OUTPUT_REPORT_DIR, exist_ok=True)
     job_csv_path = os.path.join(cfg.OUTPUT_REPORT_DIR, "job_df.csv")
     job_df.to_csv(job_csv_path, index=False)
+    results_db.open_store().replace("jobs", job_df)
+
+    # step3_2(VVC)가 입력 변경 여부를 확인해 재사용할 수 있도록 키 기록
+    cache = pipeline_cache.open_cache()
+    if cache is not None:
+        key = pipeline_cache.make_key(
+            step="job_df",
+            metadata=cache.fingerprint(metadata_path),
+            analysis=cache.fingerprint(analysis_path),
+        )
+        cache.store(job_csv_path, key, path=job_csv_path)
     print(f"✅ job_df.csv 생성됨: {job_csv_path}")
     return job_df
 
 
+@profiling.stage("compress_hevc")
 def run_compress_hevc():
     input_root = cfg.ROI_PATH
     output_root = cfg.OUTPUT_COMPRESSED_HEVC_DIR
 
     job_df = build_job_df()
-    n_workers = max(1, os.cpu_count() - 1)
-    print(f"📊 압축 대상 {len(job_df)}개 (compress_priority 순, {n_workers} 워커 병렬)")
+    print(
+        f"📊 압축 대상 {len(job_df)}개 (compress_priority 순, CPU/메모리 예산 내 병렬)"
+    )
+
+    cache = pipeline_cache.open_cache()
 
     qp_list = cfg.QP_LIST
     for qp in qp_list:
-        qp_dir = os.path.join(output_root, f"qp{qp}")
-        if not os.path.exists(qp_dir):
-            os.makedirs(qp_dir, exist_ok=True)
-        print(f"\n🚀 QP {qp} 압축 시작...")
-        compress_vcm_hevc_ffmpeg(
-            input_root, output_root, qp, job_df, max_workers=n_workers
-        )
+        os.makedirs(os.path.join(output_root, f"qp{qp}"), exist_ok=True)
+    print(f"\n🚀 QP {qp_list} 압축 시작...")
+    live_outputs = compress_vcm_hevc_ffmpeg(
+        input_root,
+        output_root,
+        qp_list,
+        job_df,
+        cache=cache,
+        journal=job_journal.open_journal(),
+    )
+
+    if cache is not None:
+        cache.gc(output_root, set(live_outputs))
 
     # 모든 압축이 끝난 후 ZIP 파일 생성
     import shutil
@@ -1,31 +1,68 @@
+import asyncio
+import math
 import os
-import subprocess
 import pandas as pd
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
 import shutil
+import time
 
 import config as cfg
+import async_runner
+import encoder_log
+import job_cost
+import job_journal
+import pipeline_cache
+import profiling
+import progress
+import resources
+import results_db
+import yuv_io
 
 
-def _compress_single(args):
-    """단일 파일 VVC 압축 (멀티프로세싱 워커용)"""
-    row_dict, input_root, output_root, qp = args
+def segment_ranges(row_dict, segments):
+    """구간 병렬 인코딩 구간 [(시작 프레임, 프레임 수)]
+
+    FR_DICT의 intra period 경계에서 최대 segments개로 나눔 (1이면 전체 한 구간).
+    """
+    frame_count = int(row_dict["frame_count"])
+    intra_period = cfg.FR_DICT.get(row_dict["base_name"], (0,))[0]
+    if segments <= 1 or intra_period <= 0:
+        return [(0, frame_count)]
+    # intra period를 구간마다 고르게 배분 (마지막 구간은 남은 프레임까지)
+    periods = math.ceil(frame_count / intra_period)
+    count = min(segments, periods)
+    bounds = [
+        min(frame_count, (k * periods // count) * intra_period)
+        for k in range(count + 1)
+    ]
+    return [(start, end - start) for start, end in zip(bounds, bounds[1:])]
+
+
+def segment_path(out_bin, index):
+    """구간 비트스트림 임시 경로: {시퀀스}_qpXX.seg{번호}.partial.bin"""
+    root, ext = os.path.splitext(out_bin)
+    return job_journal.partial_path(f"{root}.seg{index}{ext}")
+
+
+def _build_command(row_dict, input_root, output_root, qp, threads=1, segment=None):
+    """VVC(VTM EncoderApp) 압축 명령어와 입출력 경로 구성
+
+    VTM 인코더는 단일 스레드이므로 threads는 구간 병렬 인코딩의 최대 구간 수로 사용.
+    segment=(번호, 시작 프레임, 프레임 수)이면 그 구간만 IDR로 시작해 인코딩하는 명령
+    (-fs/-f, 비트스트림은 segment_path, 복원 YUV는 쓰지 않음).
+    """
     file_name = row_dict["file_name"]
     base_name = row_dict["base_name"]
     width = int(row_dict["width"])
     height = int(row_dict["height"])
     fps = int(row_dict["fps"])
     frame_count = int(row_dict["frame_count"])
-    priority = row_dict.get("compress_priority", 999)
 
     input_path = os.path.join(input_root, file_name)
     output_dir = os.path.join(output_root, f"qp{qp}")
     out_bin = os.path.join(output_dir, f"{base_name}_qp{qp}.bin")
     out_yuv = os.path.join(output_dir, f"{base_name}_qp{qp}.yuv")
 
-    if not os.path.exists(input_path):
-        return priority, base_name, qp, False, f"입력 파일 없음: {input_path}"
-
     # VVC 인코딩 명령어 구성
     cmd = [
         cfg.VVC_ENCODER_APP_PATH,
@@ -46,37 +83,259 @@ def _compress_single(args):
         "--InputBitDepth=8",
         "--InternalBitDepth=8",
         "--OutputBitDepth=8",
+    ]
+    if segment is not None:
+        index, start, count = segment
+        cmd[cmd.index("-f") + 1] = str(count)
+        # 구간마다 IDR로 시작해야 이어 붙인 스트림에서 POC가 올바르게 다시 시작됨
+        cmd += [
+            "-fs",
+            str(start),
+            f"--IntraPeriod={cfg.FR_DICT[base_name][0]}",
+            "--DecodingRefreshType=2",
+            "-b",
+            segment_path(out_bin, index),
+        ]
+        return cmd, input_path, out_bin
+    # 임시 이름에 쓰고 성공 시 교체 (중단되어도 최종 이름에는 완성된 파일만 남음)
+    cmd += [
         "-b",
-        out_bin,
+        job_journal.partial_path(out_bin),
         "-o",
-        out_yuv,
+        job_journal.partial_path(out_yuv),
     ]
+    return cmd, input_path, out_bin
+
+
+async def _compress_job(args):
+    """단일 파일 VVC 압축 (async_runner로 인코더를 직접 실행)"""
+    row_dict, input_root, output_root, qp, threads = args
+    base_name = row_dict["base_name"]
+    priority = row_dict.get("compress_priority", 999)
+
+    cmd, input_path, out_bin = _build_command(
+        row_dict, input_root, output_root, qp, threads
+    )
+
+    if not os.path.exists(input_path):
+        err_msg = f"입력 파일 없음: {input_path}"
+        job_journal.record("failed", "encode", "VVC", qp, base_name, error=err_msg)
+        return priority, base_name, qp, False, err_msg, None
+
+    job_journal.record("start", "encode", "VVC", qp, base_name)
+    out_yuv = os.path.join(os.path.dirname(out_bin), f"{base_name}_qp{qp}.yuv")
+    tmp_paths = {p: job_journal.partial_path(p) for p in (out_yuv, out_bin)}
+    ranges = segment_ranges(row_dict, threads)
+    if len(ranges) > 1:
+        ok, err_msg, usage, records = await _encode_segments(
+            args, ranges, tmp_paths[out_bin], tmp_paths[out_yuv]
+        )
+    else:
+        result = await async_runner.run(cmd, "encode", "VVC", qp, base_name)
+        ok, usage = result.ok, result.usage
+        err_msg = None if ok else result.error()
+        # VTM stdout의 프레임별 POC/bits/PSNR 로그 (빠른 평가용)
+        records = encoder_log.parse_vtm_log(result.stdout()) if ok else []
+    if not ok:
+        for tmp_path in tmp_paths.values():
+            job_journal.discard(tmp_path)
+        job_journal.record("failed", "encode", "VVC", qp, base_name, error=err_msg)
+        return priority, base_name, qp, False, err_msg, usage
+
+    # 프레임별 기록을 비트스트림 옆 frames.csv로 저장
+    if records:
+        encoder_log.save_frames(records, encoder_log.frames_path(out_bin))
+    # 복원 YUV를 먼저, 비트스트림을 마지막에 교체 (비트스트림이 있으면 작업 완료)
+    for path, tmp_path in tmp_paths.items():
+        if os.path.exists(tmp_path):
+            job_journal.publish(tmp_path, path)
+    # 복원 YUV는 복원 단계에서 옮겨질 수 있으므로 완료 확인은 비트스트림만
+    job_journal.record("done", "encode", "VVC", qp, base_name, [input_path], [out_bin])
+    return priority, base_name, qp, True, None, usage
+
+
+async def _encode_segments(args, ranges, tmp_bin, tmp_yuv):
+    """구간 병렬 인코딩: 구간들을 동시에 인코딩한 뒤 하나의 비트스트림으로 이어 붙임
 
+    각 구간은 IDR로 시작하고 POC도 0부터 다시 시작하므로 Annex-B 비트스트림을
+    순서대로 이어 붙이면 그대로 유효한 스트림이 됨. 이어 붙인 스트림은 디코더로
+    복원해 프레임 수를 확인하고, 그 출력을 인코더 복원 YUV(-o) 대신 사용.
+    반환: (성공 여부, 오류 메시지, 자원 사용량, 프레임별 기록)
+    """
+    row_dict, input_root, output_root, qp, threads = args
+    base_name = row_dict["base_name"]
+    segments = [(i, start, count) for i, (start, count) in enumerate(ranges)]
+    out_bin = _build_command(row_dict, input_root, output_root, qp, threads)[2]
+    seg_paths = [segment_path(out_bin, i) for i, _, _ in segments]
+    start_time = time.monotonic()
+    cmds = [
+        _build_command(row_dict, input_root, output_root, qp, threads, segment)[0]
+        for segment in segments
+    ]
     try:
-        # VVC는 로그가 많으므로 capture_output=True로 숨김 (에러 시 확인)
-        subprocess.run(cmd, check=True, capture_output=True, text=True)
-        return priority, base_name, qp, True, None
-    except subprocess.CalledProcessError as e:
-        err_msg = str(e.stderr) if e.stderr else str(e)
-        return priority, base_name, qp, False, err_msg
+        results = await asyncio.gather(
+            *(
+                async_runner.run(cmd, "encode", "VVC", qp, base_name, segment=i)
+                for i, cmd in enumerate(cmds)
+            )
+        )
+        usage = {
+            "seconds": time.monotonic() - start_time,
+            "user_seconds": sum(r.usage["user_seconds"] for r in results),
+            "sys_seconds": sum(r.usage["sys_seconds"] for r in results),
+            # 메모리 추정(job_cost)은 VTM 프로세스 단위이므로 구간 중 최대값
+            "peak_rss_mb": max(r.usage["peak_rss_mb"] for r in results),
+        }
+        for (i, _, _), result in zip(segments, results):
+            if not result.ok:
+                return False, f"구간 {i} 인코딩 실패: {result.error()}", usage, []
+        records = [
+            {**record, "poc": record["poc"] + start}
+            for (_, start, _), result in zip(segments, results)
+            for record in encoder_log.parse_vtm_log(result.stdout())
+        ]
+        await asyncio.to_thread(_concat, seg_paths, tmp_bin)
+    finally:
+        for path in seg_paths:
+            job_journal.discard(path)
+
+    # 이어 붙인 스트림 확인: 디코더 출력이 정확히 frame_count 프레임이어야 함
+    cmd = [cfg.VVC_DECODER_APP_PATH, "-b", tmp_bin, "-o", tmp_yuv]
+    result = await async_runner.run(cmd, "encode_verify", "VVC", qp, base_name)
+    usage["seconds"] = time.monotonic() - start_time
+    if not result.ok:
+        return False, f"이어 붙인 비트스트림 복원 실패: {result.error()}", usage, []
+    frame_bytes = yuv_io.frame_size(int(row_dict["width"]), int(row_dict["height"]))
+    expected = int(row_dict["frame_count"])
+    size = os.path.getsize(tmp_yuv) if os.path.exists(tmp_yuv) else 0
+    if size != expected * frame_bytes:
+        err_msg = (
+            f"이어 붙인 비트스트림 프레임 수 불일치 "
+            f"(복원 YUV {size} bytes, 기대 {expected}프레임 = {expected * frame_bytes} bytes)"
+        )
+        return False, err_msg, usage, []
+    return True, None, usage, records
+
+
+def _concat(paths, output_path):
+    with open(output_path, "wb") as out:
+        for path in paths:
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, out, 8 * 1024 * 1024)
 
 
-def compress_vcm_vvc(input_root, output_root, qp, job_df, max_workers=None):
-    """metadata_vcm + vcm_analysis_report 기반 VVC 압축 (ProcessPoolExecutor 병렬화)"""
-    if max_workers is None:
-        max_workers = 4  # VVC는 무거우므로 기본값 보수적으로 설정
+@profiling.worker("encode_vvc")
+def _compress_single(args):
+    """_compress_job의 동기 버전 (파이프라인 워커 프로세스용)"""
+    return asyncio.run(_compress_job(args))
+
+
+def _job_key(cache, row_dict, input_root, output_root, qp, threads=1):
+    """캐시 이름(비트스트림 경로)과 입력 키: 원본 + 인코더 + cfg + QP + 명령줄"""
+    cmd, input_path, out_bin = _build_command(
+        row_dict, input_root, output_root, qp, threads
+    )
+    key = cache.command_key(
+        "compress_vvc",
+        cmd,
+        [input_path, cfg.VVC_CFG_PATH],
+        qp=qp,
+        segments=segment_ranges(row_dict, threads),
+    )
+    return out_bin, key
+
 
+def compress_vcm_vvc(
+    input_root,
+    output_root,
+    qp_list,
+    job_df,
+    max_workers=None,
+    cache=None,
+    journal=None,
+):
+    """metadata_vcm + vcm_analysis_report 기반 VVC 압축 (async_runner로 인코더 병렬 실행)
+
+    모든 (시퀀스, QP) 작업을 하나의 큐에 넣고 예상 소요 시간이 긴 작업부터 제출
+    (job_cost: 해상도 x 프레임 수 x complexity_score, 이전 실행 기록으로 보정).
+    동시 실행은 CPU/메모리 예산(resources) 안으로 제한하며, max_workers는 CPU 예산 상한.
+    cache(PipelineCache)가 주어지면 입력 키가 같은 기존 결과는 건너뜀.
+    journal(job_journal.Journal, --resume)이 주어지면 이전 실행에서 완료된 작업은 건너뜀.
+    반환: 산출물 경로 목록 (캐시 GC 용)
+    """
+    if isinstance(qp_list, int):
+        qp_list = [qp_list]
+
+    budget = resources.ResourceBudget(cpus=max_workers)
+    plan = resources.plan_jobs("VVC", job_df, budget.cpus, budget.memory_bytes)
+    costs = job_cost.estimate_costs(job_df, "VVC", qp_list)
     rows = job_df.to_dict("records")
-    tasks = [(r, input_root, output_root, qp) for r in rows]
+    tasks = []
+    keys = {}
+    outputs = []
+    tracker = progress.Tracker()
+    for qp, r in product(qp_list, rows):
+        threads = plan[r["base_name"]][0]
+        name, key = (
+            _job_key(cache, r, input_root, output_root, qp, threads)
+            if cache is not None
+            else (_build_command(r, input_root, output_root, qp, threads)[2], None)
+        )
+        outputs.append(name)
+        tracker.add("encode", "VVC", qp, r["base_name"])
+        if journal is not None and journal.completed(
+            "encode", "VVC", qp, r["base_name"]
+        ):
+            print(
+                f"⏭️ [{r.get('compress_priority', 999)}] {r['base_name']} 이전 실행에서 완료, 압축 생략 (QP {qp})"
+            )
+            tracker.done("encode", "VVC", qp, r["base_name"], "cached")
+            continue
+        if cache is not None:
+            if cache.lookup(name, key):
+                print(
+                    f"⏭️ [{r.get('compress_priority', 999)}] {r['base_name']} 캐시 유효, 압축 생략 (QP {qp})"
+                )
+                tracker.done("encode", "VVC", qp, r["base_name"], "cached")
+                continue
+            cache.invalidate(name)
+            keys[(r["base_name"], qp)] = (name, key)
+        tasks.append((r, input_root, output_root, qp, threads))
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(_compress_single, t): t for t in tasks}
-        for future in as_completed(futures):
-            priority, base_name, qp_val, ok, err_msg = future.result()
+    # 긴 작업 우선 (LPT): 마지막에 큰 작업 하나만 남아 코어가 노는 현상 완화
+    tasks.sort(key=lambda t: costs[(t[0]["base_name"], t[3])], reverse=True)
+    demands = [plan[t[0]["base_name"]] for t in tasks]
+    print(
+        f"📋 전체 큐: {len(tasks)}개 작업 (QP {qp_list}, 예상 소요 시간 긴 순, "
+        f"{budget.describe()})"
+    )
+
+    # 진행 상황(완료/실행 중 작업, frames/s, ETA)을 progress.prom으로 내보내며 실행
+    with tracker:
+        for result in async_runner.run_within_budget(
+            _compress_job, tasks, demands, budget
+        ):
+            priority, base_name, qp_val, ok, err_msg, usage = result
+            tracker.done("encode", "VVC", qp_val, base_name, "done" if ok else "failed")
             if ok:
-                print(f"✅ [{priority}] {base_name} 압축 완료 (QP {qp_val})")
+                print(
+                    f"✅ [{priority}] {base_name} 압축 완료 (QP {qp_val}, "
+                    f"{usage['seconds']:.1f}s, {usage['peak_rss_mb']:.0f}MB)"
+                )
+                job_cost.record_timing(
+                    "VVC",
+                    base_name,
+                    qp_val,
+                    usage["seconds"],
+                    usage["peak_rss_mb"],
+                    plan[base_name][0],
+                )
+                if cache is not None:
+                    name, key = keys[(base_name, qp_val)]
+                    cache.store(name, key, path=name)
             else:
                 print(f"❌ [{priority}] {base_name} 압축 실패 (QP {qp_val}): {err_msg}")
+    return outputs
 
 
 def build_job_df(metadata_path=None, analysis_path=None):
@@ -84,15 +343,23 @@ def build_job_df(metadata_path=None, analysis_path=None):
     os.makedirs(cfg.OUTPUT_REPORT_DIR, exist_ok=True)
     job_csv_path = os.path.join(cfg.OUTPUT_REPORT_DIR, "job_df.csv")
 
-    if os.path.exists(job_csv_path):
-        print(f"✅ 기존 job_df.csv 발견: {job_csv_path}")
-        return pd.read_csv(job_csv_path)
-
     if metadata_path is None:
         metadata_path = os.path.join(cfg.OUTPUT_METADATA_DIR, "metadata_vcm.csv")
     if analysis_path is None:
         analysis_path = os.path.join(cfg.OUTPUT_ANALYSIS_DIR, "vcm_analysis_report.csv")
 
+    # 기존 job_df.csv는 입력(metadata, analysis report)이 그대로일 때만 재사용
+    cache = pipeline_cache.open_cache()
+    if cache is not None:
+        key = pipeline_cache.make_key(
+            step="job_df",
+            metadata=cache.fingerprint(metadata_path),
+            analysis=cache.fingerprint(analysis_path),
+        )
+        if cache.lookup(job_csv_path, key):
+            print(f"✅ 기존 job_df.csv 재사용 (입력 변경 없음): {job_csv_path}")
+            return pd.read_csv(job_csv_path)
+
     if not os.path.exists(metadata_path):
         raise FileNotFoundError(
             f"metadata_vcm.csv 없음. step1을 먼저 실행: {metadata_path}"
@@ -114,27 +381,42 @@ def build_job_df(metadata_path=None, analysis_path=None):
     )
 
     job_df.to_csv(job_csv_path, index=False)
+    results_db.open_store().replace("jobs", job_df)
+    if cache is not None:
+        cache.store(job_csv_path, key, path=job_csv_path)
     print(f"✅ job_df.csv 생성됨: {job_csv_path}")
     return job_df
 
 
+@profiling.stage("compress_vvc")
 def run_compress_vvc():
     input_root = cfg.ROI_PATH
     output_root = cfg.OUTPUT_COMPRESSED_VVC_DIR
 
     job_df = build_job_df()
 
-    # VVC 인코딩은 리소스를 많이 사용하므로 워커 수를 적절히 조절
-    n_workers = 4
-    print(f"📊 압축 대상 {len(job_df)}개 (compress_priority 순, {n_workers} 워커 병렬)")
+    # VVC 인코딩은 메모리를 많이 사용하므로 동시 작업 수는 해상도별 메모리 추정치로 결정
+    print(
+        f"📊 압축 대상 {len(job_df)}개 (compress_priority 순, CPU/메모리 예산 내 병렬)"
+    )
+
+    cache = pipeline_cache.open_cache()
 
     qp_list = cfg.QP_LIST
     for qp in qp_list:
-        qp_dir = os.path.join(output_root, f"qp{qp}")
-        if not os.path.exists(qp_dir):
-            os.makedirs(qp_dir, exist_ok=True)
-        print(f"\n🚀 QP {qp} 압축 시작...")
-        compress_vcm_vvc(input_root, output_root, qp, job_df, max_workers=n_workers)
+        os.makedirs(os.path.join(output_root, f"qp{qp}"), exist_ok=True)
+    print(f"\n🚀 QP {qp_list} 압축 시작...")
+    live_outputs = compress_vcm_vvc(
+        input_root,
+        output_root,
+        qp_list,
+        job_df,
+        cache=cache,
+        journal=job_journal.open_journal(),
+    )
+
+    if cache is not None:
+        cache.gc(output_root, set(live_outputs))
 
     # 모든 압축이 끝난 후 ZIP 파일 생성
     zip_base_name = os.path.join(os.path.dirname(output_root), "compress_vvc")
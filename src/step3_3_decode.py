@@ -1,37 +1,55 @@
+import asyncio
+import hashlib
 import os
+import shutil
 import subprocess
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import tempfile
+import time
+from contextlib import contextmanager
 from itertools import product
 
 import config as cfg
+import async_runner
+import job_journal
+import pipeline_cache
+import profiling
+import progress
+import resources
+import run_manifest
+import yuv_io
 
+# 스트리밍 복원 시 디코더 출력 경로: 부모가 넘겨준 파이프 쓰기 끝 (Linux /dev/fd)
+_PIPE_OUTPUT = "/dev/fd/{fd}"
 
-def _decode_single(args):
-    """단일 파일 복원 (멀티프로세싱 워커용)"""
-    video_id, qp, tool, compressed_tool_dir, decode_tool_dir = args
 
-    # 출력 폴더 생성 (워커 내에서 수행해도 되지만, 미리 만들어두는 게 안전함. 여기선 각자 확인)
-    qp_folder = os.path.join(decode_tool_dir, f"qp{qp}")
-    os.makedirs(qp_folder, exist_ok=True)
+def _build_command(
+    video_id, qp, tool, compressed_tool_dir, decode_tool_dir, pipe_output=None
+):
+    """복원 명령어와 입출력 경로 구성 (해상도 정보가 없으면 cmd는 None)
 
+    pipe_output이 주어지면 기본 YUV 경로 대신 그 경로(파이프 등)로 raw 프레임을 출력.
+    기본 출력은 임시 이름(job_journal.partial_path)이며 성공 시 최종 경로로 교체.
+    """
+    qp_folder = os.path.join(decode_tool_dir, f"qp{qp}")
     final_output_path = os.path.join(qp_folder, f"{video_id}_qp{qp}.yuv")
+    output = (
+        job_journal.partial_path(final_output_path)
+        if pipe_output is None
+        else pipe_output
+    )
+
+    # compressed file: HEVC는 qpXX/video_qpXX.mp4, VVC는 qpXX/video_qpXX.bin (step3_2 출력)
+    ext = ".mp4" if tool == "HEVC" else ".bin"
+    input_file = os.path.join(compressed_tool_dir, f"qp{qp}", f"{video_id}_qp{qp}{ext}")
 
     # 해상도 정보 가져오기 (HEVC crop용)
     if video_id not in cfg.RESOLUTIONS:
-        return tool, qp, video_id, False, f"해상도 정보 없음: {video_id}"
+        return None, input_file, final_output_path
 
     # step3-1, step3-2 등에서 cfg.RESOLUTIONS (4배 확대)를 사용하므로
     # 복원 시에도 동일한 해상도 기준을 따름.
     width, height = cfg.RESOLUTIONS[video_id]
 
-    cmd = ""
-    input_file = ""
-
-    # compressed file: qpXX/video_qpXX.mp4 (HEVC, VVC 공통)
-    input_file = os.path.join(
-        compressed_tool_dir, f"qp{qp}", f"{video_id}_qp{qp}.mp4"
-    )
-
     if tool == "HEVC":
         # ffmpeg crop 옵션: width:height:0:0
         cmd = [
@@ -43,25 +61,217 @@ def _decode_single(args):
             f"crop={width}:{height}:0:0",
             "-pix_fmt",
             "yuv420p",
-            final_output_path,
         ]
+        if pipe_output is not None:
+            # 확장자가 없는 출력이므로 포맷을 명시
+            cmd += ["-f", "rawvideo"]
+        cmd.append(output)
     else:
         # VVC 복원
-        cmd = [cfg.VVC_DECODER_APP_PATH, "-b", input_file, "-o", final_output_path]
+        cmd = [cfg.VVC_DECODER_APP_PATH, "-b", input_file, "-o", output]
+    return cmd, input_file, final_output_path
+
+
+def _job_key(cache, task):
+    """캐시 이름(복원 YUV 경로)과 입력 키 (명령을 만들 수 없으면 키는 None)"""
+    cmd, input_file, output_path = _build_command(*task)
+    if cmd is None:
+        return output_path, None
+    return output_path, cache.command_key(
+        "decode", cmd, [input_file], reuse_recon=reuse_encoder_recon(task[2])
+    )
+
+
+def reuse_encoder_recon(tool):
+    """VVC 복원 대신 VTM 인코더 복원 영상(-o)을 사용하는지 여부"""
+    return tool == "VVC" and getattr(cfg, "VVC_REUSE_ENCODER_RECON", True)
+
+
+def encoder_recon_path(video_id, qp, compressed_tool_dir):
+    """step3_2가 VTM -o 로 비트스트림 옆에 기록한 인코더 복원 YUV 경로"""
+    return os.path.join(compressed_tool_dir, f"qp{qp}", f"{video_id}_qp{qp}.yuv")
+
+
+def _verify_sampled(video_id, qp):
+    """디코더로 다시 복원해 비교할 작업인지 (이름 해시 기반이라 실행마다 같은 표본)"""
+    rate = getattr(cfg, "VVC_RECON_VERIFY_RATE", 0.1)
+    digest = hashlib.md5(f"{video_id}_qp{qp}".encode("utf-8")).hexdigest()
+    return int(digest, 16) % 1000 < rate * 1000
+
+
+def _md5(path):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+async def _reuse_recon_job(args):
+    """VTM 인코더 복원 YUV를 복원 결과로 등록
+
+    1) 크기 확인: frame_count * 프레임 크기와 같아야 함 (다르면 일반 복원으로 대체)
+    2) 표본 작업(VVC_RECON_VERIFY_RATE)은 디코더로 복원해 md5 비교,
+       다르면 디코더 출력을 결과로 사용하고 경고 반환
+    3) decoded/{tool}/qpXX/ 에 하드링크 (다른 파일시스템이면 이동)
+       이동하면 인코더 복원 영상이 사라지므로 이후 재사용 시에는 일반 복원으로 대체됨
+    """
+    video_id, qp, tool, compressed_tool_dir, decode_tool_dir = args
+    recon_path = encoder_recon_path(video_id, qp, compressed_tool_dir)
+    _, _, output_path = _build_command(*args)
+
+    width, height = cfg.RESOLUTIONS.get(video_id, (0, 0))
+    expected = cfg.FR_DICT[video_id][2] * yuv_io.frame_size(width, height)
+    if not os.path.exists(recon_path) or os.path.getsize(recon_path) != expected:
+        return await _run_decode(args, reuse_recon=False)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if _verify_sampled(video_id, qp):
+        verify_path = f"{output_path}.verify"
+        cmd, _, _ = _build_command(*args, pipe_output=verify_path)
+        result = await async_runner.run(cmd, "decode_verify", tool, qp, video_id)
+        if not result.ok:
+            return tool, qp, video_id, False, result.error()
+        # md5 계산은 이벤트 루프를 막지 않도록 스레드에서
+        verify_md5, recon_md5 = await asyncio.gather(
+            asyncio.to_thread(_md5, verify_path), asyncio.to_thread(_md5, recon_path)
+        )
+        if verify_md5 != recon_md5:
+            job_journal.publish(verify_path, output_path)
+            warning = "인코더 복원 영상과 디코더 출력 불일치: 디코더 출력 사용"
+            return tool, qp, video_id, True, warning
+        os.remove(verify_path)
+
+    tmp_path = job_journal.partial_path(output_path)
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(recon_path, tmp_path)
+    except OSError:
+        # os.replace는 파일시스템을 넘지 못하므로 복사 후 삭제하는 shutil.move 사용
+        shutil.move(recon_path, tmp_path)
+    job_journal.publish(tmp_path, output_path)
+    return tool, qp, video_id, True, None
+
+
+def stream_key(cache, task):
+    """스트리밍 복원의 입력 키 (비트스트림 + 디코더 + 명령줄, 파이프 번호는 제외)"""
+    cmd, input_file, _ = _build_command(*task, pipe_output=_PIPE_OUTPUT)
+    if cmd is None:
+        return None
+    return cache.command_key("decode_stream", cmd, [input_file])
+
+
+@contextmanager
+def decode_stream(video_id, qp, tool, compressed_tool_dir):
+    """디코더가 raw YUV 프레임을 파이프로 출력하도록 실행하고 읽기 스트림을 반환
+
+    복원 YUV를 디스크에 쓰지 않음. 디코더에는 파이프 쓰기 끝을 /dev/fd/N 경로로
+    넘기므로 ffmpeg와 VTM DecoderApp 모두 같은 방식으로 동작하고, 디코더가
+    종료되면(실패 포함) 스트림은 EOF가 됨. 종료 코드가 0이 아니면 RuntimeError.
+    """
+    read_fd, write_fd = os.pipe()
+    cmd, input_file, _ = _build_command(
+        video_id,
+        qp,
+        tool,
+        compressed_tool_dir,
+        "",
+        pipe_output=_PIPE_OUTPUT.format(fd=write_fd),
+    )
+    err = tempfile.TemporaryFile()
+    try:
+        if cmd is None:
+            raise ValueError(f"해상도 정보 없음: {video_id}")
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(f"파일 없음: {input_file}")
+        start = time.monotonic()
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.DEVNULL, stderr=err, pass_fds=(write_fd,)
+        )
+    except BaseException:
+        os.close(read_fd)
+        err.close()
+        raise
+    finally:
+        # 부모의 쓰기 끝을 닫아야 디코더 종료 시 EOF가 전달됨
+        os.close(write_fd)
+
+    with err, os.fdopen(read_fd, "rb") as stream:
+        try:
+            yield stream
+        finally:
+            stream.close()
+            usage = resources.wait_usage(proc, start)
+        msg = None
+        if proc.returncode != 0:
+            err.seek(0)
+            msg = err.read().decode(errors="replace").strip()
+        run_manifest.record(
+            "decode_stream", tool, qp, video_id, cmd, proc.returncode, usage, msg
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(msg or f"exit status {proc.returncode}")
+
+
+async def _decode_job(args):
+    """단일 파일 복원, 시작/완료/실패를 job_journal에 기록"""
+    video_id, qp, tool, _, _ = args
+    _, input_file, output_path = _build_command(*args)
+    job_journal.record("start", "decode", tool, qp, video_id)
+    result = await _run_decode(args)
+    if result[3]:
+        job_journal.record(
+            "done", "decode", tool, qp, video_id, [input_file], [output_path]
+        )
+    else:
+        job_journal.discard(job_journal.partial_path(output_path))
+        job_journal.record("failed", "decode", tool, qp, video_id, error=result[4])
+    return result
+
+
+async def _run_decode(args, reuse_recon=True):
+    """복원 실행 (async_runner로 디코더를 직접 실행)"""
+    video_id, qp, tool, compressed_tool_dir, decode_tool_dir = args
+    if reuse_recon and reuse_encoder_recon(tool):
+        return await _reuse_recon_job(args)
+
+    qp_folder = os.path.join(decode_tool_dir, f"qp{qp}")
+    os.makedirs(qp_folder, exist_ok=True)
+
+    cmd, input_file, output_path = _build_command(
+        video_id, qp, tool, compressed_tool_dir, decode_tool_dir
+    )
+    if cmd is None:
+        return tool, qp, video_id, False, f"해상도 정보 없음: {video_id}"
 
     if not os.path.exists(input_file):
         return tool, qp, video_id, False, f"파일 없음: {input_file}"
 
-    try:
-        # subprocess.run에 리스트 전달
-        subprocess.run(cmd, check=True, capture_output=True, text=True)
-        return tool, qp, video_id, True, None
-    except subprocess.CalledProcessError as e:
-        err_msg = str(e.stderr) if e.stderr else str(e)
-        return tool, qp, video_id, False, err_msg
+    result = await async_runner.run(cmd, "decode", tool, qp, video_id)
+    if not result.ok:
+        return tool, qp, video_id, False, result.error()
+    job_journal.publish(job_journal.partial_path(output_path), output_path)
+    return tool, qp, video_id, True, None
+
+
+@profiling.worker("decode")
+def _decode_single(args):
+    """_decode_job의 동기 버전 (파이프라인 워커 프로세스용)"""
+    return asyncio.run(_decode_job(args))
 
 
+async def _decode_keyed(task):
+    return task, await _decode_job(task)
+
+
+@profiling.stage("decode")
 def run_decode(max_workers=None):
+    if getattr(cfg, "EVAL_STREAM_DECODE", False):
+        # 평가 단계에서 디코더 출력을 파이프로 바로 받으므로 복원 YUV를 만들지 않음
+        print("⏭️ EVAL_STREAM_DECODE 모드: 복원은 평가(step4)에서 파이프로 수행")
+        return
+
     if max_workers is None:
         max_workers = max(1, os.cpu_count() - 1)
 
@@ -93,18 +303,62 @@ def run_decode(max_workers=None):
         ]
         tasks.extend(batch_tasks)
 
+    tracker = progress.Tracker()
+    for video_id, qp, tool, _, _ in tasks:
+        tracker.add("decode", tool, qp, video_id)
+
+    # 캐시 GC 기준 (이전 실행에서 완료되어 건너뛴 작업 포함)
+    live_outputs = {_build_command(*t)[2] for t in tasks}
+
+    # --resume: 이전 실행에서 완료된 복원은 건너뜀 (중단/실패한 작업만 다시 실행)
+    journal = job_journal.open_journal()
+    if journal is not None:
+        pending_tasks = []
+        for t in tasks:
+            if journal.completed("decode", t[2], t[1], t[0]):
+                print(f"⏭️ [{t[2]}] QP {t[1]} 이전 실행에서 완료, 복원 생략: {t[0]}")
+                tracker.done("decode", t[2], t[1], t[0], "cached")
+                continue
+            pending_tasks.append(t)
+        tasks = pending_tasks
+
+    # 입력(비트스트림, 디코더, 명령줄)이 그대로인 복원 결과는 건너뜀
+    cache = pipeline_cache.open_cache()
+    keys = {}
+    if cache is not None:
+        pending_tasks = []
+        for t in tasks:
+            output_path, key = _job_key(cache, t)
+            if key is not None:
+                if cache.lookup(output_path, key):
+                    print(f"⏭️ [{t[2]}] QP {t[1]} 캐시 유효, 복원 생략: {t[0]}")
+                    tracker.done("decode", t[2], t[1], t[0], "cached")
+                    continue
+                cache.invalidate(output_path)
+                keys[t] = (output_path, key)
+            pending_tasks.append(t)
+        tasks = pending_tasks
+
     # 결과 확인
     print(f"총 작업 개수: {len(tasks)}")
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(_decode_single, t): t for t in tasks}
-        for future in as_completed(futures):
-            tool, qp, video_id, ok, err_msg = future.result()
+    with tracker:
+        for task, result in async_runner.run_all(_decode_keyed, tasks, max_workers):
+            tool, qp, video_id, ok, err_msg = result
+            tracker.done("decode", tool, qp, video_id, "done" if ok else "failed")
             if ok:
                 print(f"✅ [{tool}] QP {qp} 복원 완료: {video_id}")
+                if err_msg:
+                    print(f"⚠️ [{tool}] QP {qp} {video_id}: {err_msg}")
+                if task in keys:
+                    output_path, key = keys[task]
+                    cache.store(output_path, key, path=output_path)
             else:
                 print(f"❌ [{tool}] QP {qp} 복원 실패 ({video_id}): {err_msg}")
 
+    if cache is not None:
+        cache.gc(decode_base_dir, live_outputs)
+
 
 if __name__ == "__main__":
     run_decode()
@@ -1,83 +1,441 @@
 import os
+import struct
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import product
+from statistics import NormalDist
+
 import numpy as np
 import config as cfg
+import encoder_log
+import frame_metrics
+import job_journal
+import nal_index
 import pandas as pd
+import pipeline_cache
+import profiling
+import progress
+import resources
+import results_db
+import run_manifest
+import shared_cache
+import step3_3_decode as decode
+import yuv_io
+from batch_ssim import structural_similarity_batch
 from skimage.metrics import peak_signal_noise_ratio as psnr_metric
-from skimage.metrics import structural_similarity as ssim_metric
 
+# 지표 계산 방식이 바뀌면 올려서 캐시된 평가 결과를 무효화
+# (2: 비트레이트를 파일 크기 대신 NAL 인덱스의 비트스트림 비트로 계산,
+#  3: 프레임별 지표 파일(frame_metrics) 저장)
+_METRICS_VERSION = 3
 
-def run_evaluate():
-    os.makedirs(cfg.OUTPUT_REPORT_DIR, exist_ok=True)
+# 표본 평가 모드 (cfg.EVAL_SAMPLE_MODE)
+_SAMPLE_MODES = ("stride", "stratified", "adaptive")
 
-    for tool in ["HEVC", "VVC"]:
-        all_results = []  # 툴별로 리스트 초기화
-        print(f"🚀 {tool} 성능 평가 시작...")
 
-        compressed_tool_dir = os.path.join(cfg.OUTPUT_COMPRESSED_DIR, tool)
-        decoded_tool_dir = os.path.join(cfg.OUTPUT_DECODED_DIR, tool)
+def _job_paths(tool, qp, file_base):
+    """(원본 YUV, 복원 YUV, 압축 파일) 경로 (파일명 규칙 주의)"""
+    original_yuv_path = os.path.join(cfg.ROI_PATH, f"{file_base}.yuv")
+    reconstructed_yuv_path = os.path.join(
+        cfg.OUTPUT_DECODED_DIR, tool, f"qp{qp}", f"{file_base}_qp{qp}.yuv"
+    )
+    if getattr(cfg, "EVAL_STREAM_DECODE", False) and decode.reuse_encoder_recon(tool):
+        # 스트리밍 모드에서는 복원 단계가 없으므로 VTM 인코더 복원 영상을 직접 평가
+        reconstructed_yuv_path = decode.encoder_recon_path(
+            file_base, qp, _compressed_tool_dir(tool)
+        )
+
+    # 비트레이트 계산을 위한 압축 파일 경로 - HEVC는 .mp4 (step3_1), VVC는 .bin (step3_2)
+    ext = ".mp4" if tool == "HEVC" else ".bin"
+    compressed_file_path = os.path.join(
+        cfg.OUTPUT_COMPRESSED_DIR, tool, f"qp{qp}", f"{file_base}_qp{qp}{ext}"
+    )
+    return original_yuv_path, reconstructed_yuv_path, compressed_file_path
 
-        for qp in cfg.QP_LIST:
-            for file_base in cfg.FR_DICT.keys():
-                width, height = cfg.RAW_RESOLUTIONS[file_base]
-                fps, frame_count = cfg.FR_DICT[file_base][1], cfg.FR_DICT[file_base][2]
 
-                # 1. 경로 설정 (파일명 규칙 주의)
-                original_yuv_path = os.path.join(cfg.ROI_PATH, f"{file_base}.yuv")
-                reconstructed_yuv_path = os.path.join(
-                    decoded_tool_dir, f"qp{qp}", f"{file_base}_qp{qp}.yuv"
-                )
+def _evaluate_name(tool, qp, file_base):
+    """평가 결과 캐시 이름"""
+    return f"evaluate/{tool}/qp{qp}/{file_base}"
 
-                # 비트레이트 계산을 위한 압축 파일(.bin) 경로 - VVC/HEVC 동일하게 처리
-                compressed_file_path = os.path.join(
-                    compressed_tool_dir, f"qp{qp}", f"{file_base}_qp{qp}.bin"
-                )
 
-                if os.path.exists(reconstructed_yuv_path) and os.path.exists(
-                    compressed_file_path
-                ):
-                    # 화질 지표 계산
-                    psnr, ssim, ssnr = calculate_metrics(
-                        original_yuv_path,
-                        reconstructed_yuv_path,
-                        width,
-                        height,
-                        frame_count,
-                    )
+def _compressed_tool_dir(tool):
+    return (
+        cfg.OUTPUT_COMPRESSED_HEVC_DIR
+        if tool == "HEVC"
+        else cfg.OUTPUT_COMPRESSED_VVC_DIR
+    )
 
-                    # 비트레이트 계산
-                    file_size = os.path.getsize(compressed_file_path)
-                    bitrate, bpp = _calculate_bit_metrics(
-                        file_size, width, height, frame_count, fps
-                    )
 
-                    if psnr is not None:
-                        all_results.append(
-                            {
-                                "file": file_base,
-                                "qp": qp,
-                                "psnr": psnr,
-                                "ssim": ssim,
-                                "ssnr": ssnr,
-                                "bitrate_kbps": bitrate,
-                                "bpp": bpp,
-                            }
+def _stream_decode(tool):
+    """디코더 출력을 파이프로 받아 평가하는지 (VVC 인코더 복원 영상 재사용 시 제외)"""
+    return getattr(cfg, "EVAL_STREAM_DECODE", False) and not (
+        decode.reuse_encoder_recon(tool)
+    )
+
+
+def _sample_settings():
+    """표본 평가 설정 (mode, stride, CI 목표 dB, 신뢰수준), 전체 프레임 평가면 None"""
+    mode = getattr(cfg, "EVAL_SAMPLE_MODE", None)
+    if not mode:
+        return None
+    if mode not in _SAMPLE_MODES:
+        raise ValueError(f"EVAL_SAMPLE_MODE는 {_SAMPLE_MODES} 중 하나: {mode}")
+    return (
+        mode,
+        max(1, int(getattr(cfg, "EVAL_SAMPLE_STRIDE", 10))),
+        float(getattr(cfg, "EVAL_SAMPLE_CI_DB", 0.1)),
+        float(getattr(cfg, "EVAL_SAMPLE_CONFIDENCE", 0.95)),
+    )
+
+
+def _evaluate_key(cache, tool, qp, file_base):
+    """평가 결과 캐시 키: 원본/복원/압축 파일 지문 + 해상도/프레임 정보
+
+    원본/복원 YUV는 크기가 커서 (size, mtime)만, 압축 파일은 내용 해시 사용.
+    스트리밍 모드에서는 복원 YUV 대신 디코더 입력 키(비트스트림 + 디코더 + 명령줄) 사용,
+    복원 YUV 보관 여부(EVAL_KEEP_DECODED)도 산출물이 달라지므로 키에 포함.
+    """
+    original_path, recon_path, compressed_path = _job_paths(tool, qp, file_base)
+    files = [cache.stat_fingerprint(original_path)]
+    stream = keep_decoded = None
+    if _stream_decode(tool):
+        stream = decode.stream_key(
+            cache, (file_base, qp, tool, _compressed_tool_dir(tool), "")
+        )
+        keep_decoded = bool(getattr(cfg, "EVAL_KEEP_DECODED", False))
+    else:
+        files.append(cache.stat_fingerprint(recon_path))
+    files.append(cache.fingerprint(compressed_path))
+    return pipeline_cache.make_key(
+        step="evaluate",
+        version=_METRICS_VERSION,
+        files=files,
+        stream=stream,
+        keep_decoded=keep_decoded,
+        sample=None if _stream_decode(tool) else _sample_settings(),
+        resolution=cfg.RAW_RESOLUTIONS[file_base],
+        frames=cfg.FR_DICT[file_base],
+    )
+
+
+@profiling.worker("evaluate")
+def _evaluate_single(args):
+    """단일 (tool, QP, 시퀀스) 평가 (멀티프로세싱 워커용), 소요 시간/CPU/메모리를 실행 기록에 남김"""
+    tool, qp, file_base, _ = args
+    job_journal.record("start", "evaluate", tool, qp, file_base)
+    with progress.live("evaluate", tool, qp, file_base), resources.measure() as usage:
+        result = _evaluate_job(args)
+    err_msg = result[4] if result[3] is None else None
+    run_manifest.record(
+        "evaluate", tool, qp, file_base, None, int(err_msg is not None), usage, err_msg
+    )
+    if err_msg is None:
+        # 평가 값은 결과 저장소에 있으므로 입력 파일과 프레임 지표 파일만 기록
+        inputs = _job_paths(tool, qp, file_base)
+        if _stream_decode(tool):
+            inputs = (inputs[0], inputs[2])
+        vectors_path = frame_metrics.vectors_path(tool, qp, file_base)
+        outputs = [vectors_path] if os.path.exists(vectors_path) else []
+        job_journal.record("done", "evaluate", tool, qp, file_base, inputs, outputs)
+    else:
+        job_journal.record("failed", "evaluate", tool, qp, file_base, error=err_msg)
+    return result
+
+
+def resumed(journal, store, tool, qp, file_base):
+    """--resume: 이전 실행에서 평가가 끝났고 결과 저장소에 값이 남아 있는지"""
+    return (
+        journal.completed("evaluate", tool, qp, file_base)
+        and not store.query("evaluation", tool=tool, qp=qp, file=file_base).empty
+    )
+
+
+def _evaluate_job(args):
+    tool, qp, file_base, original_desc = args
+
+    width, height = cfg.RAW_RESOLUTIONS[file_base]
+    fps, frame_count = cfg.FR_DICT[file_base][1], cfg.FR_DICT[file_base][2]
+
+    # 1. 경로 설정
+    original_yuv_path, reconstructed_yuv_path, compressed_file_path = _job_paths(
+        tool, qp, file_base
+    )
+
+    # 스트리밍 모드: 복원 YUV 파일 없이 디코더 출력(파이프)을 바로 평가
+    stream_decode = _stream_decode(tool)
+    if not os.path.exists(compressed_file_path) or (
+        not stream_decode and not os.path.exists(reconstructed_yuv_path)
+    ):
+        return tool, qp, file_base, None, "파일 없음"
+
+    vectors_path = frame_metrics.vectors_path(tool, qp, file_base)
+    sampled = None
+    try:
+        # 화질 지표 계산 (공유 캐시에 원본이 있으면 파일 대신 사용)
+        original_y = (
+            shared_cache.attach(original_desc) if original_desc is not None else None
+        )
+        if stream_decode:
+            keep_path = (
+                reconstructed_yuv_path
+                if getattr(cfg, "EVAL_KEEP_DECODED", False)
+                else None
+            )
+            psnr, ssim, ssnr = calculate_metrics_stream(
+                (file_base, qp, tool, _compressed_tool_dir(tool)),
+                original_yuv_path,
+                width,
+                height,
+                frame_count,
+                original_y=original_y,
+                keep_path=keep_path,
+                vectors_path=vectors_path,
+            )
+        elif _sample_settings() is not None:
+            mode, stride, ci_db, confidence = _sample_settings()
+            sampled = calculate_metrics_sampled(
+                original_yuv_path,
+                reconstructed_yuv_path,
+                width,
+                height,
+                frame_count,
+                mode,
+                stride,
+                ci_db=ci_db,
+                confidence=confidence,
+                seed=zlib.crc32(file_base.encode("utf-8")),
+                original_y=original_y,
+                vectors_path=vectors_path,
+            )
+            psnr, ssim, ssnr = sampled["psnr"], sampled["ssim"], sampled["ssnr"]
+        else:
+            psnr, ssim, ssnr = calculate_metrics(
+                original_yuv_path,
+                reconstructed_yuv_path,
+                width,
+                height,
+                frame_count,
+                original_y=original_y,
+                vectors_path=vectors_path,
+            )
+    except (OSError, ValueError, RuntimeError) as e:
+        return tool, qp, file_base, None, str(e)
+    if psnr is None:
+        return tool, qp, file_base, None, "에러 발생"
+
+    # 비트레이트 계산 (컨테이너 오버헤드를 제외한 비트스트림 크기)
+    stream_size = _bitstream_bytes(compressed_file_path)
+    bitrate, bpp = _calculate_bit_metrics(stream_size, width, height, frame_count, fps)
+
+    result = {
+        "file": file_base,
+        "qp": qp,
+        "psnr": psnr,
+        "ssim": ssim,
+        "ssnr": ssnr,
+        "bitrate_kbps": bitrate,
+        "bpp": bpp,
+    }
+    if sampled is not None:
+        # 표본 평가: 지표별 신뢰구간과 평가한 프레임 수
+        result.update({k: v for k, v in sampled.items() if k not in result})
+    return tool, qp, file_base, result, None
+
+
+def fast_result(tool, qp, file_base):
+    """인코더 로그(frames.csv)만으로 PSNR/비트레이트 계산 (YUV를 읽지 않음, 로그가 없으면 None)
+
+    SSIM/SSNR은 픽셀 평가에서만 구할 수 있으므로 NaN.
+    """
+    compressed_file_path = _job_paths(tool, qp, file_base)[2]
+    frames = encoder_log.load_frames(encoder_log.frames_path(compressed_file_path))
+    if frames is None or frames.empty:
+        return None
+
+    width, height = cfg.RAW_RESOLUTIONS[file_base]
+    fps = cfg.FR_DICT[file_base][1]
+    psnr, bitrate, bpp = encoder_log.summarize(frames, width, height, fps)
+    return {
+        "file": file_base,
+        "qp": qp,
+        "psnr": psnr,
+        "ssim": np.nan,
+        "ssnr": np.nan,
+        "bitrate_kbps": bitrate,
+        "bpp": bpp,
+    }
+
+
+@profiling.stage("evaluate")
+def run_evaluate(max_workers=None, fast=None):
+    """tool x QP x 시퀀스 화질/비트레이트 평가 후 evaluation_{tool}.csv 저장
+
+    fast=True (기본값 cfg.EVAL_FAST): 인코더 로그가 있는 작업은 YUV를 읽지 않고
+    로그의 PSNR/비트로 평가 (SSIM/SSNR 제외), 로그가 없는 작업만 픽셀 평가.
+    """
+    if max_workers is None:
+        max_workers = getattr(cfg, "EVAL_WORKERS", None) or max(1, os.cpu_count() - 1)
+    if fast is None:
+        fast = getattr(cfg, "EVAL_FAST", False)
+
+    os.makedirs(cfg.OUTPUT_REPORT_DIR, exist_ok=True)
+
+    tools = ["HEVC", "VVC"]
+    # 작업 순서 = CSV 저장 순서 (tool -> QP -> 시퀀스)
+    tasks = list(product(tools, cfg.QP_LIST, cfg.FR_DICT.keys()))
+    if fast:
+        mode = "빠른 평가: 인코더 로그 PSNR/비트"
+    elif _sample_settings() is not None:
+        mode = "표본 평가: {}, 간격 {}, PSNR CI ±{} dB".format(*_sample_settings()[:3])
+    else:
+        mode = "픽셀 평가"
+    print(
+        f"🚀 성능 평가 시작 ({mode}, 워커: {max_workers}, 총 작업 개수: {len(tasks)})"
+    )
+
+    # 원본은 시퀀스별로 공유 캐시에 한 번만 적재하고 모든 tool/QP 작업이 공유
+    # (시퀀스 -> tool -> QP 순으로 제출하여 캐시에 필요한 시퀀스만 유지)
+    submit_order = [
+        (tool, qp, file_base)
+        for file_base, tool, qp in product(cfg.FR_DICT, tools, cfg.QP_LIST)
+    ]
+    budget_bytes = getattr(cfg, "ORIGINAL_CACHE_MB", 4096) * 1024**2
+    max_pending = max_workers * 2
+
+    # 입력 파일이 그대로인 (tool, QP, 시퀀스)는 이전 평가 결과를 재사용
+    cache = pipeline_cache.open_cache()
+    keys = {}
+    journal = job_journal.open_journal()
+
+    store = results_db.open_store()
+    tracker = progress.Tracker()
+    for tool, qp, file_base in submit_order:
+        tracker.add("evaluate", tool, qp, file_base)
+    with tracker, shared_cache.SharedOriginalCache(
+        budget_bytes
+    ) as original_cache, ProcessPoolExecutor(max_workers=max_workers) as executor:
+        task_iter = iter(submit_order)
+        pending = {}
+        while True:
+            for t in task_iter:
+                tool, qp, file_base = t
+                if journal is not None and resumed(journal, store, *t):
+                    tracker.done("evaluate", *t, "cached")
+                    print(f"⏭️ [{tool}] {file_base} (QP{qp}): 이전 실행에서 평가 완료")
+                    continue
+                if cache is not None:
+                    keys[t] = (_evaluate_name(*t), _evaluate_key(cache, *t))
+                    entry = cache.lookup(*keys[t])
+                    if entry is not None:
+                        store_result(store, tool, entry["value"])
+                        tracker.done("evaluate", *t, "cached")
+                        print(
+                            f"⏭️ [{tool}] {file_base} (QP{qp}): 캐시된 평가 결과 사용"
                         )
+                        continue
+                if fast:
+                    result = fast_result(*t)
+                    if result is not None:
+                        # 로그 기반 결과는 캐시에 저장하지 않음 (픽셀 평가 결과를 가리지 않도록)
+                        store_result(store, tool, result)
+                        tracker.done("evaluate", *t, "cached")
                         print(
-                            f"✅ {file_base} (QP{qp}): PSNR {psnr:.2f}, SSNR {ssnr:.2f}, Bitrate {bitrate:.2f}"
+                            f"⚡ [{tool}] {file_base} (QP{qp}): PSNR {result['psnr']:.2f}, "
+                            f"Bitrate {result['bitrate_kbps']:.2f} (인코더 로그)"
                         )
-                    else:
-                        print(f"⚠️ 에러 발생: {file_base} QP {qp}")
+                        continue
+                original_desc = original_cache.acquire(
+                    file_base,
+                    os.path.join(cfg.ROI_PATH, f"{file_base}.yuv"),
+                    *cfg.RAW_RESOLUTIONS[file_base],
+                    cfg.FR_DICT[file_base][2],
+                )
+                pending[executor.submit(_evaluate_single, (*t, original_desc))] = t
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                t = pending.pop(future)
+                original_cache.release(t[2])
+                tool, qp, file_base, result, err_msg = future.result()
+                tracker.done("evaluate", *t, "failed" if result is None else "done")
+                if result is not None:
+                    store_result(store, tool, result)
+                    if cache is not None:
+                        # 프레임 지표 파일이 지워지면 다시 평가하도록 경로도 기록
+                        cache.store(
+                            *keys[t],
+                            path=frame_metrics.vectors_path(*t),
+                            value=result,
+                        )
+                    print(
+                        f"✅ [{tool}] {file_base} (QP{qp}): PSNR {result['psnr']:.2f}, "
+                        f"SSNR {result['ssnr']:.2f}, Bitrate {result['bitrate_kbps']:.2f}"
+                        + _sample_note(result)
+                    )
                 else:
-                    print(f"⚠️ 파일 없음: {file_base} QP {qp}")
+                    discard_result(store, tool, qp, file_base)
+                    print(f"❌ [{tool}] {file_base} QP {qp} 평가 실패: {err_msg}")
 
-        # CSV 저장 (vcm/results/report/)
-        if all_results:
-            df = pd.DataFrame(all_results)
-            csv_path = os.path.join(cfg.OUTPUT_REPORT_DIR, f"evaluation_{tool}.csv")
-            df.to_csv(csv_path, index=False)
-            print(f"💾 {tool} 결과 저장 완료: {csv_path}")
-        else:
+    if cache is not None:
+        cache.gc("evaluate/", {name for name, _ in keys.values()})
+
+    save_evaluation_csv(tasks, store)
+
+
+def _sample_note(result):
+    if "sampled_frames" not in result:
+        return ""
+    return (
+        f" (표본 {result['sampled_frames']}프레임, PSNR "
+        f"[{result['psnr_ci_low']:.2f}, {result['psnr_ci_high']:.2f}])"
+    )
+
+
+def store_result(store, tool, result):
+    """평가 결과 1건을 결과 저장소(results.sqlite)에 바로 기록 (중단되어도 보존)"""
+    store.put("evaluation", [{"tool": tool, **result}])
+
+
+def discard_result(store, tool, qp, file_base):
+    """평가 실패 시 이전 실행에서 기록된 결과와 프레임 지표 삭제 (오래된 값이 남지 않도록)"""
+    store.delete("evaluation", tool=tool, qp=qp, file=file_base)
+    vectors_path = frame_metrics.vectors_path(tool, qp, file_base)
+    if os.path.exists(vectors_path):
+        os.remove(vectors_path)
+
+
+def save_evaluation_csv(tasks, store=None):
+    """결과 저장소의 (tool, qp, file_base) 평가 결과를 tasks 순서대로 evaluation_{tool}.csv 로 내보냄"""
+    store = store or results_db.open_store()
+    os.makedirs(cfg.OUTPUT_REPORT_DIR, exist_ok=True)
+    for tool in dict.fromkeys(t[0] for t in tasks):
+        order = pd.DataFrame(
+            [
+                (qp, file_base)
+                for task_tool, qp, file_base in tasks
+                if task_tool == tool
+            ],
+            columns=["qp", "file"],
+        )
+        df = store.query(
+            "evaluation",
+            tool=tool,
+            qp=sorted(set(order["qp"].tolist())),
+            file=sorted(set(order["file"].tolist())),
+        )
+        if df.empty:
             print(f"⚠️ {tool} 결과 없음: 저장 생략")
+            continue
+        df = results_db.evaluation_csv_frame(order.merge(df, on=["qp", "file"]))
+
+        # CSV 저장 (vcm/results/report/)
+        csv_path = os.path.join(cfg.OUTPUT_REPORT_DIR, f"evaluation_{tool}.csv")
+        df.to_csv(csv_path, index=False)
+        print(f"💾 {tool} 결과 저장 완료: {csv_path}")
 
 
 """
@@ -121,51 +479,222 @@ def calculate_metrics(original_yuv_path, reconstructed_yuv_path, width, height,
 """
 
 
-def calculate_metrics(original_path, reconstructed_path, width, height, frame_count):
-    y_size = width * height
-    uv_size = (width // 2) * (height // 2)
-    frame_size_bytes = y_size + 2 * uv_size
+def calculate_metrics(
+    original_path,
+    reconstructed_path,
+    width,
+    height,
+    frame_count,
+    chunk_frames=None,
+    original_y=None,
+    vectors_path=None,
+):
+    """스트리밍 방식 화질 평가: chunk_frames 단위로 읽어 프레임별 지표를 모아 평균
+
+    최대 메모리는 시퀀스 길이가 아니라 chunk_frames * H * W 에 비례함.
+    original_y: 이미 적재된 원본 Y 평면 (N, H, W) (예: 공유 캐시), 주어지면
+    original_path 대신 사용.
+    vectors_path: 주어지면 프레임별 PSNR/SSIM/SSNR을 저장 (frame_metrics)
+    """
+    if chunk_frames is None:
+        chunk_frames = getattr(cfg, "EVAL_CHUNK_FRAMES", 32)
+
+    # memmap 기반 (N, frame_size) 배열 - 파일 전체를 메모리에 올리지 않음
+    if original_y is None:
+        original_y = yuv_io.read_y_frames(original_path, width, height, frame_count)
+    recon_chunks = (
+        chunk
+        for _, chunk in yuv_io.iter_y_chunks(
+            reconstructed_path, width, height, frame_count, chunk_frames
+        )
+    )
+    return _accumulate_metrics(original_y, recon_chunks, vectors_path)
+
+
+def calculate_metrics_stream(
+    decode_job,
+    original_path,
+    width,
+    height,
+    frame_count,
+    chunk_frames=None,
+    original_y=None,
+    keep_path=None,
+    vectors_path=None,
+):
+    """디코더 출력(파이프)을 청크 단위로 받아 바로 평가 (복원 YUV를 디스크에 쓰지 않음)
+
+    decode_job: (video_id, qp, tool, compressed_tool_dir)
+    keep_path: 주어지면 받은 프레임을 그 경로에 복원 YUV로 함께 저장
+    vectors_path: 주어지면 프레임별 지표를 저장 (frame_metrics)
+    """
+    if chunk_frames is None:
+        chunk_frames = getattr(cfg, "EVAL_CHUNK_FRAMES", 32)
+    if original_y is None:
+        original_y = yuv_io.read_y_frames(original_path, width, height, frame_count)
+
+    tee = None
+    if keep_path is not None:
+        os.makedirs(os.path.dirname(keep_path), exist_ok=True)
+        tee = open(f"{keep_path}.tmp", "wb")
+    try:
+        with decode.decode_stream(*decode_job) as stream:
+            recon_chunks = yuv_io.iter_y_chunks_from_stream(
+                stream, width, height, chunk_frames, tee=tee
+            )
+            metrics = _accumulate_metrics(original_y, recon_chunks, vectors_path)
+    finally:
+        if tee is not None:
+            tee.close()
+    if keep_path is not None:
+        os.replace(f"{keep_path}.tmp", keep_path)
+    return metrics
+
+
+def sample_frames(n_frames, mode, stride, seed=0):
+    """표본 프레임 번호 (오름차순)
+
+    stride: 0, k, 2k, ... / stratified, adaptive: k 프레임 구간마다 임의의 1프레임.
+    seed가 같으면 같은 프레임을 고르므로 시퀀스 기준 seed를 쓰면 tool/QP 간 비교가 공정함.
+    """
+    if mode == "stride":
+        return np.arange(0, n_frames, stride)
+    rng = np.random.default_rng(seed)
+    starts = np.arange(0, n_frames, stride)
+    sizes = np.minimum(stride, n_frames - starts)
+    return starts + rng.integers(0, sizes)
+
 
+def confidence_interval(values, n_population, confidence=0.95):
+    """프레임별 값 표본의 평균 신뢰구간 (정규 근사 + 유한 모집단 보정)
+
+    전체 프레임을 다 평가했으면 구간 폭은 0.
+    """
+    n = len(values)
+    mean = float(np.mean(values))
+    if n < 2:
+        return mean, -np.inf, np.inf
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    fpc = np.sqrt(max(0.0, (n_population - n) / (n_population - 1)))
+    half = z * np.std(values, ddof=1) / np.sqrt(n) * fpc
+    return mean, mean - half, mean + half
+
+
+def calculate_metrics_sampled(
+    original_path,
+    reconstructed_path,
+    width,
+    height,
+    frame_count,
+    mode,
+    stride,
+    ci_db=0.1,
+    confidence=0.95,
+    seed=0,
+    chunk_frames=None,
+    original_y=None,
+    vectors_path=None,
+):
+    """일부 프레임만 평가해 지표 평균과 신뢰구간을 계산 (memmap에서 표본 프레임만 읽음)
+
+    mode: "stride" (k 프레임마다), "stratified" (k 프레임 구간마다 임의 1프레임),
+    "adaptive" (stratified에서 시작해 PSNR 신뢰구간 반폭이 ci_db 이하가 될 때까지
+    남은 프레임에서 임의로 표본을 두 배씩 추가).
+    vectors_path가 주어지면 평가한 프레임 번호와 지표를 저장 (frame_metrics).
+    반환: {psnr, ssim, ssnr, {지표}_ci_low, {지표}_ci_high, sampled_frames}
     """
-    # 1. 파일 전체를 메모리에 로드 (Y 채널만 3D 배열로 변환)
-    def get_y_frames(path):
-        raw_data = np.fromfile(path, dtype=np.uint8)
-        # 각 프레임의 시작 위치 인덱스 계산
-        starts = np.arange(frame_count) * frame_size_bytes
-        # 모든 프레임의 Y 영역만 추출하여 (N, H, W) 형태로 reshape
-        y_frames = np.array([raw_data[s : s + y_size].reshape(height, width) for s in starts])
-        return y_frames.astype(np.float64)
+    if chunk_frames is None:
+        chunk_frames = getattr(cfg, "EVAL_CHUNK_FRAMES", 32)
+    if original_y is None:
+        original_y = yuv_io.read_y_frames(original_path, width, height, frame_count)
+    recon_y = yuv_io.read_y_frames(reconstructed_path, width, height, frame_count)
+    n_total = min(len(original_y), len(recon_y))
+    if n_total == 0:
+        return {"psnr": None, "ssim": None, "ssnr": None}
+
+    rng = np.random.default_rng(seed)
+    index = sample_frames(n_total, mode, stride, seed)
+    values = [np.empty(0) for _ in range(3)]
+    frames = np.empty(0, dtype=np.int64)
+    evaluated = np.zeros(n_total, dtype=bool)
+    while True:
+        for start in range(0, len(index), chunk_frames):
+            idx = index[start : start + chunk_frames]
+            chunk = _chunk_metrics(original_y[idx], recon_y[idx])
+            values = [np.concatenate([v, c]) for v, c in zip(values, chunk)]
+        frames = np.concatenate([frames, index])
+        evaluated[index] = True
+
+        psnr_ci = confidence_interval(values[0], n_total, confidence)
+        remaining = np.flatnonzero(~evaluated)
+        if mode != "adaptive" or len(remaining) == 0:
+            break
+        if (psnr_ci[2] - psnr_ci[1]) / 2 <= ci_db:
+            break
+        n_add = min(len(remaining), evaluated.sum())
+        index = np.sort(rng.choice(remaining, n_add, replace=False))
+
+    if vectors_path is not None:
+        order = np.argsort(frames)
+        frame_metrics.save_vectors(
+            vectors_path,
+            frames[order],
+            *(v[order] for v in values),
+            total_frames=n_total,
+        )
+
+    result = {"sampled_frames": int(evaluated.sum())}
+    for name, v in zip(("psnr", "ssim", "ssnr"), values):
+        result[name], low, high = confidence_interval(v, n_total, confidence)
+        result[f"{name}_ci_low"] = low
+        result[f"{name}_ci_high"] = high
+    return result
+
+
+def _accumulate_metrics(original_y, recon_chunks, vectors_path=None):
+    """원본 (N, H, W)과 복원 청크 순회를 앞에서부터 맞춰 프레임별 지표 평균 계산
+
+    복원 청크는 끝까지 소비함 (원본보다 긴 부분은 무시, 파이프 디코더가 막히지 않도록).
+    vectors_path가 주어지면 프레임별 지표를 그 경로에 저장 (frame_metrics).
     """
+    n_total = len(original_y)
+    values = [[], [], []]
+    start = 0
+    for recon_y in recon_chunks:
+        stop = min(start + len(recon_y), n_total)
+        if stop <= start:
+            continue
+        orig_y = original_y[start:stop]
+
+        for acc, chunk in zip(values, _chunk_metrics(orig_y, recon_y[: stop - start])):
+            acc.append(chunk)
+        start = stop
+
+    if start == 0:
+        return None, None, None
+    psnr_values, ssim_values, ssnr_values = (np.concatenate(v) for v in values)
+    if vectors_path is not None:
+        frame_metrics.save_vectors(
+            vectors_path, np.arange(start), psnr_values, ssim_values, ssnr_values
+        )
+    return psnr_values.mean(), ssim_values.mean(), ssnr_values.mean()
 
-    orig_video = _get_y_frames(
-        frame_count, y_size, frame_size_bytes, width, height, original_path
-    )  # Shape: (Frame, Height, Width)
-    recon_video = _get_y_frames(
-        frame_count, y_size, frame_size_bytes, width, height, reconstructed_path
-    )  # Shape: (Frame, Height, Width)
-
-    # 2. PSNR 벡터화 계산
-    # MSE를 (N, H, W)에서 H, W 축에 대해 평균내어 프레임별 MSE 산출
-    mse_per_frame = np.mean((orig_video - recon_video) ** 2, axis=(1, 2))
-
-    # 요걸 추가해야 에러가 안 날 거예요!
-    ssim_values = [
-        ssim_metric(orig_video[i], recon_video[i], data_range=255)
-        for i in range(frame_count)
-    ]
+
+def _chunk_metrics(orig_y, recon_y):
+    """(n, H, W) uint8 청크의 프레임별 PSNR, SSIM, SSNR 배열 반환"""
+    # PSNR/SSNR: 정수 연산 커널 한 번으로 프레임 SSE와 블록별 전력을 함께 계산
+    sse, signal_power, noise_power = frame_error_kernel(orig_y, recon_y)
+    mse_per_frame = sse / (orig_y.shape[1] * orig_y.shape[2])
 
     # MSE가 0인 경우(완전 일치) inf 방지를 위해 아주 작은 값 더하거나 처리
     psnr_values = 10 * np.log10(
         255**2 / np.where(mse_per_frame == 0, 1e-10, mse_per_frame)
     )
 
-    # 3. SSNR 벡터화 (기존에 만든 함수를 3D 입력을 받게 조금만 수정)
-    # 아래 2번 항목에서 설명하는 '배치 처리' 방식으로 SSNR을 호출하면 빠릅니다.
-    ssnr_values = [
-        calculate_ssnr(orig_video[i], recon_video[i]) for i in range(frame_count)
-    ]
-
-    return np.mean(psnr_values), np.mean(ssim_values), np.mean(ssnr_values)
+    # SSIM: 청크 전체를 한 번에 처리하는 배치 구현 (skimage와 동일한 정의)
+    ssim_values = structural_similarity_batch(orig_y, recon_y, data_range=255)
+    ssnr_values = _ssnr_from_block_power(signal_power, noise_power)
+    return psnr_values, ssim_values, ssnr_values
 
 
 '''
@@ -204,75 +733,73 @@ def calculate_ssnr(orig_y, recon_y, block_size=16):
 
 def calculate_ssnr(orig_y, recon_y, block_size=16):
     """
-    벡터화된 SSNR 계산: 2중 루프를 제거하고 NumPy 연산으로 대체
+    단일 프레임 SSNR 계산 (frame_error_kernel 기반, float64 임시 배열 없음)
     """
-    h, w = orig_y.shape
-    # 블록 크기에 맞게 크기 조정 (나머지 부분 버림)
-    h_new, w_new = (h // block_size) * block_size, (w // block_size) * block_size
-
-    orig = orig_y[:h_new, :w_new].astype(np.float64)
-    recon = recon_y[:h_new, :w_new].astype(np.float64)
-
-    # 4D 배열로 재구성: (blocks_h, block_size, blocks_w, block_size)
-    # 그 후 축을 변경하여 (blocks_h, blocks_w, block_size, block_size)로 만듦
-    shape = (h_new // block_size, block_size, w_new // block_size, block_size)
-    strides = orig.strides
-    new_strides = (
-        strides[0] * block_size,
-        strides[0],
-        strides[1] * block_size,
-        strides[1],
+    _, signal_power, noise_power = frame_error_kernel(
+        orig_y[np.newaxis], recon_y[np.newaxis], block_size
     )
+    return _ssnr_from_block_power(signal_power, noise_power)[0]
 
-    orig_blocks = np.lib.stride_tricks.as_strided(
-        orig, shape=shape, strides=new_strides
-    )
-    recon_blocks = np.lib.stride_tricks.as_strided(
-        recon, shape=shape, strides=new_strides
-    )
 
-    # 신호 전력 및 노이즈 전력 계산 (블록별 sum)
-    # axis (1, 3)은 각 블록의 height, width 방향임
-    signal_power = np.sum(orig_blocks**2, axis=(1, 3))
-    noise_power = np.sum((orig_blocks - recon_blocks) ** 2, axis=(1, 3))
+def frame_error_kernel(orig_y, recon_y, block_size=16):
+    """
+    uint8 (n, H, W) 평면에서 정수 연산만으로 오차 통계를 한 번에 계산
 
-    # 0으로 나누기 방지 및 SNR 계산
-    # noise_power가 0인 곳은 100.0 (또는 매우 큰 값) 부여
-    with np.errstate(divide="ignore", invalid="ignore"):
-        snr = 10 * np.log10(signal_power / noise_power)
-        snr[noise_power == 0] = 100.0  # 완전 일치하는 경우
-        snr[np.isnan(snr)] = 0.0  # signal_power도 0인 경우 등 예외 처리
+    반환: (프레임별 SSE, 블록별 신호 전력, 블록별 노이즈 전력)
+      - SSE: (n,) int64, 프레임 전체 제곱 오차 합 (MSE = SSE / (H * W))
+      - 신호/노이즈 전력: (n, H // block_size, W // block_size) int64
+        (블록 크기에 맞지 않는 가장자리는 SSNR에서 제외 - 기존 방식과 동일)
 
-    return np.mean(snr)
+    모든 합계가 정수로 정확히 계산되므로 기존 float64 구현과의 차이는
+    최종 log10/평균 단계의 부동소수 반올림(PSNR/SSNR 1e-9 dB 이내)뿐임.
+    """
+    n, h, w = orig_y.shape
+    bh, bw = h // block_size, w // block_size
+    h_new, w_new = bh * block_size, bw * block_size
 
+    # 오차는 int16(-255~255), 제곱은 int32(최대 65025)로 충분
+    diff = orig_y.astype(np.int16) - recon_y
+    sq_err = np.square(diff, dtype=np.int32)
 
-# 1. 파일 전체를 메모리에 로드 (Y 채널만 3D 배열로 변환)
-def _get_y_frames(frame_count, y_size, frame_size_bytes, width, height, path):
-    raw_data = np.fromfile(path, dtype=np.uint8)
-    # 각 프레임의 시작 위치 인덱스 계산
-    starts = np.arange(frame_count) * frame_size_bytes
-    # 모든 프레임의 Y 영역만 추출하여 (N, H, W) 형태로 reshape
-    y_frames = np.array(
-        [raw_data[s : s + y_size].reshape(height, width) for s in starts]
-    )
-    return y_frames.astype(np.float64)
+    def _block_sum(plane):
+        blocks = plane[:, :h_new, :w_new].reshape(n, bh, block_size, bw, block_size)
+        return blocks.sum(axis=(2, 4), dtype=np.int64)
 
+    noise_power = _block_sum(sq_err)
+    if h_new == h and w_new == w:
+        # 블록이 프레임을 빈틈없이 덮으면 블록 합으로 SSE를 바로 구함
+        sse = noise_power.sum(axis=(1, 2))
+    else:
+        sse = sq_err.sum(axis=(1, 2), dtype=np.int64)
 
-def _read_yuv_frame(file, width, height):
-    y_size = width * height
-    uv_width, uv_height = width // 2, height // 2
-    uv_size = uv_width * uv_height
+    signal_power = _block_sum(np.square(orig_y, dtype=np.int32))
+    return sse, signal_power, noise_power
 
-    y_data = file.read(y_size)
-    u_data = file.read(uv_size)
-    v_data = file.read(uv_size)
 
-    if not y_data or not u_data or not v_data:
-        return None, None, None
+def _ssnr_from_block_power(signal_power, noise_power):
+    """블록별 신호/노이즈 전력 (n, bh, bw) -> 프레임별 SSNR (n,)"""
+    # 0으로 나누기 방지 및 SNR 계산
+    # noise_power가 0인 곳은 100.0 (또는 매우 큰 값) 부여
+    with np.errstate(divide="ignore", invalid="ignore"):
+        snr = 10 * np.log10(signal_power / noise_power)
+        snr[noise_power == 0] = 100.0  # 완전 일치하는 경우
+        snr[np.isnan(snr)] = 0.0  # signal_power도 0인 경우 등 예외 처리
 
-    y = np.frombuffer(y_data, dtype=np.uint8).reshape((height, width))
-    # Y 채널만 PSNR/SSIM 측정에 주로 사용되므로 U, V는 필요 시에만 리턴
-    return y
+    return np.mean(snr, axis=(1, 2))
+
+
+def _bitstream_bytes(compressed_file_path):
+    """NAL 인덱스(비트스트림 옆 캐시) 기준 NAL 바이트 합계, 파싱 실패 시 파일 크기"""
+    try:
+        index = nal_index.load_index(compressed_file_path)
+    except (OSError, ValueError, struct.error) as e:
+        index, err_msg = None, str(e)
+    else:
+        err_msg = "픽처 없음"
+    if index is None or len(index["bits"]) == 0:
+        print(f"⚠️ NAL 인덱싱 실패, 파일 크기 사용 ({compressed_file_path}): {err_msg}")
+        return os.path.getsize(compressed_file_path)
+    return int(index["bits"].sum()) // 8
 
 
 def _calculate_bit_metrics(file_size_bytes, width, height, frame_count, fps=30):
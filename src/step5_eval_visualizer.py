@@ -1,22 +1,24 @@
 import os
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 import config as cfg
+import profiling
+import results_db
 
 
+@profiling.stage("visualize")
 def run_visualize():
-    # 1. 데이터 불러오기 (vcm/results/report/)
-    hevc_path = os.path.join(cfg.OUTPUT_REPORT_DIR, "evaluation_HEVC.csv")
-    vvc_path = os.path.join(cfg.OUTPUT_REPORT_DIR, "evaluation_VVC.csv")
-
-    if not os.path.exists(hevc_path) or not os.path.exists(vvc_path):
-        print("❌ CSV 파일이 없습니다. 평가를 먼저 진행해주세요.")
+    # 1. 데이터 불러오기 (results.sqlite에서 현재 설정의 QP/시퀀스, 필요한 컬럼만 조회)
+    store = results_db.open_store()
+    columns = ["qp", "psnr", "ssim", "ssnr", "bitrate_kbps"]
+    filters = {"qp": list(cfg.QP_LIST), "file": list(cfg.FR_DICT)}
+    df_hevc = store.query("evaluation", columns=columns, tool="HEVC", **filters)
+    df_vvc = store.query("evaluation", columns=columns, tool="VVC", **filters)
+
+    if df_hevc.empty or df_vvc.empty:
+        print("❌ 평가 결과가 없습니다. 평가를 먼저 진행해주세요.")
         return
 
-    df_hevc = pd.read_csv(hevc_path)
-    df_vvc = pd.read_csv(vvc_path)
-
     # [수정 포인트] inf 값을 처리합니다.
     # 1. inf를 NaN으로 바꾼 뒤
     df_hevc.replace([np.inf, -np.inf], np.nan, inplace=True)
@@ -0,0 +1,95 @@
+import os
+import numpy as np
+
+# format_factor(config.FORMATS 값) -> 크로마 서브샘플링 (가로, 세로)
+_CHROMA_SUBSAMPLING = {1.5: (2, 2), 2.0: (2, 1), 3.0: (1, 1)}
+
+
+def plane_shapes(width, height, format_factor=1.5):
+    """Y, U, V 평면의 (height, width) 반환"""
+    if format_factor not in _CHROMA_SUBSAMPLING:
+        raise ValueError(f"지원하지 않는 format_factor: {format_factor}")
+    sx, sy = _CHROMA_SUBSAMPLING[format_factor]
+    uv_shape = (height // sy, width // sx)
+    return (height, width), uv_shape, uv_shape
+
+
+def frame_size(width, height, format_factor=1.5):
+    """프레임당 바이트 수 (Y + U + V)"""
+    y_shape, u_shape, v_shape = plane_shapes(width, height, format_factor)
+    return sum(s[0] * s[1] for s in (y_shape, u_shape, v_shape))
+
+
+def open_yuv(path, width, height, frame_count=None, format_factor=1.5):
+    """YUV 파일을 memmap으로 열어 (N, frame_size) uint8 배열 반환 (복사 없음)
+
+    파일 끝의 불완전한 프레임은 무시하고, frame_count가 주어지면 그 이하로 자름.
+    """
+    fsize = frame_size(width, height, format_factor)
+    n_frames = os.path.getsize(path) // fsize
+    if frame_count is not None:
+        n_frames = min(n_frames, int(frame_count))
+    if n_frames <= 0:
+        return np.empty((0, fsize), dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r", shape=(n_frames, fsize))
+
+
+def y_frames(frames, width, height, start=0, stop=None, format_factor=1.5):
+    """open_yuv 결과에서 [start, stop) 구간 Y 평면 뷰 반환: (N, H, W)"""
+    y_shape, _, _ = plane_shapes(width, height, format_factor)
+    y_size = y_shape[0] * y_shape[1]
+    return frames[start:stop, :y_size].reshape(-1, *y_shape)
+
+
+def uv_frames(frames, width, height, start=0, stop=None, format_factor=1.5):
+    """open_yuv 결과에서 [start, stop) 구간 U, V 평면 뷰 반환: ((N, h, w), (N, h, w))"""
+    y_shape, u_shape, v_shape = plane_shapes(width, height, format_factor)
+    y_size = y_shape[0] * y_shape[1]
+    u_size = u_shape[0] * u_shape[1]
+    v_size = v_shape[0] * v_shape[1]
+    sel = frames[start:stop]
+    u = sel[:, y_size : y_size + u_size].reshape(-1, *u_shape)
+    v = sel[:, y_size + u_size : y_size + u_size + v_size].reshape(-1, *v_shape)
+    return u, v
+
+
+def read_y_frames(path, width, height, frame_count=None, start=0, stop=None):
+    """파일 경로에서 바로 Y 평면 뷰 반환 (memmap 기반, 복사 없음)"""
+    frames = open_yuv(path, width, height, frame_count)
+    return y_frames(frames, width, height, start, stop)
+
+
+def iter_y_chunks(path, width, height, frame_count=None, chunk_frames=32):
+    """Y 평면을 chunk_frames 단위로 (start, (n, H, W) 뷰) 순회"""
+    frames = open_yuv(path, width, height, frame_count)
+    for start in range(0, len(frames), chunk_frames):
+        yield start, y_frames(frames, width, height, start, start + chunk_frames)
+
+
+def iter_y_chunks_from_stream(
+    stream, width, height, chunk_frames=32, format_factor=1.5, tee=None
+):
+    """파이프 등 순차 스트림에서 프레임을 chunk_frames 단위로 읽어 (n, H, W) Y 평면 순회
+
+    스트림 끝(EOF)까지 읽으며 마지막의 불완전한 프레임은 무시.
+    tee: 읽은 원본 바이트를 그대로 기록할 파일 객체 (복원 YUV 보관용, 선택)
+    """
+    fsize = frame_size(width, height, format_factor)
+    while True:
+        buf = bytearray(fsize * chunk_frames)
+        view = memoryview(buf)
+        filled = 0
+        # 파이프는 요청보다 적게 반환할 수 있으므로 청크가 찰 때까지 반복
+        while filled < len(buf):
+            n = stream.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        if tee is not None and filled:
+            tee.write(view[:filled])
+        n_frames = filled // fsize
+        if n_frames:
+            frames = np.frombuffer(buf, dtype=np.uint8, count=n_frames * fsize)
+            yield y_frames(frames.reshape(n_frames, fsize), width, height)
+        if filled < len(buf):
+            return